@@ -2,16 +2,49 @@
 
 from __future__ import annotations
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Iterator
+
+STARTED = time.perf_counter()
+
+from fastapi import FastAPI, File, HTTPException, Request, UploadFile
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 
-from src.config import RAW_DIR, ensure_directories
-from src.data_processing import DocumentChunk, process_pdf
+from src import metrics
+from src.cache import normalize_text
+from src.config import ensure_directories, settings
+from src.data_processing import DocumentChunk, raw_path_for
+from src.jobs import JobQueue
 from src.llm import LLMService
+from src.registry import CollectionRegistry
 from src.retriever import VectorStore
 
-app = FastAPI(title="Document Assistant API")
+logger = logging.getLogger(__name__)
+startup_timings: dict = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the embedding model before serving, so the first query isn't the slow one.
+    startup_timings.update(await run_in_threadpool(vector_store.warm_up))
+    startup_timings["total"] = time.perf_counter() - STARTED
+    logger.info(f"API ready in {startup_timings['total'] * 1000:.0f} ms")
+    yield
+    # Let queued ingestion jobs finish and close pooled connections before exiting.
+    await run_in_threadpool(job_queue.shutdown)
+    if llm_service.async_client is not None:
+        await llm_service.async_client.aclose()
+
+
+app = FastAPI(title="Document Assistant API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -21,35 +54,143 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+@app.middleware("http")
+async def observe_latency(request: Request, call_next):
+    if not metrics.enabled():
+        return await call_next(request)
+    started = time.perf_counter()
+    response = await call_next(request)
+    # Label by route template (``/jobs/{job_id}``) to keep the series count bounded.
+    route = request.scope.get("route")
+    path = getattr(route, "path", "unmatched")
+    metrics.HTTP_SECONDS.observe(f"{request.method} {path}", time.perf_counter() - started)
+    return response
+
 ensure_directories()
 vector_store = VectorStore()
+collections = CollectionRegistry(default_store=vector_store)
 llm_service = LLMService()
+job_queue = JobQueue(
+    vector_store,
+    workers=settings.ingest_job_workers,
+    extraction_workers=settings.pdf_workers,
+)
 
 
 class EmbedRequest(BaseModel):
     chunks: list[str]
     source: str = "api"
+    collection: str | None = None
+
+
+class DeleteRequest(BaseModel):
+    source: str | None = None
+    ids: list[int] | None = None
+    collection: str | None = None
 
 
 class QueryRequest(BaseModel):
     question: str
     k: int = 3
+    nprobe: int | None = None
+    ef_search: int | None = None
+    mode: str | None = None
+    collections: list[str] | None = None
+    timings: bool = False
+
+
+class BatchQueryRequest(BaseModel):
+    questions: list[str]
+    k: int = 3
+    nprobe: int | None = None
+    ef_search: int | None = None
+    mode: str | None = None
+    collections: list[str] | None = None
+    answer: bool = True
+
+
+def _store(collection: str | None) -> VectorStore:
+    try:
+        return collections.get(collection)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
+def _search_batch(questions: list[str], request: QueryRequest | BatchQueryRequest) -> list:
+    try:
+        return collections.search_batch(
+            questions,
+            k=request.k,
+            collections=request.collections,
+            nprobe=request.nprobe,
+            ef_search=request.ef_search,
+            mode=request.mode,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e)) from e
 
 
 @app.get("/health")
 def health() -> dict:
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "startup_ms": {name: round(seconds * 1000, 1) for name, seconds in startup_timings.items()},
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics() -> PlainTextResponse:
+    """Stage and route latency histograms plus event counters, in Prometheus text format."""
+    if not metrics.enabled():
+        raise HTTPException(status_code=404, detail="Metrics are disabled (METRICS_ENABLED).")
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/cache/stats")
+def cache_stats() -> dict:
+    """Shared embedding and answer caches; search caches of open collections, counts of the rest."""
+    return {
+        "embeddings": vector_store.embedding_service.cache_stats(),
+        **vector_store.cache_stats(),
+        "collections": {name: _collection_cache_stats(name) for name in collections.names()},
+        "answers": llm_service.cache_stats(),
+    }
+
 
+def _collection_cache_stats(name: str) -> dict:
+    store = collections.peek(name)
+    if store is None:
+        # Never searched in this process, so there are no caches to report.
+        return collections.stats(name)
+    return {"loaded": True, **store.cache_stats()}
 
-@app.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)) -> dict:
+
+@app.get("/collections")
+def list_collections() -> dict:
+    """Stats of every collection; ones not opened yet report their metadata DB counts."""
+    return {name: collections.stats(name) for name in collections.names()}
+
+
+@app.post("/upload", status_code=202)
+async def upload_pdf(file: UploadFile = File(...), collection: str | None = None) -> dict:
+    """Queue a PDF for ingestion; poll ``/jobs/{job_id}`` for progress."""
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="File must be a PDF.")
-    dest = RAW_DIR / file.filename
-    dest.write_bytes(await file.read())
-    chunks = process_pdf(dest)
-    vector_store.add_documents(chunks)
-    return {"message": "Uploaded and embedded", "chunks": len(chunks)}
+    store = await run_in_threadpool(_store, collection)
+    dest = raw_path_for(Path(file.filename), collection)
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    await run_in_threadpool(dest.write_bytes, await file.read())
+    job = job_queue.submit(dest, store, collection)
+    return {"message": "Upload queued", "job_id": job.id, "status": job.status}
+
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str) -> dict:
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job id.")
+    return job.to_dict()
 
 
 @app.post("/embed")
@@ -58,20 +199,139 @@ def embed_text(request: EmbedRequest) -> dict:
         DocumentChunk(id=f"{request.source}_{idx}", text=text, source=request.source)
         for idx, text in enumerate(request.chunks)
     ]
-    vector_store.add_documents(chunks)
+    _store(request.collection).add_documents(chunks)
     return {"message": "Text embedded", "chunks": len(chunks)}
 
 
+def _result_payload(results) -> list[dict]:
+    return [
+        {
+            "collection": collection,
+            "chunk_id": chunk.id,
+            "vector_id": chunk.vector_id,
+            "score": score,
+            # Kept for clients written before hybrid retrieval; same value as score.
+            "distance": score,
+            "source": chunk.source,
+            "page_start": chunk.page_start,
+            "page_end": chunk.page_end,
+            "char_start": chunk.char_start,
+            "char_end": chunk.char_end,
+        }
+        for collection, chunk, score in results
+    ]
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
 @app.post("/query")
-def query_documents(request: QueryRequest) -> dict:
-    results = vector_store.search(request.question, k=request.k)
-    context = [chunk.text for chunk, _ in results]
-    answer = llm_service.generate_answer(request.question, context)
+async def query_documents(request: QueryRequest) -> dict:
+    """Answer one question; with ``timings`` set, include a per-stage breakdown in ms."""
+    if not request.timings:
+        return await _answer(request)
+    started = time.perf_counter()
+    with metrics.collect_timings() as timings:
+        payload = await _answer(request)
+    timings["total"] = time.perf_counter() - started
+    payload["timings_ms"] = {stage: round(seconds * 1000, 3) for stage, seconds in timings.items()}
+    return payload
+
+
+async def _answer(request: QueryRequest) -> dict:
+    with metrics.span("retrieve"):
+        results = (await run_in_threadpool(_search_batch, [request.question], request))[0]
+    context = [chunk.text for _, chunk, _ in results]
+    query_embedding = (
+        await run_in_threadpool(vector_store.embed_query, request.question) if results else None
+    )
+    # Awaiting the LLM holds no worker thread while rate-limited requests queue.
+    with metrics.span("generate"):
+        answer = await llm_service.agenerate_answer(request.question, context, query_embedding)
     return {
         "answer": answer,
         "context": context,
+        "results": _result_payload(results),
+    }
+
+
+@app.post("/query/batch")
+async def query_documents_batch(request: BatchQueryRequest) -> dict:
+    """Search every question with one embedding call and one index search.
+
+    With ``answer`` set, answers are generated concurrently; identical
+    questions share one LLM call.
+    """
+    batch = await run_in_threadpool(_search_batch, request.questions, request)
+    contexts = [[chunk.text for _, chunk, _ in results] for results in batch]
+    answers: list[str | None] = [None] * len(request.questions)
+    if request.answer:
+        try:
+            embeddings = await run_in_threadpool(vector_store.embed_queries, request.questions)
+        except RuntimeError:
+            embeddings = [None] * len(request.questions)
+        pending = {}
+        for question, context, embedding in zip(request.questions, contexts, embeddings):
+            key = normalize_text(question)
+            if key not in pending:
+                pending[key] = llm_service.agenerate_answer(question, context, embedding)
+        by_question = dict(zip(pending, await asyncio.gather(*pending.values())))
+        answers = [by_question[normalize_text(question)] for question in request.questions]
+
+    return {
         "results": [
-            {"chunk_id": chunk.id, "distance": distance, "source": chunk.source}
-            for chunk, distance in results
-        ],
+            {
+                "question": question,
+                "answer": answer,
+                "context": context,
+                "results": _result_payload(results),
+            }
+            for question, answer, context, results in zip(
+                request.questions, answers, contexts, batch
+            )
+        ]
     }
+
+
+@app.post("/query/stream")
+def query_documents_stream(request: QueryRequest) -> StreamingResponse:
+    """Server-sent events: ``sources`` first, then ``token`` deltas, then ``done``."""
+    started = time.perf_counter()
+    results = _search_batch([request.question], request)[0]
+    context = [chunk.text for _, chunk, _ in results]
+    query_embedding = vector_store.embed_query(request.question) if results else None
+
+    def events() -> Iterator[str]:
+        yield _sse("sources", {"context": context, "results": _result_payload(results)})
+        first_token = None
+        for delta in llm_service.stream_answer(request.question, context, query_embedding):
+            if first_token is None:
+                first_token = time.perf_counter()
+            yield _sse("token", {"text": delta})
+        finished = time.perf_counter()
+        ttft_ms = ((first_token or finished) - started) * 1000
+        total_ms = (finished - started) * 1000
+        logger.info(f"Streamed answer: ttft={ttft_ms:.0f}ms total={total_ms:.0f}ms")
+        yield _sse("done", {"ttft_ms": round(ttft_ms, 1), "total_ms": round(total_ms, 1)})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.post("/delete")
+def delete_documents(request: DeleteRequest) -> dict:
+    if request.source is None and not request.ids:
+        raise HTTPException(status_code=400, detail="Provide a source or ids to delete.")
+    deleted = _store(request.collection).delete(source=request.source, ids=request.ids)
+    return {"message": "Deleted", "chunks": deleted}
+
+
+@app.post("/compact")
+def compact_store(collection: str | None = None) -> dict:
+    store = _store(collection)
+    store.compact()
+    return {"message": "Compacted", **store.stats()}
@@ -0,0 +1,438 @@
+"""Reproducible ingest and query benchmarks on a synthetic corpus.
+
+    python -m src.benchmark --sizes 10000 100000 1000000 --out bench.json
+    python -m src.benchmark --compare bench-before.json bench.json
+
+Everything is seeded: the corpus, the stand-in embedder and the queries are
+identical across runs, so two result files differ only by the code (and
+settings) that produced them. Each store size runs in a fresh process so
+its peak RSS is its own.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from multiprocessing import get_context
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Sequence
+
+import numpy as np
+
+from .config import PROJECT_ROOT, settings
+from .context import pack_context
+from .data_processing import DocumentChunk, iter_page_chunks, iter_pdf_pages
+from .embedder import EmbeddingService, load_model
+from .embedding_backends import EmbeddingBackend
+from .lazy import lazy_import
+from .retriever import VectorStore
+
+faiss = lazy_import("faiss")
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+DEFAULT_SIZES = (10_000, 100_000, 1_000_000)
+EMBEDDERS = ("hash", "torch", "onnx", "int8")
+SEARCH_MODES = ("vector", "hybrid")
+_SYLLABLES = ("ka", "lo", "mi", "ne", "ru", "ta", "vi", "so", "pe", "da", "gu", "zo", "fi", "ba")
+
+
+@lru_cache(maxsize=1 << 16)
+def _bucket(token: str, buckets: int) -> int:
+    return zlib.crc32(token.encode()) % buckets
+
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    """Deterministic stand-in for a sentence model: summed random vectors per word.
+
+    Texts that share words get nearby vectors, so recall and ranking behave
+    like a real (if weak) embedding, at a cost far below any transformer.
+    """
+
+    name = "hash"
+
+    def __init__(self, dimension: int = 384, buckets: int = 1 << 14, seed: int = 0) -> None:
+        self.dimension = dimension
+        self.buckets = buckets
+        self.table = np.random.default_rng(seed).standard_normal((buckets, dimension)).astype(
+            np.float32
+        )
+
+    def encode(
+        self, texts: Sequence[str], batch_size: int = 32, convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for row, text in enumerate(texts):
+            ids = [_bucket(token, self.buckets) for token in text.lower().split()]
+            if ids:
+                vectors[row] = self.table[ids].sum(axis=0)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.clip(norms, 1e-12, None)
+
+
+class StubLLM:
+    """Packs context like ``LLMService`` and answers instantly, without a network call."""
+
+    def generate_answer(
+        self, query: str, context_chunks: Sequence[str], query_embedding: Any = None
+    ) -> str:
+        packed = pack_context(context_chunks, max_tokens=settings.context_max_tokens)
+        return packed[0].split(". ")[0] if packed else "I don't know."
+
+
+def synthetic_vocabulary(size: int = 5000) -> List[str]:
+    words = []
+    for index in range(size):
+        syllables = []
+        value = index
+        for _ in range(3):
+            syllables.append(_SYLLABLES[value % len(_SYLLABLES)])
+            value //= len(_SYLLABLES)
+        words.append("".join(syllables) + str(index % 7))
+    return words
+
+
+def synthetic_texts(count: int, words: int, seed: int = 0, vocab_size: int = 5000) -> List[str]:
+    """``count`` texts of ``words`` Zipf-distributed words each, like natural prose."""
+    vocabulary = np.array(synthetic_vocabulary(vocab_size))
+    weights = 1.0 / np.arange(1, vocab_size + 1) ** 1.1
+    rng = np.random.default_rng(seed)
+    texts = []
+    for start in range(0, count, 10_000):
+        rows = min(10_000, count - start)
+        picks = rng.choice(vocab_size, size=(rows, words), p=weights / weights.sum())
+        texts.extend(" ".join(vocabulary[row]) + "." for row in picks)
+    return texts
+
+
+def write_pdf(path: Path, page_texts: Sequence[str]) -> Path:
+    """Minimal single-font PDF with one line of text per page."""
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>"
+        )
+        kids.append(len(objects))
+    objects[1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{kid} 0 R' for kid in kids)}] /Count {len(kids)} >>"
+    )
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode()
+    out += (
+        f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    ).encode()
+    path.write_bytes(bytes(out))
+    return path
+
+
+def make_embedder(kind: str, seed: int = 0) -> EmbeddingService:
+    service = EmbeddingService(use_cache=False)
+    if kind == "hash":
+        service.model = HashEmbeddingBackend(seed=seed)
+    else:
+        service.backend = kind
+        service.model = load_model(settings.embedding_model, kind)
+        if service.model is None:
+            raise RuntimeError(f"Embedding backend {kind} is not available")
+    return service
+
+
+def percentiles(latencies_ms: Sequence[float]) -> Dict[str, float]:
+    values = np.asarray(latencies_ms, dtype=np.float64)
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+    }
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes.
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def _rate(count: int, seconds: float) -> float | None:
+    return round(count / seconds, 1) if seconds > 0 else None
+
+
+def bench_pipeline(
+    docs: int = 20, pages: int = 200, embed_texts: int = 2000, embedder: str = "hash", seed: int = 0
+) -> Dict[str, Any]:
+    """Chunking, PDF extraction and embedding throughput."""
+    documents = synthetic_texts(docs, 5000, seed=seed)
+    started = time.perf_counter()
+    chunks = [
+        chunk.text
+        for index, document in enumerate(documents)
+        for chunk in iter_page_chunks(
+            [document], f"doc{index}", "synthetic", settings.chunk_size, settings.chunk_overlap
+        )
+    ]
+    chunk_seconds = time.perf_counter() - started
+    total_chars = sum(len(document) for document in documents)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        pdf = write_pdf(Path(tmp) / "synthetic.pdf", synthetic_texts(pages, 300, seed=seed + 1))
+        started = time.perf_counter()
+        extracted = sum(1 for _ in iter_pdf_pages(pdf, workers=settings.pdf_workers))
+        extract_seconds = time.perf_counter() - started
+
+    service = make_embedder(embedder, seed=seed)
+    texts = (chunks * (embed_texts // max(1, len(chunks)) + 1))[:embed_texts]
+    started = time.perf_counter()
+    for start in range(0, len(texts), service.batch_size):
+        service.embed(texts[start:start + service.batch_size])
+    embed_seconds = time.perf_counter() - started
+
+    return {
+        "chunking": {
+            "chunks": len(chunks),
+            "chunks_per_second": _rate(len(chunks), chunk_seconds),
+            "mb_per_second": _rate(total_chars / 1e6, chunk_seconds),
+        },
+        "extraction": {
+            "pages": extracted,
+            "workers": settings.pdf_workers,
+            "pages_per_second": _rate(extracted, extract_seconds),
+        },
+        "embedding": {
+            "backend": embedder,
+            "texts": len(texts),
+            "texts_per_second": _rate(len(texts), embed_seconds),
+        },
+    }
+
+
+def _chunks(texts: Sequence[str]) -> Iterator[DocumentChunk]:
+    for index, text in enumerate(texts):
+        yield DocumentChunk(id=f"bench_{index}", text=text, source=f"bench_{index // 100}.pdf")
+
+
+def bench_store(
+    size: int, queries: int = 200, k: int = 10, embedder: str = "hash", seed: int = 0
+) -> Dict[str, Any]:
+    """Ingest ``size`` chunks into a fresh store, persist, reopen and time searches."""
+    texts = synthetic_texts(size, 40, seed=seed)
+    query_texts = [
+        " ".join(text.split()[:6])
+        for text in synthetic_texts(queries * len(SEARCH_MODES), 40, seed=seed + 2)
+    ]
+    service = make_embedder(embedder, seed=seed)
+    result: Dict[str, Any] = {"vectors": size}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = dict(
+            index_path=Path(tmp) / "faiss.index",
+            metadata_path=Path(tmp) / "metadata.db",
+            embedding_service=service,
+        )
+        store = VectorStore(**paths)
+        started = time.perf_counter()
+        store.add_documents(_chunks(texts))
+        add_seconds = time.perf_counter() - started
+        started = time.perf_counter()
+        store.compact()
+        persist_seconds = time.perf_counter() - started
+        index_bytes = (Path(tmp) / "faiss.index").stat().st_size
+        del store
+
+        started = time.perf_counter()
+        store = VectorStore(**paths)
+        open_seconds = time.perf_counter() - started
+        result["ingest"] = {
+            "add_documents_seconds": round(add_seconds, 3),
+            "chunks_per_second": _rate(size, add_seconds),
+            "persist_seconds": round(persist_seconds, 3),
+            "open_seconds": round(open_seconds, 3),
+            "index_bytes": index_bytes,
+        }
+        result["index"] = store.stats()
+
+        result["search"] = {}
+        llm = StubLLM()
+        for offset, mode in enumerate(SEARCH_MODES):
+            batch = query_texts[offset * queries:(offset + 1) * queries]
+            for query in batch[:5]:
+                store.search(f"warm {query}", k=k, mode=mode)
+            latencies, answer_latencies = [], []
+            for query in batch:
+                started = time.perf_counter()
+                results = store.search(query, k=k, mode=mode)
+                searched = time.perf_counter()
+                llm.generate_answer(query, [chunk.text for chunk, _ in results])
+                finished = time.perf_counter()
+                latencies.append((searched - started) * 1000)
+                answer_latencies.append((finished - started) * 1000)
+            result["search"][mode] = percentiles(latencies)
+            result["search"][mode]["with_stub_llm_p50_ms"] = percentiles(answer_latencies)["p50_ms"]
+        result["peak_rss_mb"] = peak_rss_mb()
+
+        # The recall baseline holds a second full copy of the vectors, so it's measured last.
+        report = store.recall_report(k=k, sample=min(200, size), seed=seed)
+        result["recall"] = {
+            key: report.get(key)
+            for key in ("recall", "recall_reranked", "baseline", "compression")
+            if key in report
+        }
+    result["peak_rss_with_recall_mb"] = peak_rss_mb()
+    return result
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(
+    sizes: Sequence[int] = DEFAULT_SIZES,
+    queries: int = 200,
+    k: int = 10,
+    embedder: str = "hash",
+    seed: int = 0,
+    isolate: bool = True,
+) -> Dict[str, Any]:
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "faiss": getattr(faiss, "__version__", None),
+            "embedder": embedder,
+            "seed": seed,
+            "queries": queries,
+            "k": k,
+            "settings": {
+                "index_type": settings.index_type,
+                "index_train_threshold": settings.index_train_threshold,
+                "vector_quantization": settings.vector_quantization,
+                "retrieval_mode": settings.retrieval_mode,
+                "embedding_batch_size": settings.embedding_batch_size,
+                "nprobe": settings.nprobe,
+                "ef_search": settings.ef_search,
+            },
+        },
+        "pipeline": bench_pipeline(embedder=embedder, seed=seed),
+        "sizes": {},
+    }
+    for size in sizes:
+        print(f"Benchmarking {size} vectors...", file=sys.stderr)
+        if isolate:
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results["sizes"][str(size)] = pool.submit(
+                    bench_store, size, queries, k, embedder, seed
+                ).result()
+        else:
+            results["sizes"][str(size)] = bench_store(size, queries, k, embedder, seed)
+    return results
+
+
+def _flatten(data: Dict[str, Any], prefix: str = "") -> Dict[str, float]:
+    flat: Dict[str, float] = {}
+    for key, value in data.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{path}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[path] = value
+    return flat
+
+
+def compare_results(base: Dict[str, Any], current: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Numeric metrics present in both runs, with the relative change in percent."""
+    before = _flatten({key: base.get(key, {}) for key in ("pipeline", "sizes")})
+    after = _flatten({key: current.get(key, {}) for key in ("pipeline", "sizes")})
+    rows = []
+    for metric in sorted(before.keys() & after.keys()):
+        old, new = before[metric], after[metric]
+        change = round((new - old) / old * 100, 1) if old else None
+        rows.append({"metric": metric, "base": old, "current": new, "change_pct": change})
+    return rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ingest and query performance")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES))
+    parser.add_argument("--queries", type=int, default=200, help="Timed searches per mode")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--embedder",
+        choices=EMBEDDERS,
+        default="hash",
+        help="hash is a deterministic stand-in; the others load EMBEDDING_MODEL",
+    )
+    parser.add_argument("--out", type=Path, help="Write the JSON results here")
+    parser.add_argument(
+        "--in-process", action="store_true", help="Don't isolate sizes in subprocesses"
+    )
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        nargs=2,
+        metavar=("BASE", "CURRENT"),
+        help="Print the change between two result files and exit",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        base, current = (json.loads(path.read_text()) for path in args.compare)
+        for row in compare_results(base, current):
+            change = "n/a" if row["change_pct"] is None else f"{row['change_pct']:+.1f}%"
+            print(f"{row['metric']:<55} {row['base']:>14} {row['current']:>14} {change:>9}")
+        return
+
+    results = run_benchmark(
+        sizes=args.sizes,
+        queries=args.queries,
+        k=args.k,
+        embedder=args.embedder,
+        seed=args.seed,
+        isolate=not args.in_process,
+    )
+    output = json.dumps(results, indent=2)
+    if args.out:
+        args.out.write_text(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    main()
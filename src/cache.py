@@ -0,0 +1,328 @@
+"""In-memory and disk-backed caches with hit/miss accounting."""
+
+from __future__ import annotations
+
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Generic, Hashable, Iterable, Optional, Sequence, TypeVar
+
+import numpy as np
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """Thread-safe bounded mapping that evicts the least recently used entry."""
+
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._data: OrderedDict[Hashable, V] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[V]:
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return None
+
+    def put(self, key: Hashable, value: V) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._data),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+def content_key(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier vector cache keyed by a hash of model name and normalized text.
+
+    The memory tier is an LRU of recent vectors. The disk tier is a SQLite
+    table bounded by ``max_disk_bytes``; the least recently used rows are
+    evicted once it grows past the limit.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        memory_entries: int,
+        disk_path: Path | None = None,
+        max_disk_bytes: int = 0,
+    ) -> None:
+        self.model_name = model_name
+        self.memory: LRUCache[np.ndarray] = LRUCache(memory_entries)
+        self.max_disk_bytes = max_disk_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn: sqlite3.Connection | None = None
+        self._disk_bytes = 0
+        if disk_path is not None and max_disk_bytes > 0:
+            disk_path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(disk_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    vector BLOB NOT NULL,
+                    last_used REAL NOT NULL
+                )
+                """
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)"
+            )
+            self._conn.commit()
+            self._disk_bytes = self._conn.execute(
+                "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+            ).fetchone()[0]
+
+    def key(self, text: str) -> str:
+        return content_key(self.model_name, text)
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        found: Dict[str, np.ndarray] = {}
+        disk_keys = []
+        for key in keys:
+            vector = self.memory.get(key)
+            if vector is not None:
+                found[key] = vector
+            else:
+                disk_keys.append(key)
+
+        if disk_keys and self._conn is not None:
+            with self._lock:
+                for start in range(0, len(disk_keys), 500):
+                    batch = disk_keys[start:start + 500]
+                    rows = self._conn.execute(
+                        f"SELECT key, vector FROM embeddings "
+                        f"WHERE key IN ({','.join('?' * len(batch))})",
+                        batch,
+                    ).fetchall()
+                    for key, blob in rows:
+                        vector = np.frombuffer(blob, dtype=np.float32)
+                        found[key] = vector
+                        self.memory.put(key, vector)
+                    if rows:
+                        now = time.time()
+                        self._conn.executemany(
+                            "UPDATE embeddings SET last_used = ? WHERE key = ?",
+                            [(now, key) for key, _ in rows],
+                        )
+                self._conn.commit()
+
+        hits = len(found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(keys) - hits
+        return found
+
+    def put_many(self, items: Iterable[tuple[str, np.ndarray]]) -> None:
+        rows = []
+        for key, vector in items:
+            vector = np.ascontiguousarray(vector, dtype=np.float32)
+            self.memory.put(key, vector)
+            rows.append((key, vector.tobytes(), time.time()))
+        if not rows or self._conn is None:
+            return
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                rows,
+            )
+            self._disk_bytes += sum(len(row[1]) for row in rows)
+            if self._disk_bytes > self.max_disk_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        # Trim to 90% of the budget so eviction doesn't run on every insert.
+        target = int(self.max_disk_bytes * 0.9)
+        self._disk_bytes = self._conn.execute(
+            "SELECT COALESCE(SUM(LENGTH(vector)), 0) FROM embeddings"
+        ).fetchone()[0]
+        while self._disk_bytes > target:
+            rows = self._conn.execute(
+                "SELECT key, LENGTH(vector) FROM embeddings ORDER BY last_used LIMIT 1000"
+            ).fetchall()
+            if not rows:
+                break
+            self._conn.executemany("DELETE FROM embeddings WHERE key = ?", [(key,) for key, _ in rows])
+            self._disk_bytes -= sum(size for _, size in rows)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_bytes": self._disk_bytes,
+        }
+
+
+class AnswerCache:
+    """LLM answers reused for paraphrased questions over the same context.
+
+    A lookup hits when a stored entry was generated from the same context
+    hash and its question embedding is within ``threshold`` cosine similarity
+    of the new one (or the normalized question text is identical). Entries
+    expire after ``ttl`` seconds and the least recently used are dropped past
+    ``max_entries``. Rows live in SQLite, so the cache survives restarts.
+    """
+
+    def __init__(self, path: Path, max_entries: int, ttl: float, threshold: float) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS answers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                context_hash TEXT NOT NULL,
+                query TEXT NOT NULL,
+                vector BLOB,
+                answer TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_context ON answers (context_hash)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_last_used ON answers (last_used)")
+        self._conn.commit()
+
+    def get(
+        self, context_hash: str, query: str, query_vector: np.ndarray | None = None
+    ) -> Optional[str]:
+        query = normalize_text(query)
+        target = _unit(query_vector)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, query, vector, answer FROM answers "
+                "WHERE context_hash = ? AND created_at >= ?",
+                (context_hash, time.time() - self.ttl),
+            ).fetchall()
+            best_id, best_answer, best_score = None, None, self.threshold
+            for row_id, row_query, blob, answer in rows:
+                if row_query == query:
+                    best_id, best_answer = row_id, answer
+                    break
+                if target is None or blob is None:
+                    continue
+                vector = np.frombuffer(blob, dtype=np.float32)
+                if vector.shape != target.shape:
+                    continue
+                score = float(vector @ target)
+                if score >= best_score:
+                    best_id, best_answer, best_score = row_id, answer, score
+            if best_id is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE answers SET last_used = ? WHERE id = ?", (time.time(), best_id)
+            )
+            self._conn.commit()
+        return best_answer
+
+    def put(
+        self, context_hash: str, query: str, answer: str, query_vector: np.ndarray | None = None
+    ) -> None:
+        if self.max_entries <= 0:
+            return
+        target = _unit(query_vector)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (context_hash, query, vector, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    context_hash,
+                    normalize_text(query),
+                    target.tobytes() if target is not None else None,
+                    answer,
+                    now,
+                    now,
+                ),
+            )
+            self._conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,))
+            self._conn.execute(
+                "DELETE FROM answers WHERE id NOT IN "
+                "(SELECT id FROM answers ORDER BY last_used DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM answers")
+            self._conn.commit()
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
+        return {
+            "entries": entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+def _unit(vector: np.ndarray | None) -> np.ndarray | None:
+    if vector is None:
+        return None
+    vector = np.asarray(vector, dtype=np.float32).reshape(-1)
+    norm = float(np.linalg.norm(vector))
+    if vector.size == 0 or norm == 0.0:
+        return None
+    return vector / norm
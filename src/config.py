@@ -20,6 +20,8 @@ PROJECT_ROOT = Path(__file__).resolve().parents[1]
 VECTORSTORE_DIR = PROJECT_ROOT / "vectorstore"
 PROCESSED_DIR = PROJECT_ROOT / "data" / "processed"
 RAW_DIR = PROJECT_ROOT / "data" / "raw"
+CACHE_DIR = PROJECT_ROOT / "data" / "cache"
+DEFAULT_COLLECTION = "default"
 
 
 def _get_secret(key: str, default: Optional[str] = None) -> Optional[str]:
@@ -44,6 +46,40 @@ class Settings:
     vectorstore_path: Path
     metadata_store_path: Path
     api_base_url: str
+    index_type: str
+    index_train_threshold: int
+    ivf_nlist: int
+    pq_m: int
+    hnsw_m: int
+    vector_quantization: str
+    rerank_factor: int
+    nprobe: int
+    ef_search: int
+    wal_compact_bytes: int
+    store_reload_interval: float
+    metrics_enabled: bool
+    embedding_model: str
+    embedding_backend: str
+    embedding_threads: int
+    onnx_dir: Path
+    embedding_cache_size: int
+    embedding_cache_path: Path
+    embedding_cache_max_mb: int
+    embedding_batch_size: int
+    embedding_workers: int
+    pdf_workers: int
+    ingest_job_workers: int
+    search_cache_size: int
+    retrieval_mode: str
+    rrf_k: int
+    answer_cache_path: Path
+    answer_cache_size: int
+    answer_cache_ttl: int
+    answer_cache_threshold: float
+    context_max_tokens: int
+    llm_tokens_per_minute: int
+    llm_max_retries: int
+    llm_max_connections: int
 
     @classmethod
     def load(cls) -> "Settings":
@@ -53,8 +89,47 @@ class Settings:
             chunk_size=int(_get_secret("CHUNK_SIZE", "800") or "800"),
             chunk_overlap=int(_get_secret("CHUNK_OVERLAP", "200") or "200"),
             vectorstore_path=VECTORSTORE_DIR / "faiss.index",
-            metadata_store_path=VECTORSTORE_DIR / "metadata.pkl",
+            metadata_store_path=VECTORSTORE_DIR / "metadata.db",
             api_base_url=_get_secret("API_BASE_URL", "https://api.groq.com/openai/v1"),
+            index_type=(_get_secret("INDEX_TYPE", "auto") or "auto").lower(),
+            index_train_threshold=int(_get_secret("INDEX_TRAIN_THRESHOLD", "50000") or "50000"),
+            ivf_nlist=int(_get_secret("IVF_NLIST", "0") or "0"),
+            pq_m=int(_get_secret("PQ_M", "0") or "0"),
+            hnsw_m=int(_get_secret("HNSW_M", "32") or "32"),
+            vector_quantization=(
+                _get_secret("VECTOR_QUANTIZATION", "none") or "none"
+            ).lower(),
+            rerank_factor=int(_get_secret("RERANK_FACTOR", "4") or "4"),
+            nprobe=int(_get_secret("NPROBE", "16") or "16"),
+            ef_search=int(_get_secret("EF_SEARCH", "64") or "64"),
+            wal_compact_bytes=int(_get_secret("WAL_COMPACT_BYTES", "67108864") or "67108864"),
+            store_reload_interval=float(_get_secret("STORE_RELOAD_INTERVAL", "1.0") or "1.0"),
+            metrics_enabled=(_get_secret("METRICS_ENABLED", "true") or "true").lower()
+            in ("1", "true", "yes", "on"),
+            embedding_model=_get_secret("EMBEDDING_MODEL", "all-MiniLM-L6-v2"),
+            embedding_backend=(_get_secret("EMBEDDING_BACKEND", "torch") or "torch").lower(),
+            embedding_threads=int(_get_secret("EMBEDDING_THREADS", "0") or "0"),
+            onnx_dir=CACHE_DIR / "onnx",
+            embedding_cache_size=int(_get_secret("EMBEDDING_CACHE_SIZE", "10000") or "10000"),
+            embedding_cache_path=CACHE_DIR / "embeddings.db",
+            embedding_cache_max_mb=int(_get_secret("EMBEDDING_CACHE_MAX_MB", "512") or "512"),
+            embedding_batch_size=int(_get_secret("EMBEDDING_BATCH_SIZE", "64") or "64"),
+            embedding_workers=int(_get_secret("EMBEDDING_WORKERS", "1") or "1"),
+            pdf_workers=int(_get_secret("PDF_WORKERS", "1") or "1"),
+            ingest_job_workers=int(_get_secret("INGEST_JOB_WORKERS", "1") or "1"),
+            search_cache_size=int(_get_secret("SEARCH_CACHE_SIZE", "1024") or "1024"),
+            retrieval_mode=(_get_secret("RETRIEVAL_MODE", "hybrid") or "hybrid").lower(),
+            rrf_k=int(_get_secret("RRF_K", "60") or "60"),
+            answer_cache_path=CACHE_DIR / "answers.db",
+            answer_cache_size=int(_get_secret("ANSWER_CACHE_SIZE", "1000") or "1000"),
+            answer_cache_ttl=int(_get_secret("ANSWER_CACHE_TTL", "86400") or "86400"),
+            answer_cache_threshold=float(
+                _get_secret("ANSWER_CACHE_THRESHOLD", "0.95") or "0.95"
+            ),
+            context_max_tokens=int(_get_secret("CONTEXT_MAX_TOKENS", "1500") or "1500"),
+            llm_tokens_per_minute=int(_get_secret("LLM_TOKENS_PER_MINUTE", "6000") or "6000"),
+            llm_max_retries=int(_get_secret("LLM_MAX_RETRIES", "5") or "5"),
+            llm_max_connections=int(_get_secret("LLM_MAX_CONNECTIONS", "10") or "10"),
         )
 
 
@@ -62,5 +137,5 @@ settings = Settings.load()
 
 
 def ensure_directories() -> None:
-    for path in (VECTORSTORE_DIR, PROCESSED_DIR, RAW_DIR):
+    for path in (VECTORSTORE_DIR, PROCESSED_DIR, RAW_DIR, CACHE_DIR):
         path.mkdir(parents=True, exist_ok=True)
@@ -0,0 +1,144 @@
+"""Token-budgeted context packing for LLM prompts."""
+
+from __future__ import annotations
+
+import logging
+import math
+import re
+from functools import lru_cache
+from typing import List, Sequence
+
+from .lazy import lazy_import
+
+tiktoken = lazy_import("tiktoken", optional=True)
+logger = logging.getLogger(__name__)
+
+# Llama's tokenizer isn't bundled with tiktoken; cl100k_base counts within a few percent.
+TOKENIZER_ENCODING = "cl100k_base"
+MIN_OVERLAP_WORDS = 8
+MIN_TRIMMED_TOKENS = 32
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_WORD_PIECES = re.compile(r"\w+|[^\w\s]")
+_encoding = None
+_encoding_failed = False
+
+
+def _get_encoding():
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            if tiktoken is None:
+                raise ImportError("tiktoken is not installed")
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            # The BPE file is downloaded on first use; the heuristic only covers hosts
+            # that can't reach it and don't have it in TIKTOKEN_CACHE_DIR (see DEPLOYMENT.md).
+            logger.warning(f"tiktoken unavailable, estimating token counts: {e}")
+            _encoding_failed = True
+    return _encoding
+
+
+@lru_cache(maxsize=8192)
+def count_tokens(text: str) -> int:
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    # Roughly one token per four characters of a word, one per punctuation mark.
+    return sum(math.ceil(len(piece) / 4) for piece in _WORD_PIECES.findall(text))
+
+
+def token_offsets(text: str) -> List[int]:
+    """Character offset at which each token of ``text`` starts, as counted by ``count_tokens``."""
+    encoding = _get_encoding()
+    if encoding is not None:
+        _, offsets = encoding.decode_with_offsets(encoding.encode(text, disallowed_special=()))
+        return offsets
+    return [
+        piece.start() + 4 * index
+        for piece in _WORD_PIECES.finditer(text)
+        for index in range(math.ceil(len(piece.group()) / 4))
+    ]
+
+
+def split_sentences(text: str) -> List[str]:
+    return [sentence for sentence in _SENTENCE_END.split(text.strip()) if sentence]
+
+
+def _strip_overlap(text: str, kept: Sequence[str]) -> str:
+    """Remove text shared with already packed chunks by the chunker's sliding window."""
+    words = text.split()
+    for other in kept:
+        other_words = other.split()
+        limit = min(len(words), len(other_words))
+        # This chunk starts where a packed one ends...
+        for size in range(limit, MIN_OVERLAP_WORDS - 1, -1):
+            if other_words[-size:] == words[:size]:
+                words = words[size:]
+                break
+        limit = min(len(words), len(other_words))
+        # ...or ends where a packed one starts.
+        for size in range(limit, MIN_OVERLAP_WORDS - 1, -1):
+            if words[-size:] == other_words[:size]:
+                words = words[:-size]
+                break
+    return " ".join(words)
+
+
+def _trim_to_budget(text: str, budget: int) -> str:
+    """Leading whole sentences of ``text`` that fit in ``budget`` tokens."""
+    kept: List[str] = []
+    used = 0
+    for sentence in split_sentences(text):
+        tokens = count_tokens(sentence)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    return " ".join(kept)
+
+
+def pack_context(chunks: Sequence[str], max_tokens: int) -> List[str]:
+    """Choose the context that carries the most relevance per token within ``max_tokens``.
+
+    ``chunks`` are in retrieval order and weighted by reciprocal rank, which
+    means the same in every retrieval mode (raw scores are distances or BM25).
+    Text repeated by chunk overlap is dropped, chunks are taken greedily by
+    relevance per token, and the first chunk that no longer fits is cut at a
+    sentence boundary. Packed chunks keep retrieval order.
+    """
+
+    cleaned: List[str] = []
+    seen_sentences: set[str] = set()
+    for chunk in chunks:
+        text = _strip_overlap(" ".join(str(chunk).split()), cleaned)
+        sentences = []
+        for sentence in split_sentences(text):
+            key = sentence.lower()
+            if key not in seen_sentences:
+                seen_sentences.add(key)
+                sentences.append(sentence)
+        cleaned.append(" ".join(sentences))
+
+    candidates = [
+        (1.0 / ((rank + 1) * count_tokens(text)), rank, text)
+        for rank, text in enumerate(cleaned)
+        if text
+    ]
+    candidates.sort(key=lambda item: (-item[0], item[1]))
+
+    packed: dict[int, str] = {}
+    remaining = max_tokens
+    for _, rank, text in candidates:
+        tokens = count_tokens(text)
+        if tokens <= remaining:
+            packed[rank] = text
+            remaining -= tokens
+        elif remaining >= MIN_TRIMMED_TOKENS:
+            trimmed = _trim_to_budget(text, remaining)
+            if trimmed:
+                packed[rank] = trimmed
+                remaining -= count_tokens(trimmed)
+        if remaining < MIN_TRIMMED_TOKENS:
+            break
+    return [packed[rank] for rank in sorted(packed)]
@@ -2,74 +2,321 @@
 
 from __future__ import annotations
 
+import hashlib
 import json
-from dataclasses import dataclass
+import multiprocessing
+import os
+import re
+import shutil
+import time
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Executor, ProcessPoolExecutor
+from contextlib import nullcontext
+from dataclasses import asdict, dataclass
+from itertools import islice
 from pathlib import Path
-from typing import Iterable, List
+from typing import Callable, Iterable, Iterator, List, Sequence
 
 from PyPDF2 import PdfReader
 
-from .config import PROCESSED_DIR, RAW_DIR, ensure_directories, settings
+from . import metrics
+from .config import DEFAULT_COLLECTION, PROCESSED_DIR, RAW_DIR, ensure_directories, settings
+from .context import count_tokens, token_offsets
 
+PAGES_PER_TASK = 16
 
-@dataclass
+# A sentence runs to terminal punctuation (plus closing quotes/brackets) followed by
+# whitespace; text with no such boundary left is taken whole.
+_SENTENCE = re.compile(r"\S(?:.*?[.!?][\"')\]]*(?=\s)|.*\S)", re.S)
+
+
+@dataclass(slots=True)
 class DocumentChunk:
+    """A chunk of a document.
+
+    Pages are 1-based and inclusive. ``char_start:char_end`` slices the
+    document text with pages joined by newlines (as ``iter_pdf_pages`` yields them);
+    ``text`` is that slice with whitespace collapsed. Chunks that weren't
+    cut from pages leave them ``None``.
+    """
+
     id: str
     text: str
     source: str
+    vector_id: int | None = None
+    page_start: int | None = None
+    page_end: int | None = None
+    char_start: int | None = None
+    char_end: int | None = None
+
+
+@dataclass(slots=True)
+class _Span:
+    """A sentence, or a run of words from an overlong one, located in the document."""
+
+    text: str
+    tokens: int
+    page: int
+    char_start: int
+    char_end: int
+
+
+def _extract_page_range(pdf_path: str, start: int, end: int) -> List[str]:
+    reader = PdfReader(pdf_path)
+    return [reader.pages[i].extract_text() or "" for i in range(start, end)]
+
+
+def extraction_pool(workers: int) -> ProcessPoolExecutor:
+    """Long-lived pool for ``iter_pdf_pages`` that is safe to start from a threaded server.
+
+    Workers come from a forkserver (spawn where that is unavailable): forking
+    a process that runs other threads can deadlock on locks they hold.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
 
 
-def extract_text_from_pdf(pdf_path: Path) -> str:
+def iter_pdf_pages(
+    pdf_path: Path, workers: int = 1, pool: Executor | None = None
+) -> Iterator[str]:
+    """Yield the text of each page in order.
+
+    With ``workers > 1`` page ranges are extracted in ``pool``, or in a pool
+    created for this file. Only ``2 * workers`` ranges are in flight at once,
+    so memory stays bounded regardless of document length.
+    """
     reader = PdfReader(str(pdf_path))
-    contents = []
-    for page in reader.pages:
-        contents.append(page.extract_text() or "")
-    return "\n".join(contents)
+    total = len(reader.pages)
+    if workers <= 1 or total <= PAGES_PER_TASK:
+        for page in reader.pages:
+            yield page.extract_text() or ""
+        return
+
+    ranges = iter((start, min(start + PAGES_PER_TASK, total)) for start in range(0, total, PAGES_PER_TASK))
+    with nullcontext(pool) if pool is not None else ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque(
+            pool.submit(_extract_page_range, str(pdf_path), start, end)
+            for start, end in islice(ranges, workers * 2)
+        )
+        while pending:
+            pages = pending.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(pool.submit(_extract_page_range, str(pdf_path), *next_range))
+            yield from pages
+
+
+def _word_runs(text: str, page: int, offset: int, max_tokens: int) -> Iterator[_Span]:
+    """Cut an overlong sentence into runs of at most ``max_tokens`` tokens, between words.
+
+    The sentence is tokenized once; runs are cut at token offsets, moved back
+    to the preceding whitespace unless a single word exceeds the budget.
+    """
+    starts = token_offsets(text)
+    position = 0
+    while position < len(starts):
+        low = starts[position]
+        end = position + max_tokens
+        if end >= len(starts):
+            cut, following = len(text), len(starts)
+        else:
+            cut = starts[end]
+            space = cut
+            while space > low and not text[space].isspace():
+                space -= 1
+            if space > low:
+                cut = space
+            following = bisect_left(starts, cut, lo=position + 1)
+        piece = text[low:cut]
+        words = piece.split()
+        if words:
+            start = low + len(piece) - len(piece.lstrip())
+            stop = low + len(piece.rstrip())
+            yield _Span(" ".join(words), following - position, page, offset + start, offset + stop)
+        position = following
 
 
-def chunk_text(text: str, chunk_size: int, overlap: int) -> List[str]:
+def _sentences(text: str, page: int, offset: int, max_tokens: int) -> Iterator[_Span]:
+    for match in _SENTENCE.finditer(text):
+        sentence = " ".join(match.group().split())
+        tokens = count_tokens(sentence)
+        if tokens <= max_tokens:
+            yield _Span(sentence, tokens, page, offset + match.start(), offset + match.end())
+        else:
+            # No sentence boundary within budget (tables, lists): cut between words.
+            yield from _word_runs(match.group(), page, offset + match.start(), max_tokens)
+
+
+def _chunk_from(spans: Sequence[_Span], chunk_id: str, source: str) -> DocumentChunk:
+    return DocumentChunk(
+        id=chunk_id,
+        text=" ".join(span.text for span in spans),
+        source=source,
+        page_start=spans[0].page,
+        page_end=spans[-1].page,
+        char_start=spans[0].char_start,
+        char_end=spans[-1].char_end,
+    )
+
+
+def iter_page_chunks(
+    pages: Iterable[str],
+    doc_id: str,
+    source: str,
+    chunk_size: int,
+    overlap: int,
+) -> Iterator[DocumentChunk]:
+    """Pack the sentences of ``pages`` into chunks of at most ``chunk_size`` tokens.
+
+    Pages are consumed one at a time and every sentence is tokenized once,
+    so work and memory are linear in the document. Chunks end on sentence
+    boundaries; each one repeats the trailing sentences of the previous
+    chunk that fit in ``overlap`` tokens. Chunk ids are ``{doc_id}_{n}``.
+    """
     if chunk_size <= 0:
         raise ValueError("chunk_size must be positive")
-    if overlap >= chunk_size:
-        overlap = max(0, chunk_size - 1)
-
-    words = text.split()
-    chunks: List[str] = []
-    start = 0
-    step = chunk_size - overlap
-
-    while start < len(words):
-        end = min(len(words), start + chunk_size)
-        chunk = " ".join(words[start:end]).strip()
-        if chunk:
-            chunks.append(chunk)
-        if end == len(words):
-            break
-        start += step
-    return chunks
-
-
-def persist_chunks(chunks: Iterable[DocumentChunk], output_path: Path) -> None:
-    serialized = [chunk.__dict__ for chunk in chunks]
-    output_path.parent.mkdir(parents=True, exist_ok=True)
-    with output_path.open("w", encoding="utf-8") as fp:
-        json.dump(serialized, fp, indent=2)
+    overlap = min(max(0, overlap), chunk_size - 1)
 
+    window: deque[_Span] = deque()
+    used = 0
+    fresh = False
+    offset = 0
+    count = 0
+    for page_number, text in enumerate(pages, start=1):
+        # Chunks completed by this page are yielded after the span, so the
+        # "chunk" stage times splitting and packing but not the consumer.
+        ready: List[DocumentChunk] = []
+        with metrics.span("chunk"):
+            for span in _sentences(text, page_number, offset, chunk_size):
+                if fresh and used + span.tokens > chunk_size:
+                    ready.append(_chunk_from(window, f"{doc_id}_{count}", source))
+                    count += 1
+                    kept: deque[_Span] = deque()
+                    kept_tokens = 0
+                    # Always drop the first sentence so the next chunk moves forward.
+                    for previous in islice(reversed(window), len(window) - 1):
+                        if kept_tokens + previous.tokens > overlap:
+                            break
+                        kept.appendleft(previous)
+                        kept_tokens += previous.tokens
+                    while kept and kept_tokens + span.tokens > chunk_size:
+                        kept_tokens -= kept.popleft().tokens
+                    window, used, fresh = kept, kept_tokens, False
+                window.append(span)
+                used += span.tokens
+                fresh = True
+            offset += len(text) + 1
+        yield from ready
+    if fresh:
+        with metrics.span("chunk"):
+            last = _chunk_from(window, f"{doc_id}_{count}", source)
+        yield last
 
-def process_pdf(pdf_file: Path) -> list[DocumentChunk]:
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as fp:
+        for block in iter(lambda: fp.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def raw_path_for(pdf_file: Path, collection: str | None = None) -> Path:
+    """Location ``iter_pdf_chunks`` stages a PDF at.
+
+    Collections other than the default get their own subdirectory, so equal
+    file names in different collections don't overwrite each other.
+    """
+    if collection in (None, DEFAULT_COLLECTION):
+        return RAW_DIR / pdf_file.name
+    return RAW_DIR / collection / pdf_file.name
+
+
+def document_source(pdf_file: Path, collection: str | None = None) -> str:
+    """Source key of a PDF's chunks and registry entry, the same for every entry point.
+
+    Derived from the file name only, so re-ingesting a document from another
+    directory replaces it instead of adding a second copy.
+    """
+    return str(raw_path_for(pdf_file, collection))
+
+
+def processed_path_for(raw_target: Path) -> Path:
+    """Processed JSON for a staged PDF, mirroring its place under ``RAW_DIR``."""
+    return (PROCESSED_DIR / raw_target.relative_to(RAW_DIR)).with_suffix(".json")
+
+
+def _stage_raw_copy(pdf_file: Path, collection: str | None) -> Path:
     ensure_directories()
-    raw_target = RAW_DIR / pdf_file.name
+    raw_target = raw_path_for(pdf_file, collection)
     if pdf_file.resolve() != raw_target.resolve():
-        raw_target.write_bytes(pdf_file.read_bytes())
-    text = extract_text_from_pdf(raw_target)
-    chunk_texts = chunk_text(text, settings.chunk_size, settings.chunk_overlap)
-    chunks = [
-        DocumentChunk(
-            id=f"{raw_target.stem}_{idx}",
-            text=chunk,
-            source=str(raw_target),
-        )
-        for idx, chunk in enumerate(chunk_texts)
-    ]
-    persist_chunks(chunks, PROCESSED_DIR / f"{raw_target.stem}.json")
-    return chunks
+        raw_target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(pdf_file, raw_target)
+    return raw_target
+
+
+def iter_pdf_chunks(
+    pdf_file: Path,
+    workers: int | None = None,
+    on_page: Callable[[int, int], None] | None = None,
+    collection: str | None = None,
+    pool: Executor | None = None,
+) -> Iterator[DocumentChunk]:
+    """Stream page-aware chunks from a PDF, writing the processed JSON as it goes.
+
+    ``on_page(done, total)`` is called after each page is extracted.
+    """
+    raw_target = _stage_raw_copy(pdf_file, collection)
+    pages = _timed_pages(
+        iter_pdf_pages(raw_target, settings.pdf_workers if workers is None else workers, pool)
+    )
+    if on_page is not None:
+        pages = _report_pages(pages, len(PdfReader(str(raw_target)).pages), on_page)
+    chunks = iter_page_chunks(
+        pages,
+        raw_target.stem,
+        document_source(pdf_file, collection),
+        settings.chunk_size,
+        settings.chunk_overlap,
+    )
+    output_path = processed_path_for(raw_target)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(output_path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as fp:
+        fp.write("[")
+        count = 0
+        for chunk in chunks:
+            with metrics.span("chunk_persist"):
+                fp.write(("," if count else "") + "\n  " + json.dumps(asdict(chunk)))
+            count += 1
+            yield chunk
+        fp.write("\n]\n" if count else "]\n")
+    os.replace(tmp_path, output_path)
+    metrics.count("chunks", count)
+
+
+def _timed_pages(pages: Iterator[str]) -> Iterator[str]:
+    """Record the time spent waiting for each extracted page."""
+    while True:
+        started = time.perf_counter()
+        page = next(pages, None)
+        if page is None:
+            return
+        metrics.record("pdf_extract", time.perf_counter() - started)
+        metrics.count("pdf_pages")
+        yield page
+
+
+def _report_pages(
+    pages: Iterator[str], total: int, on_page: Callable[[int, int], None]
+) -> Iterator[str]:
+    on_page(0, total)
+    for done, page in enumerate(pages, start=1):
+        yield page
+        on_page(done, total)
+
+
+def process_pdf(pdf_file: Path) -> list[DocumentChunk]:
+    return list(iter_pdf_chunks(pdf_file))
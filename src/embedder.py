@@ -2,39 +2,184 @@
 
 from __future__ import annotations
 
+import atexit
 import logging
-from typing import Iterable
+import threading
+import time
+from itertools import islice
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple, TypeVar
 
 import numpy as np
 
-try:
-    from sentence_transformers import SentenceTransformer
-except ImportError:
-    SentenceTransformer = None
+from . import metrics
+from .cache import EmbeddingCache, normalize_text
+from .config import settings
+from .embedding_backends import INSTALL_HINTS, EmbeddingBackend, create_backend
 
 logger = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+_models: Dict[Tuple[str, str], EmbeddingBackend | None] = {}
+# Why a (model, backend) pair failed to load, for the error raised on use.
+_load_errors: Dict[Tuple[str, str], str] = {}
+_models_lock = threading.Lock()
+
+
+def load_model(name: str, backend: str = "torch") -> EmbeddingBackend | None:
+    """The process-wide ``backend`` for model ``name``, loaded on first use.
+
+    Returns ``None`` when the backend's packages are missing or the model
+    fails to load; the failure is remembered instead of retried per call.
+    """
+    key = (name, backend.lower())
+    with _models_lock:
+        if key not in _models:
+            _models[key] = _load_model(*key)
+        return _models[key]
+
+
+def _load_model(name: str, backend: str) -> EmbeddingBackend | None:
+    started = time.perf_counter()
+    try:
+        model = create_backend(
+            backend,
+            name,
+            export_dir=settings.onnx_dir / name.replace("/", "__"),
+            workers=settings.embedding_workers,
+            threads=settings.embedding_threads,
+        )
+    except Exception as e:
+        logger.warning(f"Failed to load embedding model {name} ({backend}): {e}")
+        _load_errors[(name, backend)] = str(e)
+        return None
+    atexit.register(model.close)
+    logger.info(
+        f"Loaded local embedding model: {name} ({backend}, {model.dimension} dims) "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return model
+
+
+def iter_batches(items: Iterable[T], size: int) -> Iterator[List[T]]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, max(1, size)))
+        if not batch:
+            return
+        yield batch
+
 
 class EmbeddingService:
-    def __init__(self) -> None:
-        self.model = None
-        if SentenceTransformer is not None:
-            try:
-                self.model = SentenceTransformer("all-MiniLM-L6-v2")
-                logger.info("Loaded local embedding model: all-MiniLM-L6-v2")
-            except Exception as e:
-                logger.warning(f"Failed to load embedding model: {e}")
-                self.model = None
+    def __init__(self, use_cache: bool = True) -> None:
+        self.model_name = settings.embedding_model
+        self.backend = settings.embedding_backend
+        self.batch_size = settings.embedding_batch_size
+        self._model = None
+        self._model_loaded = False
+
+        self.cache: EmbeddingCache | None = None
+        if use_cache and (settings.embedding_cache_size > 0 or settings.embedding_cache_max_mb > 0):
+            # Quantized backends produce slightly different vectors; don't mix them in the cache.
+            cache_name = (
+                self.model_name if self.backend == "torch" else f"{self.model_name}@{self.backend}"
+            )
+            self.cache = EmbeddingCache(
+                cache_name,
+                memory_entries=settings.embedding_cache_size,
+                disk_path=settings.embedding_cache_path,
+                max_disk_bytes=settings.embedding_cache_max_mb * 1024 * 1024,
+            )
+
+    @property
+    def model(self) -> Any:
+        if not self._model_loaded:
+            self._model = load_model(self.model_name, self.backend)
+            self._model_loaded = True
+        return self._model
+
+    @model.setter
+    def model(self, model: Any) -> None:
+        self._model = model
+        self._model_loaded = True
+
+    @property
+    def dimension(self) -> int:
+        """Vector width reported by the model; 0 when no backend is available."""
+        model = self.model
+        if model is None:
+            return 0
+        if hasattr(model, "get_sentence_embedding_dimension"):
+            return int(model.get_sentence_embedding_dimension())
+        return int(getattr(model, "dimension", 0))
+
+    def warm_up(self) -> float:
+        """Load the model and run one forward pass; returns the seconds it took."""
+        started = time.perf_counter()
+        if self.model is not None:
+            self.model.encode(["warm up"], batch_size=1, convert_to_numpy=True)
+        return time.perf_counter() - started
 
     def embed(self, texts: Iterable[str]) -> np.ndarray:
-        texts_list = [t.strip() for t in texts if t.strip()]
+        texts_list = [normalize_text(t) for t in texts]
+        texts_list = [t for t in texts_list if t]
         if not texts_list:
-            return np.zeros((0, 384), dtype=np.float32)
+            return np.zeros((0, self.dimension), dtype=np.float32)
+
+        metrics.count("embed_texts", len(texts_list))
+        if self.cache is None:
+            return self._encode(texts_list)
 
+        keys = [self.cache.key(text) for text in texts_list]
+        with metrics.span("embed_cache_lookup"):
+            cached = self.cache.get_many(keys)
+        metrics.count("embed_cache_hits", len(cached))
+        pending = {}
+        for key, text in zip(keys, texts_list):
+            if key not in cached:
+                pending.setdefault(key, text)
+        if pending:
+            fresh = dict(zip(pending, self._encode(list(pending.values()))))
+            with metrics.span("embed_cache_store"):
+                self.cache.put_many(fresh.items())
+            cached.update(fresh)
+        return np.vstack([cached[key] for key in keys]).astype(np.float32, copy=False)
+
+    def embed_batches(
+        self,
+        items: Iterable[T],
+        text: Callable[[T], str] = str,
+        batch_size: int | None = None,
+    ) -> Iterator[Tuple[List[T], np.ndarray]]:
+        """Lazily embed ``items`` and yield ``(batch, vectors)`` pairs.
+
+        Items with blank text are skipped so each batch lines up with its
+        vectors. Only one batch is held in memory at a time.
+        """
+        size = batch_size or settings.embedding_batch_size * max(1, settings.embedding_workers)
+        non_blank = (item for item in items if text(item).strip())
+        for batch in iter_batches(non_blank, size):
+            yield batch, self.embed(text(item) for item in batch)
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
         if self.model:
-            return np.array(self.model.encode(texts_list, convert_to_numpy=True))
+            with metrics.span("embed_model"):
+                vectors = self.model.encode(
+                    texts, batch_size=self.batch_size, convert_to_numpy=True
+                )
+            metrics.count("embed_model_texts", len(texts))
+            return np.asarray(vectors, dtype=np.float32)
 
+        backend = self.backend.lower()
+        reason = _load_errors.get((self.model_name, backend), "model not loaded")
         raise RuntimeError(
-            "No embedding backend available. Please install sentence-transformers: "
-            "pip install sentence-transformers"
+            f"No embedding backend available (EMBEDDING_BACKEND={backend}): {reason}. "
+            f"Install with: {INSTALL_HINTS.get(backend, 'pip install sentence-transformers')}"
         )
+
+    def close(self) -> None:
+        if self._model is not None and hasattr(self._model, "close"):
+            self._model.close()
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats() if self.cache is not None else {}
@@ -0,0 +1,303 @@
+"""Embedding backends: PyTorch SentenceTransformers, ONNX Runtime and int8 ONNX."""
+
+from __future__ import annotations
+
+import importlib
+import json
+import logging
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from .lazy import lazy_import
+
+sentence_transformers = lazy_import("sentence_transformers", optional=True)
+onnxruntime = lazy_import("onnxruntime", optional=True)
+tokenizers = lazy_import("tokenizers", optional=True)
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "int8")
+INSTALL_HINTS = {
+    "torch": "pip install sentence-transformers",
+    "onnx": "pip install onnxruntime tokenizers (and sentence-transformers for the first export)",
+    "int8": "pip install onnxruntime tokenizers (and sentence-transformers for the first export)",
+}
+POOLING_MODES = ("mean", "cls", "max")
+ONNX_OPSET = 14
+
+
+class EmbeddingBackend(ABC):
+    """Encodes texts into float32 vectors of ``dimension`` columns.
+
+    ``encode`` takes the same arguments as ``SentenceTransformer.encode`` so
+    backends and plain models are interchangeable inside ``EmbeddingService``.
+    """
+
+    name = "base"
+    dimension = 0
+
+    @abstractmethod
+    def encode(
+        self, texts: Sequence[str], batch_size: int = 32, convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        """``texts`` as a ``(len(texts), dimension)`` float32 array."""
+
+    def close(self) -> None:
+        pass
+
+
+class TorchBackend(EmbeddingBackend):
+    """The reference SentenceTransformers model, with an optional multi-process pool."""
+
+    name = "torch"
+
+    def __init__(self, model_name: str, workers: int = 1) -> None:
+        if sentence_transformers is None:
+            raise RuntimeError(
+                "sentence-transformers not installed. Install it with: "
+                "pip install sentence-transformers"
+            )
+        self.model = sentence_transformers.SentenceTransformer(model_name)
+        self.dimension = int(self.model.get_sentence_embedding_dimension())
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def encode(
+        self, texts: Sequence[str], batch_size: int = 32, convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        texts = list(texts)
+        if self.workers > 1 and len(texts) >= batch_size * 2:
+            vectors = self.model.encode_multi_process(texts, self._get_pool(), batch_size=batch_size)
+        else:
+            vectors = self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True)
+        return np.asarray(vectors, dtype=np.float32)
+
+    def _get_pool(self):
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = self.model.start_multi_process_pool(["cpu"] * self.workers)
+                logger.info(f"Started embedding pool with {self.workers} worker processes")
+            return self._pool
+
+    def close(self) -> None:
+        with self._pool_lock:
+            if self._pool is not None:
+                sentence_transformers.SentenceTransformer.stop_multi_process_pool(self._pool)
+                self._pool = None
+
+
+class OnnxBackend(EmbeddingBackend):
+    """The same transformer exported to ONNX and run by ONNX Runtime on CPU.
+
+    Tokenization uses the exported ``tokenizer.json`` and pooling is done in
+    NumPy, so once exported no PyTorch import is needed. With ``quantize``
+    the weights are dynamically quantized to int8.
+    """
+
+    def __init__(
+        self, model_name: str, export_dir: Path, quantize: bool = False, threads: int = 0
+    ) -> None:
+        if onnxruntime is None or tokenizers is None:
+            raise RuntimeError(
+                "ONNX backend needs onnxruntime and tokenizers. Install them with: "
+                "pip install onnxruntime tokenizers"
+            )
+        self.name = "int8" if quantize else "onnx"
+        model_path = export_onnx(model_name, export_dir, quantize=quantize)
+        config = json.loads((export_dir / "pooling.json").read_text())
+        self.dimension = int(config["dimension"])
+        self.pooling = config["pooling"]
+        self.normalize = bool(config["normalize"])
+
+        self.tokenizer = tokenizers.Tokenizer.from_file(str(export_dir / "tokenizer.json"))
+        self.tokenizer.enable_truncation(int(config["max_seq_length"]))
+        self.tokenizer.enable_padding(pad_id=int(config["pad_id"]), pad_token=config["pad_token"])
+
+        options = onnxruntime.SessionOptions()
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            str(model_path), options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {item.name for item in self.session.get_inputs()}
+
+    def encode(
+        self, texts: Sequence[str], batch_size: int = 32, convert_to_numpy: bool = True
+    ) -> np.ndarray:
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.dimension), dtype=np.float32)
+        # Batch texts of similar length together so little compute goes to padding.
+        order = np.argsort([-len(text) for text in texts], kind="stable")
+        vectors = np.zeros((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), max(1, batch_size)):
+            rows = order[start:start + batch_size]
+            encodings = self.tokenizer.encode_batch([texts[row] for row in rows])
+            mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+            feeds = {
+                "input_ids": np.array([encoding.ids for encoding in encodings], dtype=np.int64),
+                "attention_mask": mask,
+                "token_type_ids": np.array(
+                    [encoding.type_ids for encoding in encodings], dtype=np.int64
+                ),
+            }
+            token_embeddings = self.session.run(
+                ["token_embeddings"], {name: feeds[name] for name in self._inputs}
+            )[0]
+            vectors[rows] = pool_embeddings(token_embeddings, mask, self.pooling, self.normalize)
+        return vectors
+
+
+def pool_embeddings(
+    token_embeddings: np.ndarray, attention_mask: np.ndarray, mode: str, normalize: bool
+) -> np.ndarray:
+    """Sentence vectors from per-token outputs, as SentenceTransformers' Pooling does."""
+    mask = attention_mask[..., None].astype(np.float32)
+    if mode == "cls":
+        vectors = token_embeddings[:, 0]
+    elif mode == "max":
+        vectors = np.where(mask > 0, token_embeddings, -np.inf).max(axis=1)
+    elif mode == "mean":
+        vectors = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    else:
+        raise ValueError(f"Unsupported pooling mode: {mode}")
+    if normalize:
+        vectors = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+    return np.ascontiguousarray(vectors, dtype=np.float32)
+
+
+def export_onnx(model_name: str, export_dir: Path, quantize: bool = False) -> Path:
+    """Export ``model_name`` to ``export_dir`` once and return the ONNX file to load.
+
+    Exporting needs sentence-transformers and PyTorch; later loads only read
+    ``model.onnx`` (or ``model.int8.onnx``), ``tokenizer.json`` and ``pooling.json``.
+    """
+    model_path = export_dir / "model.onnx"
+    int8_path = export_dir / "model.int8.onnx"
+    if not model_path.exists():
+        _export_transformer(model_name, export_dir, model_path)
+    if not quantize:
+        return model_path
+    if not int8_path.exists():
+        quantization = importlib.import_module("onnxruntime.quantization")
+        quantization.quantize_dynamic(
+            str(model_path), str(int8_path), weight_type=quantization.QuantType.QInt8
+        )
+        logger.info(f"Wrote int8 embedding model {int8_path}")
+    return int8_path
+
+
+def _export_transformer(model_name: str, export_dir: Path, model_path: Path) -> None:
+    if sentence_transformers is None:
+        raise RuntimeError(
+            "Exporting to ONNX needs sentence-transformers. Install it with: "
+            "pip install sentence-transformers"
+        )
+    torch = importlib.import_module("torch")
+    model = sentence_transformers.SentenceTransformer(model_name, device="cpu")
+    transformer = model[0]
+    pooling = next((module for module in model if hasattr(module, "get_pooling_mode_str")), None)
+    mode = pooling.get_pooling_mode_str() if pooling is not None else "mean"
+    if mode not in POOLING_MODES:
+        raise ValueError(f"Cannot export {model_name}: unsupported pooling mode {mode}")
+    tokenizer = transformer.tokenizer
+
+    export_dir.mkdir(parents=True, exist_ok=True)
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = [
+        name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample
+    ]
+    axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    axes["token_embeddings"] = {0: "batch", 1: "sequence"}
+    transformer.auto_model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer.auto_model,
+            ({name: sample[name] for name in input_names},),
+            str(model_path),
+            input_names=input_names,
+            output_names=["token_embeddings"],
+            dynamic_axes=axes,
+            opset_version=ONNX_OPSET,
+        )
+    tokenizer.backend_tokenizer.save(str(export_dir / "tokenizer.json"))
+    (export_dir / "pooling.json").write_text(
+        json.dumps(
+            {
+                "model": model_name,
+                "dimension": int(model.get_sentence_embedding_dimension()),
+                "pooling": mode,
+                "normalize": any(type(module).__name__ == "Normalize" for module in model),
+                "max_seq_length": int(model.max_seq_length),
+                "pad_id": int(tokenizer.pad_token_id or 0),
+                "pad_token": tokenizer.pad_token or "[PAD]",
+            }
+        )
+    )
+    logger.info(f"Exported {model_name} to {model_path}")
+
+
+def create_backend(
+    kind: str, model_name: str, export_dir: Path, workers: int = 1, threads: int = 0
+) -> EmbeddingBackend:
+    kind = kind.lower()
+    if kind == "torch":
+        return TorchBackend(model_name, workers=workers)
+    if kind in ("onnx", "int8"):
+        return OnnxBackend(model_name, export_dir, quantize=kind == "int8", threads=threads)
+    raise ValueError(f"Unknown embedding backend: {kind} (expected one of {', '.join(BACKENDS)})")
+
+
+def _cosine_rows(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    a = a / np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b = b / np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    return np.sum(a * b, axis=1)
+
+
+def benchmark_backend(
+    backend: EmbeddingBackend, texts: Sequence[str], batch_size: int = 32, queries: int = 50
+) -> tuple[np.ndarray, Dict[str, Any]]:
+    """Embed ``texts`` in batches and time single-text (query) encodes."""
+    texts = list(texts)
+    backend.encode(texts[:1], batch_size=1)
+    started = time.perf_counter()
+    vectors = backend.encode(texts, batch_size=batch_size)
+    elapsed = time.perf_counter() - started
+    latencies: List[float] = []
+    for text in texts[: max(1, queries)]:
+        started = time.perf_counter()
+        backend.encode([text], batch_size=1)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return vectors, {
+        "dimension": backend.dimension,
+        "texts_per_second": round(len(texts) / elapsed, 1) if elapsed > 0 else None,
+        "query_p50_ms": round(float(np.percentile(latencies, 50)), 2),
+        "query_p95_ms": round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def compare_backends(
+    backends: Dict[str, EmbeddingBackend],
+    texts: Sequence[str],
+    reference: str = "torch",
+    batch_size: int = 32,
+) -> Dict[str, Any]:
+    """Latency, throughput and cosine agreement of each backend with ``reference``."""
+    report: Dict[str, Any] = {"texts": len(texts), "reference": reference, "backends": {}}
+    vectors: Dict[str, np.ndarray] = {}
+    for name, backend in backends.items():
+        vectors[name], report["backends"][name] = benchmark_backend(backend, texts, batch_size)
+    if reference in vectors:
+        for name, result in report["backends"].items():
+            if vectors[name].shape != vectors[reference].shape:
+                result["cosine_mean"] = result["cosine_min"] = None
+                continue
+            cosine = _cosine_rows(vectors[name], vectors[reference])
+            result["cosine_mean"] = round(float(cosine.mean()), 5)
+            result["cosine_min"] = round(float(cosine.min()), 5)
+    return report
@@ -0,0 +1,353 @@
+"""FAISS index construction, training and migration."""
+
+from __future__ import annotations
+
+import logging
+import math
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from .lazy import lazy_import
+
+faiss = lazy_import("faiss")
+
+logger = logging.getLogger(__name__)
+
+INDEX_TYPES = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+# ``faiss.ScalarQuantizer`` attribute names, resolved on use so importing stays lazy.
+QUANTIZATIONS = {
+    "none": None,
+    "fp16": "QT_fp16",
+    "int8": "QT_8bit",
+}
+AUTO_PQ_THRESHOLD = 1_000_000
+MAX_TRAINING_POINTS_PER_LIST = 256
+
+
+def resolve_index_type(configured: str, ntotal: int, threshold: int) -> str:
+    """Pick the index type a corpus of ``ntotal`` vectors should use."""
+    configured = configured.lower()
+    if configured != "auto" and configured not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type: {configured}")
+    if ntotal < threshold:
+        return "flat"
+    if configured != "auto":
+        return configured
+    return "ivf_pq" if ntotal >= AUTO_PQ_THRESHOLD else "ivf_flat"
+
+
+def resolve_quantization(configured: str, index_type: str, ntotal: int, threshold: int) -> str:
+    """Scalar quantization for the index, applied once it leaves the exact flat stage.
+
+    IVF-PQ already stores compressed codes and is never scalar quantized.
+    """
+    configured = configured.lower()
+    if configured not in QUANTIZATIONS:
+        raise ValueError(f"Unknown vector quantization: {configured}")
+    if ntotal < threshold or index_type == "ivf_pq":
+        return "none"
+    return configured
+
+
+def unwrap(index: faiss.Index) -> faiss.Index:
+    """Return the ANN index underneath an id mapping."""
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexIDMap):
+        return faiss.downcast_index(index.index)
+    return index
+
+
+def new_index(dimension: int) -> faiss.IndexIDMap2:
+    return faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
+
+
+def ensure_id_mapped(index: faiss.Index) -> faiss.IndexIDMap2:
+    """Wrap an index written before stable ids, using positions as ids."""
+    # Return the caller's object itself: a downcast proxy doesn't own the index.
+    if isinstance(index, faiss.IndexIDMap2):
+        return index
+    ids, vectors = reconstruct_all(index)
+    inner = faiss.clone_index(unwrap(index))
+    inner.reset()
+    wrapped = faiss.IndexIDMap2(inner)
+    if len(ids):
+        wrapped.add_with_ids(vectors, ids)
+    return wrapped
+
+
+def index_type_of(index: faiss.Index) -> str:
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def quantization_of(index: faiss.Index) -> str:
+    index = unwrap(index)
+    if isinstance(index, faiss.IndexHNSW):
+        index = faiss.downcast_index(index.storage)
+    if isinstance(index, (faiss.IndexScalarQuantizer, faiss.IndexIVFScalarQuantizer)):
+        for name, qtype in QUANTIZATIONS.items():
+            if qtype is not None and getattr(faiss.ScalarQuantizer, qtype) == index.sq.qtype:
+                return name
+    return "none"
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """Whether search distances are approximate because vectors are stored compressed."""
+    return quantization_of(index) != "none" or index_type_of(index) == "ivf_pq"
+
+
+def _auto_nlist(ntotal: int) -> int:
+    return max(1, min(int(4 * math.sqrt(ntotal)), ntotal // 39))
+
+
+def _auto_pq_m(dimension: int) -> int:
+    for m in range(max(1, dimension // 8), 0, -1):
+        if dimension % m == 0:
+            return m
+    return 1
+
+
+def build_index(
+    index_type: str,
+    dimension: int,
+    training_vectors: np.ndarray | None = None,
+    nlist: int = 0,
+    pq_m: int = 0,
+    hnsw_m: int = 32,
+    quantization: str = "none",
+) -> faiss.Index:
+    """Create an empty index, training it on ``training_vectors`` if required.
+
+    ``quantization`` (``fp16`` or ``int8``) stores flat, HNSW and IVF-Flat
+    vectors as scalar-quantized codes.
+    """
+    qtype = QUANTIZATIONS[quantization]
+    if qtype is not None:
+        qtype = getattr(faiss.ScalarQuantizer, qtype)
+    if qtype is None:
+        if index_type == "flat":
+            return faiss.IndexFlatL2(dimension)
+        if index_type == "hnsw":
+            return faiss.IndexHNSWFlat(dimension, hnsw_m)
+
+    if training_vectors is None or len(training_vectors) == 0:
+        raise ValueError(f"{index_type} index requires training vectors")
+    if index_type == "flat":
+        return _trained(faiss.IndexScalarQuantizer(dimension, qtype), training_vectors)
+    if index_type == "hnsw":
+        return _trained(faiss.IndexHNSWSQ(dimension, qtype, hnsw_m), training_vectors)
+    ntotal = len(training_vectors)
+    nlist = nlist or _auto_nlist(ntotal)
+    nlist = max(1, min(nlist, ntotal))
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == "ivf_flat" and qtype is not None:
+        index = faiss.IndexIVFScalarQuantizer(quantizer, dimension, nlist, qtype)
+    elif index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    elif index_type == "ivf_pq":
+        pq_m = pq_m or _auto_pq_m(dimension)
+        if dimension % pq_m != 0:
+            raise ValueError(f"PQ_M={pq_m} must divide the embedding dimension {dimension}")
+        nbits = max(1, min(8, int(math.log2(ntotal))))
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, pq_m, nbits)
+    else:
+        raise ValueError(f"Unknown index type: {index_type}")
+
+    return _trained(index, training_vectors, nlist * MAX_TRAINING_POINTS_PER_LIST)
+
+
+def _trained(
+    index: faiss.Index, training_vectors: np.ndarray, max_points: int = 65536
+) -> faiss.Index:
+    sample = training_vectors
+    ntotal = len(training_vectors)
+    if ntotal > max_points:
+        rng = np.random.default_rng(0)
+        sample = training_vectors[rng.choice(ntotal, size=max_points, replace=False)]
+    index.train(np.ascontiguousarray(sample, dtype=np.float32))
+    return index
+
+
+def reconstruct_all(index: faiss.Index) -> Tuple[np.ndarray, np.ndarray]:
+    """Return ``(ids, vectors)`` so an index can be rebuilt without re-embedding.
+
+    Indexes written before ids were introduced use positions as ids.
+    """
+    wrapper = faiss.downcast_index(index)
+    inner = unwrap(wrapper)
+    if inner.ntotal == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, inner.d), dtype=np.float32)
+    if isinstance(inner, faiss.IndexIVF):
+        positions, vectors = _read_inverted_lists(inner)
+    else:
+        positions = np.arange(inner.ntotal, dtype=np.int64)
+        vectors = inner.reconstruct_n(0, inner.ntotal)
+    if isinstance(wrapper, faiss.IndexIDMap):
+        return faiss.vector_to_array(wrapper.id_map).astype(np.int64)[positions], vectors
+    return positions, vectors
+
+
+def _read_inverted_lists(ivf: faiss.IndexIVF) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode every entry of an IVF index with the id stored next to it, in id order."""
+    invlists = ivf.invlists
+    # sa_decode expects each code prefixed with its little-endian list number.
+    coarse_size = ivf.coarse_code_size()
+    ids, vectors = [], []
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size == 0:
+            continue
+        ids.append(faiss.rev_swig_ptr(invlists.get_ids(list_no), size).copy())
+        codes = faiss.rev_swig_ptr(invlists.get_codes(list_no), size * invlists.code_size)
+        prefix = np.frombuffer(np.int64(list_no).astype("<i8").tobytes()[:coarse_size], np.uint8)
+        codes = np.hstack([np.tile(prefix, (size, 1)), codes.reshape(size, invlists.code_size)])
+        vectors.append(ivf.sa_decode(np.ascontiguousarray(codes)))
+    ids = np.concatenate(ids).astype(np.int64)
+    order = np.argsort(ids, kind="stable")
+    return ids[order], np.vstack(vectors)[order]
+
+
+def migrate_index(
+    index: faiss.Index,
+    index_type: str,
+    extra_ids: np.ndarray | None = None,
+    extra_vectors: np.ndarray | None = None,
+    nlist: int = 0,
+    pq_m: int = 0,
+    hnsw_m: int = 32,
+    quantization: str = "none",
+) -> faiss.IndexIDMap2:
+    """Rebuild ``index`` as an id-mapped ``index_type`` from its own stored vectors.
+
+    A quantized source index contributes its decoded vectors.
+    """
+    ids, vectors = reconstruct_all(index)
+    if extra_vectors is not None and len(extra_vectors):
+        ids = np.concatenate([ids, extra_ids.astype(np.int64)])
+        vectors = np.vstack([vectors, extra_vectors.astype(np.float32)])
+    logger.info(
+        f"Migrating {index_type_of(index)}/{quantization_of(index)} index to "
+        f"{index_type}/{quantization} ({len(vectors)} vectors)"
+    )
+    inner = build_index(
+        index_type,
+        index.d,
+        vectors,
+        nlist=nlist,
+        pq_m=pq_m,
+        hnsw_m=hnsw_m,
+        quantization=quantization,
+    )
+    migrated = faiss.IndexIDMap2(inner)
+    if len(vectors):
+        migrated.add_with_ids(vectors, ids)
+    return migrated
+
+
+def max_id(index: faiss.Index) -> int:
+    index = faiss.downcast_index(index)
+    if index.ntotal == 0:
+        return -1
+    if isinstance(index, faiss.IndexIDMap):
+        return int(faiss.vector_to_array(index.id_map).max())
+    return index.ntotal - 1
+
+
+def remove_ids(index: faiss.IndexIDMap2, ids: Iterable[int]) -> faiss.IndexIDMap2:
+    """Physically drop ``ids``; indexes without removal support (HNSW) are rebuilt."""
+    id_array = np.fromiter(ids, dtype=np.int64)
+    if len(id_array) == 0:
+        return index
+    inner = unwrap(index)
+    if isinstance(inner, faiss.IndexIVF):
+        return _remove_from_ivf(index, inner, id_array)
+    try:
+        index.remove_ids(faiss.IDSelectorBatch(id_array))
+        return index
+    except RuntimeError:
+        pass
+    all_ids, vectors = reconstruct_all(index)
+    keep = ~np.isin(all_ids, id_array)
+    inner = faiss.clone_index(unwrap(index))
+    inner.reset()
+    rebuilt = faiss.IndexIDMap2(inner)
+    if keep.any():
+        rebuilt.add_with_ids(vectors[keep], all_ids[keep])
+    return rebuilt
+
+
+def _remove_from_ivf(
+    index: faiss.IndexIDMap2, ivf: faiss.IndexIVF, id_array: np.ndarray
+) -> faiss.IndexIDMap2:
+    """Remove ``id_array`` from an id-mapped IVF index, keeping the codes as they are.
+
+    The inverted lists store positions in the wrapper's ``id_map``, and IVF
+    removal leaves the remaining positions untouched, so
+    ``IndexIDMap2.remove_ids`` (which compacts ``id_map``) would point every
+    later entry at the wrong id. Renumber the lists to the compacted map instead.
+    """
+    id_map = faiss.vector_to_array(index.id_map)
+    keep = ~np.isin(id_map, id_array)
+    if keep.all():
+        return index
+    ivf.set_direct_map_type(faiss.DirectMap.NoMap)
+    ivf.remove_ids(faiss.IDSelectorBatch(np.flatnonzero(~keep).astype(np.int64)))
+    new_positions = np.cumsum(keep, dtype=np.int64) - 1
+    invlists = ivf.invlists
+    for list_no in range(ivf.nlist):
+        size = invlists.list_size(list_no)
+        if size == 0:
+            continue
+        positions = new_positions[faiss.rev_swig_ptr(invlists.get_ids(list_no), size)]
+        invlists.update_entries(
+            list_no, 0, size, faiss.swig_ptr(positions), invlists.get_codes(list_no)
+        )
+    faiss.copy_array_to_vector(id_map[keep], index.id_map)
+    index.ntotal = ivf.ntotal
+    index.construct_rev_map()
+    return index
+
+
+def exclusion_selector(ids: Iterable[int]) -> faiss.IDSelector | None:
+    id_array = np.fromiter(ids, dtype=np.int64)
+    if len(id_array) == 0:
+        return None
+    batch = faiss.IDSelectorBatch(id_array)
+    selector = faiss.IDSelectorNot(batch)
+    selector._batch = batch
+    return selector
+
+
+def search_params(
+    index: faiss.Index,
+    nprobe: int | None = None,
+    ef_search: int | None = None,
+    selector: faiss.IDSelector | None = None,
+) -> faiss.SearchParameters | None:
+    index_type = index_type_of(index)
+    if index_type in ("ivf_flat", "ivf_pq") and nprobe:
+        return faiss.SearchParametersIVF(nprobe=int(nprobe), sel=selector)
+    if index_type == "hnsw" and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=int(ef_search), sel=selector)
+    if selector is not None:
+        return faiss.SearchParameters(sel=selector)
+    return None
+
+
+def recall_at_k(found: np.ndarray, truth: np.ndarray, k: int) -> float:
+    """Mean fraction of each row's true top ``k`` ids that appear in ``found``'s top ``k``."""
+    if len(truth) == 0:
+        return 1.0
+    hits = [
+        len(set(found_row[:k].tolist()) & set(truth_row[:k].tolist()) - {-1})
+        / max(1, len(set(truth_row[:k].tolist()) - {-1}))
+        for found_row, truth_row in zip(found, truth)
+    ]
+    return float(np.mean(hits))
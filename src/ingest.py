@@ -0,0 +1,290 @@
+"""Bulk ingestion of PDF directories with pipelined stages and checkpoints."""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+from .config import settings
+from .data_processing import (
+    DocumentChunk,
+    document_source,
+    file_sha256,
+    iter_page_chunks,
+    iter_pdf_pages,
+)
+from .retriever import VectorStore
+
+logger = logging.getLogger(__name__)
+
+_DONE = object()
+
+
+@dataclass
+class IngestStats:
+    files: int = 0
+    skipped: int = 0
+    unchanged: int = 0
+    failed: List[str] = field(default_factory=list)
+    pages: int = 0
+    chunks: int = 0
+    started: float = field(default_factory=time.perf_counter)
+
+    @property
+    def elapsed(self) -> float:
+        return max(time.perf_counter() - self.started, 1e-9)
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.elapsed
+
+    @property
+    def chunks_per_second(self) -> float:
+        return self.chunks / self.elapsed
+
+
+class IngestCheckpoint:
+    """Append-only JSON-lines record of files that were fully written to the store.
+
+    A file is identified by its resolved path, size and mtime, so an edited
+    file is ingested again on the next run.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.completed: dict[str, Tuple[int, int]] = {}
+        if path.exists():
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.completed[entry["path"]] = (entry["size"], entry["mtime_ns"])
+
+    @staticmethod
+    def _signature(pdf_path: Path) -> Tuple[str, int, int]:
+        stat = pdf_path.stat()
+        return str(pdf_path.resolve()), stat.st_size, stat.st_mtime_ns
+
+    def is_done(self, pdf_path: Path) -> bool:
+        key, size, mtime_ns = self._signature(pdf_path)
+        return self.completed.get(key) == (size, mtime_ns)
+
+    def mark_done(self, pdf_path: Path, chunks: int) -> None:
+        key, size, mtime_ns = self._signature(pdf_path)
+        self.completed[key] = (size, mtime_ns)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a", encoding="utf-8") as fp:
+            fp.write(
+                json.dumps({"path": key, "size": size, "mtime_ns": mtime_ns, "chunks": chunks}) + "\n"
+            )
+            fp.flush()
+            os.fsync(fp.fileno())
+
+
+def _extract_file(
+    pdf_path: str, source: str, chunk_size: int, overlap: int
+) -> Tuple[int, List[DocumentChunk], Optional[str]]:
+    """Process-pool stage: pages → chunks for one file."""
+    path = Path(pdf_path)
+    pages = 0
+
+    def counted_pages() -> Iterator[str]:
+        nonlocal pages
+        for page in iter_pdf_pages(path):
+            pages += 1
+            yield page
+
+    try:
+        chunks = list(
+            iter_page_chunks(counted_pages(), path.stem, source, chunk_size, overlap)
+        )
+    except Exception as e:
+        return pages, [], str(e)
+    return pages, chunks, None
+
+
+def _get(source: queue.Queue, stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return source.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def _put(target: queue.Queue, item, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            target.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def ingest_directory(
+    directory: Path,
+    pattern: str = "*.pdf",
+    store: VectorStore | None = None,
+    checkpoint_path: Path | None = None,
+    workers: int | None = None,
+    report: Callable[[str], None] = print,
+    collection: str | None = None,
+) -> IngestStats:
+    """Ingest every file matching ``pattern`` under ``directory``.
+
+    Extraction runs in a process pool, embedding in a background thread and
+    index writes on the calling thread, connected by bounded queues so the
+    three stages overlap. Finished files are appended to the checkpoint, so
+    an interrupted run picks up where it stopped.
+
+    Documents are keyed by ``document_source``, as uploads are; of several
+    matching files with the same name only the first is ingested.
+    """
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    store = store or VectorStore()
+    checkpoint = IngestCheckpoint(checkpoint_path or directory / ".ingest_checkpoint.jsonl")
+    files = sorted(path for path in directory.glob(pattern) if path.is_file())
+    stats = IngestStats()
+    todo = []
+    sources: dict[Path, str] = {}
+    owners: dict[str, Path] = {}
+    for path in files:
+        source = document_source(path, collection)
+        if source in owners:
+            stats.failed.append(str(path))
+            report(f"{path}: skipped, same file name as {owners[source]}")
+            continue
+        sources[path], owners[source] = source, path
+        if checkpoint.is_done(path):
+            stats.skipped += 1
+        else:
+            todo.append(path)
+    report(f"Ingesting {len(todo)} files ({stats.skipped} already done) with {workers} workers")
+
+    extracted: queue.Queue = queue.Queue(maxsize=workers * 2)
+    embedded: queue.Queue = queue.Queue(maxsize=8)
+    stop = threading.Event()
+
+    def changed_files() -> Iterator[Tuple[Path, str]]:
+        for path in todo:
+            digest = file_sha256(path)
+            if store.document_hash(sources[path]) == digest:
+                if not _put(extracted, (path, digest, 0, [], None, True), stop):
+                    return
+            else:
+                yield path, digest
+
+    def submit(pool: ProcessPoolExecutor, path: Path, digest: str):
+        future = pool.submit(
+            _extract_file, str(path), sources[path], settings.chunk_size, settings.chunk_overlap
+        )
+        return path, digest, future
+
+    def extract_stage() -> None:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                files = changed_files()
+                pending = deque(submit(pool, *item) for item in islice(files, workers * 2))
+                while pending and not stop.is_set():
+                    path, digest, future = pending.popleft()
+                    pages, chunks, error = future.result()
+                    next_file = next(files, None)
+                    if next_file is not None:
+                        pending.append(submit(pool, *next_file))
+                    if not _put(extracted, (path, digest, pages, chunks, error, False), stop):
+                        break
+                for _, _, future in pending:
+                    future.cancel()
+        except Exception as e:
+            _put(extracted, e, stop)
+        _put(extracted, _DONE, stop)
+
+    def embed_stage() -> None:
+        try:
+            while True:
+                item = _get(extracted, stop)
+                if item is _DONE or isinstance(item, Exception):
+                    _put(embedded, item, stop)
+                    return
+                path, digest, pages, chunks, error, unchanged = item
+                if error is None and not unchanged:
+                    # Replace whatever an older version of this file left in the store.
+                    if not _put(embedded, ("begin", sources[path]), stop):
+                        return
+                    batches = store.embedding_service.embed_batches(chunks, text=lambda c: c.text)
+                    for batch, vectors in batches:
+                        if not _put(embedded, ("batch", batch, vectors), stop):
+                            return
+                file_done = ("file", path, digest, pages, len(chunks), error, unchanged)
+                if not _put(embedded, file_done, stop):
+                    return
+        except Exception as e:
+            _put(embedded, e, stop)
+
+    threads = [
+        threading.Thread(target=extract_stage, name="ingest-extract", daemon=True),
+        threading.Thread(target=embed_stage, name="ingest-embed", daemon=True),
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        done = 0
+        while True:
+            item = embedded.get()
+            if item is _DONE:
+                break
+            if isinstance(item, Exception):
+                raise item
+            if item[0] == "begin":
+                store.delete(source=item[1])
+                continue
+            if item[0] == "batch":
+                _, batch, vectors = item
+                if vectors.size:
+                    store.add_embeddings(batch, vectors)
+                continue
+
+            _, path, digest, pages, chunk_count, error, unchanged = item
+            done += 1
+            if error is not None:
+                stats.failed.append(str(path))
+                report(f"[{done}/{len(todo)}] {path.name}: failed ({error})")
+                continue
+            checkpoint.mark_done(path, chunk_count)
+            if unchanged:
+                stats.unchanged += 1
+                report(f"[{done}/{len(todo)}] {path.name}: unchanged, skipped")
+                continue
+            store.register_document(sources[path], digest, chunk_count)
+            stats.files += 1
+            stats.pages += pages
+            stats.chunks += chunk_count
+            report(
+                f"[{done}/{len(todo)}] {path.name}: {pages} pages, {chunk_count} chunks "
+                f"({stats.pages_per_second:.1f} pages/s, {stats.chunks_per_second:.1f} chunks/s)"
+            )
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+
+    report(
+        f"Ingested {stats.files} files, {stats.pages} pages, {stats.chunks} chunks in "
+        f"{stats.elapsed:.1f}s ({stats.pages_per_second:.1f} pages/s, "
+        f"{stats.chunks_per_second:.1f} chunks/s); {stats.unchanged} unchanged, "
+        f"{len(stats.failed)} failed"
+    )
+    return stats
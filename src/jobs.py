@@ -0,0 +1,155 @@
+"""Background ingestion jobs with status and progress reporting."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional
+
+from .data_processing import (
+    DocumentChunk,
+    document_source,
+    extraction_pool,
+    file_sha256,
+    iter_pdf_chunks,
+)
+from .retriever import VectorStore
+
+logger = logging.getLogger(__name__)
+
+JOB_STATUSES = ("queued", "running", "completed", "unchanged", "failed")
+
+
+@dataclass
+class IngestJob:
+    id: str
+    filename: str
+    status: str = "queued"
+    pages_done: int = 0
+    pages_total: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def progress(self) -> float:
+        if self.status in ("completed", "unchanged"):
+            return 1.0
+        return self.pages_done / self.pages_total if self.pages_total else 0.0
+
+    def to_dict(self) -> dict:
+        return {**asdict(self), "progress": round(self.progress, 4)}
+
+
+class JobQueue:
+    """Runs PDF ingestion on a small thread pool and keeps each job's status.
+
+    ``submit`` returns immediately. Finished jobs beyond ``max_history`` are
+    forgotten, oldest first. With ``extraction_workers > 1`` large PDFs are
+    extracted in one process pool shared by all jobs, started on first use
+    and closed by ``shutdown``.
+    """
+
+    def __init__(
+        self,
+        store: VectorStore,
+        workers: int = 1,
+        extraction_workers: int = 1,
+        max_history: int = 1000,
+    ) -> None:
+        self.store = store
+        self.extraction_workers = extraction_workers
+        self.max_history = max_history
+        self._jobs: OrderedDict[str, IngestJob] = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="ingest"
+        )
+        self._extraction_pool: ProcessPoolExecutor | None = None
+
+    def submit(
+        self, pdf_path: Path, store: VectorStore | None = None, collection: str | None = None
+    ) -> IngestJob:
+        """Queue ``pdf_path`` for ingestion into ``store`` (default: the queue's store).
+
+        ``collection`` names ``store`` so its files are staged in their own directory.
+        """
+        job = IngestJob(id=uuid.uuid4().hex, filename=pdf_path.name)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._trim()
+        self._executor.submit(self._run, job, pdf_path, store or self.store, collection)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _trim(self) -> None:
+        finished = [
+            job_id
+            for job_id, job in self._jobs.items()
+            if job.status not in ("queued", "running")
+        ]
+        for job_id in finished[: max(0, len(self._jobs) - self.max_history)]:
+            del self._jobs[job_id]
+
+    def _pool(self) -> ProcessPoolExecutor | None:
+        if self.extraction_workers <= 1:
+            return None
+        with self._lock:
+            if self._extraction_pool is None:
+                self._extraction_pool = extraction_pool(self.extraction_workers)
+            return self._extraction_pool
+
+    def _count_chunks(
+        self, job: IngestJob, chunks: Iterable[DocumentChunk]
+    ) -> Iterator[DocumentChunk]:
+        for chunk in chunks:
+            job.chunks += 1
+            yield chunk
+
+    def _on_page(self, job: IngestJob, done: int, total: int) -> None:
+        job.pages_done, job.pages_total = done, total
+
+    def _run(
+        self, job: IngestJob, pdf_path: Path, store: VectorStore, collection: str | None
+    ) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        try:
+            chunks = iter_pdf_chunks(
+                pdf_path,
+                workers=self.extraction_workers,
+                on_page=lambda done, total: self._on_page(job, done, total),
+                collection=collection,
+                pool=self._pool(),
+            )
+            added = store.upsert_document(
+                document_source(pdf_path, collection),
+                file_sha256(pdf_path),
+                self._count_chunks(job, chunks),
+            )
+            job.status = "unchanged" if added is None else "completed"
+            logger.info(f"Ingestion job {job.id} {job.status}: {job.filename} ({job.chunks} chunks)")
+        except Exception as e:
+            logger.exception(f"Ingestion job {job.id} failed: {job.filename}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait)
+        with self._lock:
+            pool, self._extraction_pool = self._extraction_pool, None
+        if pool is not None:
+            pool.shutdown(wait=wait)
@@ -0,0 +1,30 @@
+"""Deferred imports for heavy dependencies."""
+
+from __future__ import annotations
+
+import importlib.util
+import sys
+from types import ModuleType
+
+
+def lazy_import(name: str, optional: bool = False) -> ModuleType | None:
+    """Return module ``name`` without executing it until an attribute is first used.
+
+    Keeps faiss, torch and the HTTP clients out of import time for code
+    paths (CLI ``--help``, UI first paint) that never touch them. With
+    ``optional``, a module that isn't installed yields ``None``.
+    """
+    module = sys.modules.get(name)
+    if module is not None:
+        return module
+    spec = importlib.util.find_spec(name)
+    if spec is None:
+        if optional:
+            return None
+        raise ModuleNotFoundError(f"No module named {name!r}", name=name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -2,27 +2,41 @@
 
 from __future__ import annotations
 
+import asyncio
 import logging
-from typing import Sequence
+import time
+from typing import Iterator, Sequence
 
-try:
-    from openai import OpenAI
-except ImportError:
-    OpenAI = None
+import numpy as np
 
+from . import metrics
+from .cache import AnswerCache, content_key
 from .config import settings
+from .context import count_tokens, pack_context
+from .lazy import lazy_import
+from .llm_client import (
+    COMPLETION_TOKEN_ESTIMATE,
+    RETRY_STATUSES,
+    AsyncLLMClient,
+    backoff_delay,
+    parse_retry_after,
+    shared_limiter,
+)
 
+openai = lazy_import("openai", optional=True)
 logger = logging.getLogger(__name__)
 
 
 class LLMService:
     def __init__(self) -> None:
         self.client = None
-        if settings.groq_api_key and OpenAI is not None:
+        if settings.groq_api_key and openai is not None:
             try:
-                self.client = OpenAI(
+                # Retries follow the same policy and TPM budget as the async client.
+                self.client = openai.OpenAI(
                     api_key=settings.groq_api_key,
-                    base_url=settings.api_base_url
+                    base_url=settings.api_base_url,
+                    max_retries=0,
                 )
                 logger.info(f"Groq LLM client initialized: {settings.llm_model}")
             except Exception as e:
@@ -31,74 +45,231 @@ class LLMService:
         else:
             if not settings.groq_api_key:
                 logger.warning("GROQ_API_KEY not set. Configure it in .env file or Streamlit secrets.")
-            if OpenAI is None:
+            if openai is None:
                 logger.warning("openai package not installed. Install it with: pip install openai")
 
+        self.limiter = (
+            shared_limiter(settings.llm_tokens_per_minute)
+            if settings.llm_tokens_per_minute > 0
+            else None
+        )
+        self.async_client: AsyncLLMClient | None = None
+        if settings.groq_api_key:
+            try:
+                self.async_client = AsyncLLMClient(
+                    api_key=settings.groq_api_key,
+                    base_url=settings.api_base_url,
+                    model=settings.llm_model,
+                    limiter=self.limiter,
+                    max_retries=settings.llm_max_retries,
+                    max_connections=settings.llm_max_connections,
+                )
+            except RuntimeError as e:
+                logger.warning(f"Async LLM client unavailable: {e}")
+
+        self.answer_cache: AnswerCache | None = None
+        if settings.answer_cache_size > 0:
+            self.answer_cache = AnswerCache(
+                settings.answer_cache_path,
+                max_entries=settings.answer_cache_size,
+                ttl=settings.answer_cache_ttl,
+                threshold=settings.answer_cache_threshold,
+            )
+
     def _estimate_tokens(self, text: str) -> int:
-        return len(text) // 4
+        return count_tokens(text)
 
-    def _truncate_chunks(self, chunks: Sequence[str], max_tokens: int = 2500) -> list[str]:
-        truncated = []
-        total_tokens = 0
-        max_chunk_length = 400
-        max_chunks = 4
-        
-        for i, chunk in enumerate(chunks):
-            if i >= max_chunks or total_tokens >= max_tokens:
-                break
-            
-            chunk_text = str(chunk)
-            if len(chunk_text) > max_chunk_length:
-                chunk_text = chunk_text[:max_chunk_length] + "..."
-            
-            chunk_tokens = self._estimate_tokens(chunk_text)
-            if total_tokens + chunk_tokens > max_tokens:
-                remaining = max_tokens - total_tokens
-                if remaining > 100:
-                    chunk_text = chunk_text[:remaining * 4]
-                    truncated.append(chunk_text)
-                break
-            
-            truncated.append(chunk_text)
-            total_tokens += chunk_tokens
-        
-        return truncated
+    def _prompt_tokens(self, messages: Sequence[dict]) -> int:
+        return sum(self._estimate_tokens(message["content"]) for message in messages)
+
+    def _pack_context(self, chunks: Sequence[str]) -> list[str]:
+        with metrics.span("context_pack"):
+            return pack_context(chunks, max_tokens=settings.context_max_tokens)
+
+    def _cached_answer(
+        self, context_hash: str, query: str, query_embedding: np.ndarray | None
+    ) -> str | None:
+        if self.answer_cache is None:
+            return None
+        with metrics.span("answer_cache_lookup"):
+            cached = self.answer_cache.get(context_hash, query, query_embedding)
+        metrics.count("answer_cache_hits" if cached is not None else "answer_cache_misses")
+        return cached
+
+    def _messages(self, query: str, packed_chunks: Sequence[str]) -> list[dict]:
+        prompt = (
+            "Answer the question using only the provided context. "
+            "If the answer isn't in the context, say you don't know.\n\n"
+            "Context:\n" + "\n---\n".join(packed_chunks) + f"\n\nQuestion: {query}"
+        )
+        return [
+            {"role": "system", "content": "You are a helpful document assistant."},
+            {"role": "user", "content": prompt},
+        ]
+
+    def _create_completion(self, messages: list[dict], **params):
+        """Sync chat completion drawn from the shared TPM budget, retrying like the async client.
+
+        A stream is retried only until it starts; errors mid-stream surface to the caller.
+        """
+        cost = self._prompt_tokens(messages) + COMPLETION_TOKEN_ESTIMATE
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.wait(cost)
+            try:
+                return self.client.chat.completions.create(
+                    model=settings.llm_model, messages=messages, temperature=0.2, **params
+                )
+            except Exception as e:
+                status = getattr(e, "status_code", None)
+                connection_error = openai is not None and isinstance(e, openai.APIConnectionError)
+                if status not in RETRY_STATUSES and not connection_error:
+                    raise
+                if attempt >= settings.llm_max_retries:
+                    raise
+                response = getattr(e, "response", None)
+                headers = getattr(response, "headers", None) or {}
+                delay = backoff_delay(attempt, parse_retry_after(headers.get("retry-after")))
+                metrics.count("llm_retries")
+                logger.warning(
+                    f"{e}; retrying in {delay:.1f}s ({attempt + 1}/{settings.llm_max_retries})"
+                )
+                time.sleep(delay)
+                attempt += 1
+
+    def _api_error_message(self, e: Exception) -> str:
+        error_str = str(e).lower()
+        logger.error(f"Groq API error: {e}")
+        metrics.count("llm_errors")
+        if '429' in error_str or 'quota' in error_str or 'rate_limit' in error_str or '413' in error_str:
+            if '413' in error_str or 'too large' in error_str:
+                return "Request too large. Try a more specific question or wait a moment."
+            return "Rate limit exceeded. Wait a few seconds and try again."
+        elif '401' in error_str or 'unauthorized' in error_str:
+            return "Authentication failed. Check your GROQ_API_KEY in .env or Streamlit secrets"
+        else:
+            return f"API error: {str(e)}"
+
+    def generate_answer(
+        self,
+        query: str,
+        context_chunks: Sequence[str],
+        query_embedding: np.ndarray | None = None,
+    ) -> str:
+        """Answer ``query`` from ``context_chunks``.
 
-    def generate_answer(self, query: str, context_chunks: Sequence[str]) -> str:
+        Pass the question's embedding to let paraphrases of an earlier
+        question over the same context reuse its cached answer.
+        """
         if not context_chunks:
             return "No relevant information found in the documents."
 
         if self.client:
             try:
-                truncated_chunks = self._truncate_chunks(context_chunks, max_tokens=3000)
-                
-                prompt = (
-                    "Answer the question using only the provided context. "
-                    "If the answer isn't in the context, say you don't know.\n\n"
-                    "Context:\n" + "\n---\n".join(truncated_chunks) + f"\n\nQuestion: {query}"
-                )
-                
-                response = self.client.chat.completions.create(
-                    model=settings.llm_model,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful document assistant."},
-                        {"role": "user", "content": prompt},
-                    ],
-                    temperature=0.2,
-                )
-                return response.choices[0].message.content or ""
+                packed_chunks = self._pack_context(context_chunks)
+                context_hash = content_key(settings.llm_model, *packed_chunks)
+                cached = self._cached_answer(context_hash, query, query_embedding)
+                if cached is not None:
+                    return cached
+
+                with metrics.span("llm_call"):
+                    response = self._create_completion(self._messages(query, packed_chunks))
+                answer = response.choices[0].message.content or ""
+                if answer and self.answer_cache is not None:
+                    self.answer_cache.put(context_hash, query, answer, query_embedding)
+                return answer
             except Exception as e:
-                error_str = str(e).lower()
-                logger.error(f"Groq API error: {e}")
-                if '429' in error_str or 'quota' in error_str or 'rate_limit' in error_str or '413' in error_str:
-                    if '413' in error_str or 'too large' in error_str:
-                        return "Request too large. Try a more specific question or wait a moment."
-                    return "Rate limit exceeded. Wait a few seconds and try again."
-                elif '401' in error_str or 'unauthorized' in error_str:
-                    return "Authentication failed. Check your GROQ_API_KEY in .env or Streamlit secrets"
-                else:
-                    return f"API error: {str(e)}"
+                return self._api_error_message(e)
+
+        return self._offline_answer(query, context_chunks)
+
+    async def agenerate_answer(
+        self,
+        query: str,
+        context_chunks: Sequence[str],
+        query_embedding: np.ndarray | None = None,
+    ) -> str:
+        """Async ``generate_answer``: retries rate limits and queues on the TPM budget."""
+        if not context_chunks:
+            return "No relevant information found in the documents."
+        if self.async_client is None:
+            return await asyncio.to_thread(
+                self.generate_answer, query, context_chunks, query_embedding
+            )
+
+        # Token counting and the SQLite answer cache stay off the event loop.
+        packed_chunks = await asyncio.to_thread(self._pack_context, context_chunks)
+        context_hash = content_key(settings.llm_model, *packed_chunks)
+        cached = await asyncio.to_thread(self._cached_answer, context_hash, query, query_embedding)
+        if cached is not None:
+            return cached
 
+        messages = self._messages(query, packed_chunks)
+        estimated_tokens = await asyncio.to_thread(self._prompt_tokens, messages)
+        try:
+            with metrics.span("llm_call"):
+                answer = await self.async_client.chat(
+                    messages, estimated_tokens=estimated_tokens, temperature=0.2
+                )
+        except Exception as e:
+            return self._api_error_message(e)
+        if answer and self.answer_cache is not None:
+            await asyncio.to_thread(
+                self.answer_cache.put, context_hash, query, answer, query_embedding
+            )
+        return answer
+
+    def stream_answer(
+        self,
+        query: str,
+        context_chunks: Sequence[str],
+        query_embedding: np.ndarray | None = None,
+    ) -> Iterator[str]:
+        """Yield the answer as text deltas while the model generates it.
+
+        Cached, offline and error answers arrive as a single piece.
+        """
+        if not context_chunks:
+            yield "No relevant information found in the documents."
+            return
+
+        if not self.client:
+            yield self._offline_answer(query, context_chunks)
+            return
+
+        packed_chunks = self._pack_context(context_chunks)
+        context_hash = content_key(settings.llm_model, *packed_chunks)
+        cached = self._cached_answer(context_hash, query, query_embedding)
+        if cached is not None:
+            yield cached
+            return
+
+        parts: list[str] = []
+        started = time.perf_counter()
+        try:
+            stream = self._create_completion(self._messages(query, packed_chunks), stream=True)
+            for event in stream:
+                if not event.choices:
+                    continue
+                delta = event.choices[0].delta.content
+                if delta:
+                    if not parts:
+                        metrics.record("llm_first_token", time.perf_counter() - started)
+                    parts.append(delta)
+                    yield delta
+        except Exception as e:
+            # Tokens already sent can't be retracted; append the error after them.
+            message = self._api_error_message(e)
+            yield f"\n\n{message}" if parts else message
+            return
+
+        metrics.record("llm_stream", time.perf_counter() - started)
+        answer = "".join(parts)
+        if answer and self.answer_cache is not None:
+            self.answer_cache.put(context_hash, query, answer, query_embedding)
+
+    def _offline_answer(self, query: str, context_chunks: Sequence[str]) -> str:
         query_lower = query.lower()
         query_words = {w.strip('.,!?;:') for w in query_lower.split() if len(w) > 2}
         
@@ -134,3 +305,6 @@ class LLMService:
             summary += '.'
         
         return f"{summary}\n\n(Offline mode - set GROQ_API_KEY for AI answers)"
+
+    def cache_stats(self) -> dict:
+        return self.answer_cache.stats() if self.answer_cache is not None else {}
@@ -0,0 +1,195 @@
+"""Async OpenAI-compatible chat client with pooling, retries and a TPM budget."""
+
+from __future__ import annotations
+
+import asyncio
+import email.utils
+import logging
+import random
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from . import metrics
+from .lazy import lazy_import
+
+httpx = lazy_import("httpx", optional=True)
+logger = logging.getLogger(__name__)
+
+RETRY_STATUSES = {408, 409, 429, 500, 502, 503, 504}
+# Completion tokens reserved per request; Groq counts them against the TPM limit.
+COMPLETION_TOKEN_ESTIMATE = 512
+
+
+class LLMRequestError(RuntimeError):
+    """Raised when a chat request fails permanently or runs out of retries."""
+
+    def __init__(self, message: str, status_code: int | None = None) -> None:
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class TokenBucket:
+    """Tokens-per-minute budget shared by every request in the process.
+
+    ``acquire`` reserves tokens up front and sleeps until the bucket has
+    refilled enough to cover them, so callers queue in arrival order instead
+    of failing. The bucket is guarded by a thread lock rather than an
+    ``asyncio.Lock``, which lets it be shared across event loops.
+    """
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens: int) -> float:
+        """Take ``tokens`` from the bucket and return the seconds to wait before using them."""
+        if self.rate <= 0:
+            return 0.0
+        tokens = min(float(tokens), self.capacity)
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            return max(0.0, -self._tokens / self.rate)
+
+    def _queued(self, tokens: int) -> float:
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.info(f"Token budget exhausted, queueing request for {wait:.1f}s")
+            metrics.record("llm_rate_limit_wait", wait)
+        return wait
+
+    async def acquire(self, tokens: int) -> None:
+        wait = self._queued(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def wait(self, tokens: int) -> None:
+        """Blocking ``acquire`` for synchronous callers."""
+        wait = self._queued(tokens)
+        if wait > 0:
+            time.sleep(wait)
+
+
+_limiters: Dict[int, TokenBucket] = {}
+_limiters_lock = threading.Lock()
+
+
+def shared_limiter(tokens_per_minute: int) -> TokenBucket:
+    with _limiters_lock:
+        if tokens_per_minute not in _limiters:
+            _limiters[tokens_per_minute] = TokenBucket(tokens_per_minute)
+        return _limiters[tokens_per_minute]
+
+
+def parse_retry_after(value: str | None) -> Optional[float]:
+    """Seconds from a ``Retry-After`` header (delta-seconds or HTTP date)."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def backoff_delay(
+    attempt: int, retry_after: float | None = None, base: float = 0.5, cap: float = 30.0
+) -> float:
+    """Full-jitter exponential backoff, never shorter than the server's ``Retry-After``."""
+    delay = random.uniform(0, min(cap, base * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after)
+    return delay
+
+
+class AsyncLLMClient:
+    """Chat completions over a pooled ``httpx.AsyncClient``.
+
+    Retryable failures (429, 5xx, timeouts, dropped connections) back off
+    with jitter and honor ``Retry-After``; every attempt first draws its
+    estimated token cost from ``limiter``.
+    """
+
+    def __init__(
+        self,
+        api_key: str,
+        base_url: str,
+        model: str,
+        limiter: TokenBucket | None = None,
+        max_retries: int = 5,
+        max_connections: int = 10,
+        timeout: float = 60.0,
+    ) -> None:
+        if httpx is None:
+            raise RuntimeError("httpx package not installed. Install it with: pip install httpx")
+        self.model = model
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self._base_url = base_url.rstrip("/")
+        self._headers = {"Authorization": f"Bearer {api_key}"}
+        self._limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self._timeout = timeout
+        # Pools are bound to the event loop that created them.
+        self._clients: Dict[int, Any] = {}
+
+    def _client(self) -> "httpx.AsyncClient":
+        loop_id = id(asyncio.get_running_loop())
+        client = self._clients.get(loop_id)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=self._base_url,
+                headers=self._headers,
+                limits=self._limits,
+                timeout=self._timeout,
+            )
+            self._clients[loop_id] = client
+        return client
+
+    async def chat(self, messages: List[dict], estimated_tokens: int = 0, **params: Any) -> str:
+        payload = {"model": self.model, "messages": messages, **params}
+        cost = estimated_tokens + params.get("max_tokens", COMPLETION_TOKEN_ESTIMATE)
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                await self.limiter.acquire(cost)
+            retry_after = None
+            try:
+                response = await self._client().post("/chat/completions", json=payload)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                error = LLMRequestError(f"Connection error: {e}")
+            else:
+                if response.status_code < 400:
+                    data = response.json()
+                    return data["choices"][0]["message"].get("content") or ""
+                error = LLMRequestError(
+                    f"Error code: {response.status_code} - {response.text[:200]}",
+                    status_code=response.status_code,
+                )
+                if response.status_code not in RETRY_STATUSES:
+                    raise error
+                retry_after = parse_retry_after(response.headers.get("retry-after"))
+
+            if attempt >= self.max_retries:
+                raise error
+            metrics.count("llm_retries")
+            delay = backoff_delay(attempt, retry_after)
+            logger.warning(f"{error}; retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})")
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self) -> None:
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
@@ -3,28 +3,80 @@
 from __future__ import annotations
 
 import argparse
+import json
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
 
-from .config import ensure_directories
-from .data_processing import process_pdf
+from .config import ensure_directories, settings
+from .data_processing import document_source, file_sha256, iter_pdf_chunks
+from .embedding_backends import BACKENDS, compare_backends, create_backend
+from .ingest import ingest_directory
 from .llm import LLMService
-from .retriever import VectorStore
+from .registry import CollectionRegistry
+from .retriever import RETRIEVAL_MODES
 
 
-def embed_pdf(pdf_path: Path) -> None:
+@lru_cache(maxsize=None)
+def get_registry() -> CollectionRegistry:
+    """Stores opened once per process, so repeated calls reuse the index and model."""
+    return CollectionRegistry()
+
+
+@lru_cache(maxsize=None)
+def get_llm() -> LLMService:
+    return LLMService()
+
+
+def embed_pdf(pdf_path: Path, collection: str | None = None) -> None:
     """Process and embed a PDF file into the vector store."""
-    chunks = process_pdf(pdf_path)
-    store = VectorStore()
-    store.add_documents(chunks)
-    print(f"Embedded {len(chunks)} chunks from {pdf_path}")
+    store = get_registry().get(collection)
+    added = store.upsert_document(
+        document_source(pdf_path, collection),
+        file_sha256(pdf_path),
+        iter_pdf_chunks(pdf_path, collection=collection),
+    )
+    if added is None:
+        print(f"{pdf_path} is unchanged, already embedded")
+    else:
+        print(f"Embedded {added} chunks from {pdf_path}")
 
 
-def answer_query(query: str, top_k: int = 3) -> str:
-    store = VectorStore()
-    results = store.search(query, k=top_k)
-    llm = LLMService()
-    context = [chunk.text for chunk, _ in results]
-    return llm.generate_answer(query, context)
+def answer_query(
+    query: str,
+    top_k: int = 3,
+    mode: str | None = None,
+    collections: list[str] | None = None,
+) -> str:
+    registry = get_registry()
+    results = registry.search(query, k=top_k, collections=collections, mode=mode)
+    llm = get_llm()
+    context = [chunk.text for _, chunk, _ in results]
+    store = registry.get(collections[0] if collections else None)
+    query_embedding = store.embed_query(query) if results else None
+    return llm.generate_answer(query, context, query_embedding=query_embedding)
+
+
+def compare_embedding_backends(collection: str | None = None, samples: int = 500) -> dict:
+    """Parity and speed of every embedding backend against torch, on stored chunks."""
+    store = get_registry().get(collection)
+    texts = [chunk.text for chunk in islice(store.metadata, samples)]
+    if not texts:
+        texts = [f"Sample sentence number {i} about document retrieval." for i in range(samples)]
+    backends, errors = {}, {}
+    for kind in BACKENDS:
+        try:
+            backends[kind] = create_backend(
+                kind,
+                settings.embedding_model,
+                export_dir=settings.onnx_dir / settings.embedding_model.replace("/", "__"),
+                threads=settings.embedding_threads,
+            )
+        except Exception as e:
+            errors[kind] = str(e)
+    report = compare_backends(backends, texts, batch_size=settings.embedding_batch_size)
+    report["errors"] = errors
+    return report
 
 
 def main() -> None:
@@ -32,12 +84,61 @@ def main() -> None:
     parser = argparse.ArgumentParser(description="Intelligent Document Assistant")
     parser.add_argument("--pdf", type=Path, help="Path to PDF to embed")
     parser.add_argument("--query", type=str, help="Question to ask the assistant")
+    parser.add_argument(
+        "--mode",
+        choices=RETRIEVAL_MODES,
+        help="Retrieval mode for --query (default: RETRIEVAL_MODE or hybrid)",
+    )
+    parser.add_argument(
+        "--collection",
+        action="append",
+        help="Collection to use; repeat to search several with --query (default: default)",
+    )
+    parser.add_argument("--ingest-dir", type=Path, help="Directory of PDFs to ingest in bulk")
+    parser.add_argument(
+        "--glob", default="*.pdf", help="File pattern for --ingest-dir (e.g. '**/*.pdf')"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        type=Path,
+        help="Checkpoint file for --ingest-dir (default: <dir>/.ingest_checkpoint.jsonl)",
+    )
+    parser.add_argument("--workers", type=int, help="Extraction processes for --ingest-dir")
+    parser.add_argument(
+        "--compare-backends",
+        action="store_true",
+        help="Print cosine parity, latency and throughput of the torch/onnx/int8 embedding backends",
+    )
+    parser.add_argument(
+        "--recall-report",
+        type=int,
+        metavar="K",
+        help="Print recall@K of the index against exact float32 search and exit",
+    )
     args = parser.parse_args()
+    collection = args.collection[0] if args.collection else None
+
+    if args.compare_backends:
+        print(json.dumps(compare_embedding_backends(collection), indent=2))
+        return
+    if args.recall_report:
+        report = get_registry().get(collection).recall_report(k=args.recall_report)
+        print(json.dumps(report, indent=2))
+        return
 
     if args.pdf:
-        embed_pdf(args.pdf)
+        embed_pdf(args.pdf, collection=collection)
+    if args.ingest_dir:
+        ingest_directory(
+            args.ingest_dir,
+            pattern=args.glob,
+            checkpoint_path=args.checkpoint,
+            workers=args.workers,
+            store=get_registry().get(collection),
+            collection=collection,
+        )
     if args.query:
-        print(answer_query(args.query))
+        print(answer_query(args.query, mode=args.mode, collections=args.collection))
 
 
 if __name__ == "__main__":
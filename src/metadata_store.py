@@ -0,0 +1,439 @@
+"""SQLite-backed chunk metadata resolved on demand by vector id."""
+
+from __future__ import annotations
+
+import logging
+import pickle
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from .data_processing import DocumentChunk
+
+logger = logging.getLogger(__name__)
+
+MMAP_SIZE = 256 * 1024 * 1024
+FETCH_BATCH = 500
+_TERM = re.compile(r"\w+")
+# Where a chunk sits in its document; NULL for rows written before chunks tracked pages.
+LOCATION_COLUMNS = ("page_start", "page_end", "char_start", "char_end")
+_SELECT = f"SELECT vector_id, chunk_id, text, source, {', '.join(LOCATION_COLUMNS)} FROM chunks"
+
+
+class _LegacyChunk:
+    """Stand-in for unpickling chunks written before ``DocumentChunk`` used slots."""
+
+    def __setstate__(self, state: dict) -> None:
+        self.__dict__.update(state)
+
+
+class _LegacyUnpickler(pickle.Unpickler):
+    def find_class(self, module: str, name: str):
+        if name == "DocumentChunk":
+            return _LegacyChunk
+        return super().find_class(module, name)
+
+
+class MetadataStore:
+    """Chunk text and source keyed by FAISS vector id.
+
+    Nothing is loaded up front; search results are resolved with a single
+    ``IN`` query, so resident memory does not grow with the corpus. Vector
+    ids come from a persistent counter and are never reused. Deleted ids
+    are kept as tombstones until the index is compacted. An FTS5 table kept
+    in sync by triggers provides BM25 keyword search over the same rows.
+    When the index is quantized, each row also keeps its float32 vector for
+    exact re-ranking.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(str(path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (
+                vector_id INTEGER PRIMARY KEY,
+                chunk_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                text TEXT NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_source ON chunks (source)")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS documents (
+                source TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                chunk_count INTEGER NOT NULL,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS tombstones (vector_id INTEGER PRIMARY KEY)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "vector" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN vector BLOB")
+        for column in LOCATION_COLUMNS:
+            if column not in columns:
+                self._conn.execute(f"ALTER TABLE chunks ADD COLUMN {column} INTEGER")
+        self._conn.commit()
+        self.keyword_index = self._create_keyword_index()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _create_keyword_index(self) -> bool:
+        exists = self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'chunks_fts'"
+        ).fetchone()
+        try:
+            self._conn.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS chunks_fts USING fts5("
+                "text, content='chunks', content_rowid='vector_id', tokenize='porter unicode61')"
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 unavailable, keyword search disabled: {e}")
+            return False
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS chunks_fts_insert AFTER INSERT ON chunks BEGIN "
+            "INSERT INTO chunks_fts (rowid, text) VALUES (new.vector_id, new.text); END"
+        )
+        self._conn.execute(
+            "CREATE TRIGGER IF NOT EXISTS chunks_fts_delete AFTER DELETE ON chunks BEGIN "
+            "INSERT INTO chunks_fts (chunks_fts, rowid, text) "
+            "VALUES ('delete', old.vector_id, old.text); END"
+        )
+        if not exists:
+            # Index rows written before the keyword index existed.
+            self._conn.execute("INSERT INTO chunks_fts (chunks_fts) VALUES ('rebuild')")
+        self._conn.commit()
+        return True
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, vector_id: int) -> DocumentChunk:
+        chunk = self.get_many([vector_id]).get(int(vector_id))
+        if chunk is None:
+            raise IndexError(vector_id)
+        return chunk
+
+    def __iter__(self) -> Iterator[DocumentChunk]:
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    f"{_SELECT} WHERE vector_id > ? ORDER BY vector_id LIMIT ?",
+                    (last_id, FETCH_BATCH),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield _chunk(row)
+            last_id = rows[-1][0]
+
+    def add(
+        self, chunks: Sequence[DocumentChunk], vectors: np.ndarray | None = None
+    ) -> np.ndarray:
+        """Store ``chunks`` under freshly allocated vector ids and return the ids.
+
+        ``vectors`` (row i belongs to chunk i) are kept as full-precision originals.
+        """
+        if not chunks:
+            return np.zeros(0, dtype=np.int64)
+        blobs = [None] * len(chunks) if vectors is None else [_blob(row) for row in vectors]
+        with self._lock:
+            start = self._next_id()
+            ids = np.arange(start, start + len(chunks), dtype=np.int64)
+            self._conn.executemany(
+                "INSERT INTO chunks (vector_id, chunk_id, source, text, vector, "
+                f"{', '.join(LOCATION_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        int(vector_id),
+                        chunk.id,
+                        chunk.source,
+                        chunk.text,
+                        blob,
+                        chunk.page_start,
+                        chunk.page_end,
+                        chunk.char_start,
+                        chunk.char_end,
+                    )
+                    for vector_id, chunk, blob in zip(ids, chunks, blobs)
+                ],
+            )
+            self._conn.execute(
+                "INSERT OR REPLACE INTO counters (name, value) VALUES ('next_vector_id', ?)",
+                (start + len(chunks),),
+            )
+            self._conn.commit()
+            self._count += len(chunks)
+        return ids
+
+    def generation(self) -> int:
+        """Counter bumped after every committed change, for other processes to poll."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM counters WHERE name = 'generation'"
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump_generation(self) -> int:
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO counters (name, value) VALUES ('generation', 1) "
+                "ON CONFLICT (name) DO UPDATE SET value = value + 1"
+            )
+            self._conn.commit()
+            return self._conn.execute(
+                "SELECT value FROM counters WHERE name = 'generation'"
+            ).fetchone()[0]
+
+    def refresh_count(self) -> None:
+        """Re-read the chunk count after other processes changed the table."""
+        with self._lock:
+            self._count = self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def _next_id(self) -> int:
+        row = self._conn.execute(
+            "SELECT value FROM counters WHERE name = 'next_vector_id'"
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        return self._conn.execute(
+            "SELECT MAX(COALESCE((SELECT MAX(vector_id) FROM chunks), -1), "
+            "COALESCE((SELECT MAX(vector_id) FROM tombstones), -1)) + 1"
+        ).fetchone()[0]
+
+    def get_many(self, vector_ids: Iterable[int]) -> Dict[int, DocumentChunk]:
+        ids = [int(vector_id) for vector_id in vector_ids]
+        if not ids:
+            return {}
+        placeholders = ",".join("?" * len(ids))
+        with self._lock:
+            rows = self._conn.execute(
+                f"{_SELECT} WHERE vector_id IN ({placeholders})",
+                ids,
+            ).fetchall()
+        return {row[0]: _chunk(row) for row in rows}
+
+    def get_vectors(self, vector_ids: Iterable[int]) -> Dict[int, np.ndarray]:
+        """Full-precision vectors stored for ``vector_ids``; ids without one are omitted."""
+        ids = [int(vector_id) for vector_id in vector_ids]
+        found: Dict[int, np.ndarray] = {}
+        with self._lock:
+            for start in range(0, len(ids), FETCH_BATCH):
+                batch = ids[start:start + FETCH_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for vector_id, blob in self._conn.execute(
+                    f"SELECT vector_id, vector FROM chunks "
+                    f"WHERE vector_id IN ({placeholders}) AND vector IS NOT NULL",
+                    batch,
+                ):
+                    found[vector_id] = np.frombuffer(blob, dtype=np.float32)
+        return found
+
+    def iter_vectors(self) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+        """Stored full-precision vectors as ``(ids, vectors)`` batches in id order."""
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self._conn.execute(
+                    "SELECT vector_id, vector FROM chunks "
+                    "WHERE vector_id > ? AND vector IS NOT NULL ORDER BY vector_id LIMIT ?",
+                    (last_id, FETCH_BATCH),
+                ).fetchall()
+            if not rows:
+                return
+            yield (
+                np.array([row[0] for row in rows], dtype=np.int64),
+                np.vstack([np.frombuffer(row[1], dtype=np.float32) for row in rows]),
+            )
+            last_id = rows[-1][0]
+
+    def store_vectors(self, vector_ids: np.ndarray, vectors: np.ndarray) -> None:
+        """Backfill originals for rows stored before they were kept."""
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE chunks SET vector = ? WHERE vector_id = ? AND vector IS NULL",
+                [(_blob(row), int(vector_id)) for vector_id, row in zip(vector_ids, vectors)],
+            )
+            self._conn.commit()
+
+    def keyword_search(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """BM25-ranked ``(vector_id, score)`` pairs, best first (higher is better)."""
+        terms = list(dict.fromkeys(_TERM.findall(query.lower())))
+        if not self.keyword_index or not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in terms)
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT rowid, bm25(chunks_fts) FROM chunks_fts WHERE chunks_fts MATCH ? "
+                "ORDER BY bm25(chunks_fts) LIMIT ?",
+                (match, k),
+            ).fetchall()
+        # FTS5's bm25() is negated so that ORDER BY ascending puts the best match first.
+        return [(row[0], -row[1]) for row in rows]
+
+    def prune_after(self, max_vector_id: int) -> None:
+        """Drop rows whose vectors never reached the index (crash between writes)."""
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM chunks WHERE vector_id > ?", (max_vector_id,)
+            ).rowcount
+            self._conn.commit()
+            self._count -= removed
+        if removed:
+            logger.warning(f"Dropped {removed} metadata rows without stored vectors")
+
+    def delete_ids(self, vector_ids: Iterable[int]) -> List[int]:
+        """Delete chunks by vector id and tombstone them; returns the ids that existed.
+
+        Documents that lose chunks this way are unregistered, so uploading
+        them again re-ingests them instead of being skipped as unchanged.
+        """
+        ids = [int(vector_id) for vector_id in vector_ids]
+        deleted: List[int] = []
+        with self._lock:
+            for start in range(0, len(ids), FETCH_BATCH):
+                batch = ids[start:start + FETCH_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                self._conn.execute(
+                    f"DELETE FROM documents WHERE source IN "
+                    f"(SELECT DISTINCT source FROM chunks WHERE vector_id IN ({placeholders}))",
+                    batch,
+                )
+                deleted.extend(
+                    row[0]
+                    for row in self._conn.execute(
+                        f"SELECT vector_id FROM chunks WHERE vector_id IN ({placeholders})", batch
+                    )
+                )
+                self._conn.execute(f"DELETE FROM chunks WHERE vector_id IN ({placeholders})", batch)
+            self._tombstone(deleted)
+        return deleted
+
+    def delete_source(self, source: str) -> List[int]:
+        with self._lock:
+            deleted = [
+                row[0]
+                for row in self._conn.execute(
+                    "SELECT vector_id FROM chunks WHERE source = ?", (source,)
+                )
+            ]
+            self._conn.execute("DELETE FROM chunks WHERE source = ?", (source,))
+            self._tombstone(deleted)
+        return deleted
+
+    def _tombstone(self, deleted: List[int]) -> None:
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO tombstones (vector_id) VALUES (?)", [(i,) for i in deleted]
+        )
+        self._conn.commit()
+        self._count -= len(deleted)
+
+    def tombstones(self) -> Set[int]:
+        with self._lock:
+            return {row[0] for row in self._conn.execute("SELECT vector_id FROM tombstones")}
+
+    def clear_tombstones(self, vector_ids: Iterable[int]) -> None:
+        """Forget tombstones once compaction has removed their vectors."""
+        with self._lock:
+            self._conn.executemany(
+                "DELETE FROM tombstones WHERE vector_id = ?", [(int(i),) for i in vector_ids]
+            )
+            self._conn.commit()
+
+    def document_hash(self, source: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM documents WHERE source = ?", (source,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def register_document(self, source: str, content_hash: str, chunk_count: int) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (source, content_hash, chunk_count, updated_at) "
+                "VALUES (?, ?, ?, ?)",
+                (source, content_hash, chunk_count, time.time()),
+            )
+            self._conn.commit()
+
+    def unregister_document(self, source: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE source = ?", (source,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM documents")
+            self._conn.execute("DELETE FROM chunks")
+            self._conn.execute("DELETE FROM tombstones")
+            self._conn.commit()
+            self._count = 0
+
+    def import_pickle(self, pickle_path: Path) -> int:
+        """Load a metadata list written by earlier versions of the vector store."""
+        with pickle_path.open("rb") as fp:
+            legacy = _LegacyUnpickler(fp).load()
+        chunks: List[DocumentChunk] = [
+            DocumentChunk(id=item.id, text=item.text, source=item.source) for item in legacy
+        ]
+        # A fresh store allocates ids from 0, matching the legacy index positions.
+        self.add(chunks)
+        return len(chunks)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def read_counts(path: Path) -> Dict[str, int]:
+    """Chunk, document and tombstone counts of a metadata DB, opened read-only.
+
+    Nothing is created or migrated, so a store can be summarized without opening it.
+    """
+    counts = {"chunks": 0, "documents": 0, "tombstones": 0}
+    if not path.exists():
+        return counts
+    conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        for table in counts:
+            try:
+                counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            except sqlite3.OperationalError:
+                pass
+    finally:
+        conn.close()
+    return counts
+
+
+def _blob(vector: np.ndarray) -> bytes:
+    return np.ascontiguousarray(vector, dtype=np.float32).tobytes()
+
+
+def _chunk(row: tuple) -> DocumentChunk:
+    return DocumentChunk(
+        id=row[1],
+        text=row[2],
+        source=row[3],
+        vector_id=row[0],
+        page_start=row[4],
+        page_end=row[5],
+        char_start=row[6],
+        char_end=row[7],
+    )
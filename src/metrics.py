@@ -0,0 +1,178 @@
+"""Per-stage latency histograms and counters, exposed in Prometheus text format."""
+
+from __future__ import annotations
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from .config import settings
+
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+_enabled = settings.metrics_enabled
+# Stage -> seconds for the request being handled, when its caller asked for a breakdown.
+_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("stage_timings", default=None)
+
+
+class Histogram:
+    """Cumulative latency histogram per label value, rendered like ``prometheus_client``."""
+
+    def __init__(self, name: str, help_text: str, label: str, buckets: Sequence[float] = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series: Dict[str, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, label_value: str, value: float) -> None:
+        slot = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                # Per-bucket counts, then +Inf, sum and count.
+                series = self._series[label_value] = [0.0] * (len(self.buckets) + 3)
+            series[slot] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        for label_value, values in sorted(series.items()):
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), values):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(
+                    f'{self.name}_bucket{{{self.label}="{label_value}",le="{le}"}} {cumulative:g}'
+                )
+            lines.append(f'{self.name}_sum{{{self.label}="{label_value}"}} {values[-2]!r}')
+            lines.append(f'{self.name}_count{{{self.label}="{label_value}"}} {values[-1]:g}')
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label: str) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, label_value: str, amount: float = 1) -> None:
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = dict(self._values)
+        for label_value, value in sorted(values.items()):
+            lines.append(f'{self.name}{{{self.label}="{label_value}"}} {value:g}')
+        return lines
+
+    def reset(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Time spent in each pipeline stage.", "stage"
+)
+HTTP_SECONDS = Histogram(
+    "rag_http_request_duration_seconds", "API request latency by route.", "route"
+)
+EVENTS = Counter("rag_events_total", "Items processed and cache outcomes by event.", "event")
+
+
+class _Span:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str) -> None:
+        self.stage = stage
+
+    def __enter__(self) -> "_Span":
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        record(self.stage, time.perf_counter() - self.started)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def set_enabled(value: bool) -> None:
+    global _enabled
+    _enabled = value
+
+
+def span(stage: str):
+    """Time the ``with`` block as ``stage``; a shared no-op when nobody is listening."""
+    if not _enabled and _timings.get() is None:
+        return _NULL_SPAN
+    return _Span(stage)
+
+
+def record(stage: str, seconds: float) -> None:
+    if _enabled:
+        STAGE_SECONDS.observe(stage, seconds)
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+def count(event: str, amount: float = 1) -> None:
+    if _enabled and amount:
+        EVENTS.inc(event, amount)
+
+
+@contextmanager
+def collect_timings() -> Iterator[Dict[str, float]]:
+    """Gather per-stage seconds for the work done inside the block (threads included).
+
+    Worker threads started through ``asyncio.to_thread`` or Starlette's
+    threadpool inherit the context and add to the same dict.
+    """
+    timings: Dict[str, float] = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+def render() -> str:
+    lines = STAGE_SECONDS.render() + HTTP_SECONDS.render() + EVENTS.render()
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    for metric in (STAGE_SECONDS, HTTP_SECONDS, EVENTS):
+        metric.reset()
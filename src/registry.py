@@ -0,0 +1,192 @@
+"""Named collections, each with its own index and metadata files."""
+
+from __future__ import annotations
+
+import contextvars
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .config import DEFAULT_COLLECTION, VECTORSTORE_DIR, settings
+from .data_processing import DocumentChunk
+from .metadata_store import read_counts
+from .retriever import VectorStore, reciprocal_rank_fusion
+
+logger = logging.getLogger(__name__)
+
+_NAME = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+
+def validate_collection(name: str) -> str:
+    if not _NAME.match(name):
+        raise ValueError(
+            f"Invalid collection name {name!r}: use 1-64 letters, digits, '-' or '_'"
+        )
+    return name
+
+
+class CollectionRegistry:
+    """Opens one ``VectorStore`` per collection, sharing a single embedding model.
+
+    The default collection keeps the original ``vectorstore/`` file layout;
+    others live in ``vectorstore/collections/<name>/``.
+    """
+
+    def __init__(self, root: Path | None = None, default_store: VectorStore | None = None) -> None:
+        self.root = root or VECTORSTORE_DIR
+        self._stores: Dict[str, VectorStore] = {}
+        self._lock = threading.Lock()
+        self._executor: ThreadPoolExecutor | None = None
+        if default_store is not None:
+            self._stores[DEFAULT_COLLECTION] = default_store
+
+    def _paths(self, name: str) -> Tuple[Path, Path]:
+        if name == DEFAULT_COLLECTION:
+            if self.root == VECTORSTORE_DIR:
+                return settings.vectorstore_path, settings.metadata_store_path
+            return self.root / "faiss.index", self.root / "metadata.db"
+        directory = self.root / "collections" / name
+        return directory / "faiss.index", directory / "metadata.db"
+
+    def get(self, name: str | None = None) -> VectorStore:
+        name = validate_collection(name or DEFAULT_COLLECTION)
+        with self._lock:
+            store = self._stores.get(name)
+            if store is None:
+                shared = next(iter(self._stores.values()), None)
+                index_path, metadata_path = self._paths(name)
+                store = VectorStore(
+                    index_path=index_path,
+                    metadata_path=metadata_path,
+                    embedding_service=shared.embedding_service if shared else None,
+                )
+                self._stores[name] = store
+            return store
+
+    def peek(self, name: str) -> VectorStore | None:
+        """The store for ``name`` if this process has already opened it."""
+        with self._lock:
+            return self._stores.get(name)
+
+    def stats(self, name: str) -> dict:
+        """Store stats for ``name`` without opening it.
+
+        A store that isn't open yet reports the counts in its metadata DB
+        instead of loading its index.
+        """
+        store = self.peek(name)
+        if store is not None:
+            return {"loaded": True, **store.stats()}
+        index_path, metadata_path = self._paths(validate_collection(name))
+        wal_path = index_path.with_suffix(".wal")
+        counts = read_counts(metadata_path)
+        return {
+            "loaded": False,
+            **counts,
+            # Index rows that compaction hasn't purged yet are still tombstoned.
+            "vectors": counts["chunks"] + counts["tombstones"],
+            "wal_bytes": wal_path.stat().st_size if wal_path.exists() else 0,
+        }
+
+    def names(self) -> List[str]:
+        found = {DEFAULT_COLLECTION, *self._stores}
+        collections_dir = self.root / "collections"
+        if collections_dir.is_dir():
+            found.update(
+                path.name
+                for path in collections_dir.iterdir()
+                if path.is_dir() and _NAME.match(path.name)
+            )
+        return sorted(found)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        collections: Optional[Sequence[str]] = None,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mode: str | None = None,
+    ) -> List[Tuple[str, DocumentChunk, float]]:
+        """Search ``collections`` (default: the default one) and merge the top ``k``.
+
+        Returns ``(collection, chunk, score)`` triples. A single collection
+        returns its own scores. Across collections, vector distances (lower is
+        better) are merged as they are; any other results are fused by rank
+        (reciprocal rank fusion, higher is better), since BM25 scores from
+        separate keyword indexes don't compare.
+        """
+        return self.search_batch(
+            [query], k=k, collections=collections, nprobe=nprobe, ef_search=ef_search, mode=mode
+        )[0]
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        k: int = 5,
+        collections: Optional[Sequence[str]] = None,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mode: str | None = None,
+    ) -> List[List[Tuple[str, DocumentChunk, float]]]:
+        """``search`` for many questions; collections are searched in parallel."""
+        names = list(dict.fromkeys(collections or [DEFAULT_COLLECTION]))
+        stores = [self.get(name) for name in names]
+
+        def run(store: VectorStore) -> List[Tuple[str, List[Tuple[DocumentChunk, float]]]]:
+            return store.search_batch_with_modes(
+                queries, k=k, nprobe=nprobe, ef_search=ef_search, mode=mode
+            )
+
+        if len(stores) == 1:
+            # Already ranked by the store; nothing to merge.
+            return [
+                [(names[0], chunk, score) for chunk, score in results]
+                for _, results in run(stores[0])
+            ]
+
+        # Each worker runs in a copy of the caller's context so stage timings reach it.
+        pool = self._pool()
+        futures = [pool.submit(contextvars.copy_context().run, run, store) for store in stores]
+        per_store = [future.result() for future in futures]
+
+        merged_batch = []
+        for position in range(len(queries)):
+            searched = [(name, *results[position]) for name, results in zip(names, per_store)]
+            if all(used_mode == "vector" for _, used_mode, _ in searched):
+                # One embedding model and metric, so distances compare across collections.
+                merged = sorted(
+                    (
+                        (name, chunk, score)
+                        for name, _, results in searched
+                        for chunk, score in results
+                    ),
+                    key=lambda item: item[2],
+                )
+            else:
+                # BM25 (and RRF built on it) is relative to each collection's own
+                # corpus statistics; fuse by rank. Equal ranks keep collection order.
+                hits = {
+                    (order, rank): (name, chunk)
+                    for order, (name, _, results) in enumerate(searched)
+                    for rank, (chunk, _) in enumerate(results)
+                }
+                fused = reciprocal_rank_fusion(
+                    [
+                        [((order, rank), score) for rank, (_, score) in enumerate(results)]
+                        for order, (_, _, results) in enumerate(searched)
+                    ],
+                    k=settings.rrf_k,
+                )
+                merged = [(*hits[key], score) for key, score in fused]
+            merged_batch.append(merged[:k])
+        return merged_batch
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(thread_name_prefix="collection-search")
+            return self._executor
@@ -2,74 +2,716 @@
 
 from __future__ import annotations
 
-import pickle
+import logging
+import threading
+import time
 from pathlib import Path
-from typing import List, Sequence, Tuple
+from typing import Hashable, Iterable, List, Sequence, Tuple
 
-import faiss
 import numpy as np
 
+from . import metrics
+from .cache import LRUCache, normalize_text
 from .config import ensure_directories, settings
 from .data_processing import DocumentChunk
 from .embedder import EmbeddingService
+from .indexes import (
+    ensure_id_mapped,
+    exclusion_selector,
+    index_type_of,
+    is_lossy,
+    max_id,
+    migrate_index,
+    new_index,
+    quantization_of,
+    recall_at_k,
+    reconstruct_all,
+    remove_ids,
+    resolve_index_type,
+    resolve_quantization,
+    search_params,
+)
+from .lazy import lazy_import
+from .locks import InterProcessLock, ReadWriteLock
+from .metadata_store import MetadataStore
+from .wal import WriteAheadLog, atomic_write, file_identity
+
+faiss = lazy_import("faiss")
+logger = logging.getLogger(__name__)
+
+RETRIEVAL_MODES = ("vector", "keyword", "hybrid")
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[Sequence[Tuple[Hashable, float]]], k: int = 60
+) -> List[Tuple[Hashable, float]]:
+    """Merge ranked ``(id, score)`` lists by summing ``1 / (k + rank)`` per list."""
+    fused: dict[Hashable, float] = {}
+    for ranking in rankings:
+        for rank, (vector_id, _) in enumerate(ranking, start=1):
+            fused[vector_id] = fused.get(vector_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
+
+
+def _apply(index: faiss.Index | None, ids: np.ndarray, vectors: np.ndarray) -> faiss.Index:
+    """Add logged vectors to ``index``, skipping ids it already holds."""
+    if index is None:
+        index = new_index(vectors.shape[1])
+    fresh = ids > max_id(index)
+    if fresh.any():
+        index.add_with_ids(np.ascontiguousarray(vectors[fresh]), ids[fresh])
+    return index
 
 
 class VectorStore:
+    """FAISS index plus SQLite metadata, safe to share between threads and processes.
+
+    Searches run under the read side of a readers-writer lock and only
+    ever see fully applied writes; long rebuilds (migration, compaction,
+    reload) build a new index off to the side and swap it in. Writes are
+    serialized across processes by a file lock, and a generation counter in
+    ``metadata.db`` lets other processes notice changes and catch up from
+    the write-ahead log or the latest snapshot.
+    """
+
     def __init__(
         self,
         index_path: Path | None = None,
         metadata_path: Path | None = None,
+        index_type: str | None = None,
+        train_threshold: int | None = None,
+        embedding_service: EmbeddingService | None = None,
+        quantization: str | None = None,
     ) -> None:
         ensure_directories()
         self.index_path = index_path or settings.vectorstore_path
         self.metadata_path = metadata_path or settings.metadata_store_path
-        self.embedding_service = EmbeddingService()
-        self.metadata: List[DocumentChunk] = []
-        self.index: faiss.IndexFlatL2 | None = None
+        self.index_type = index_type or settings.index_type
+        self.train_threshold = (
+            settings.index_train_threshold if train_threshold is None else train_threshold
+        )
+        self.quantization = (quantization or settings.vector_quantization).lower()
+        self.embedding_service = embedding_service or EmbeddingService()
+        self.metadata = MetadataStore(self.metadata_path)
+        self.index: faiss.Index | None = None
+        self.wal = WriteAheadLog(self.index_path.with_suffix(".wal"))
+        # Serializes writers in this process and in any other process sharing the files.
+        self._lock = InterProcessLock(self.index_path.with_suffix(".lock"))
+        self._rw = ReadWriteLock()
+        self._refresh_lock = threading.Lock()
+        self._compaction_thread: threading.Thread | None = None
+        self._tombstones: set[int] = set()
+        self._selector: faiss.IDSelector | None = None
+        # Bumped on every change that can alter search results; part of the result cache key.
+        self.version = 0
+        # On-disk state this process has loaded, compared against the files in refresh().
+        self._generation = -1
+        self._index_identity = None
+        self._wal_identity = None
+        self._wal_offset = 0
+        self._checked_at = 0.0
+        self._query_vectors: LRUCache[np.ndarray] = LRUCache(settings.search_cache_size)
+        self._results: LRUCache[Tuple[str, List[Tuple[DocumentChunk, float]]]] = LRUCache(
+            settings.search_cache_size
+        )
+        started = time.perf_counter()
         self._load()
+        self.load_seconds = time.perf_counter() - started
+        logger.info(f"Opened vector store {self.index_path} in {self.load_seconds * 1000:.0f} ms")
 
     def _load(self) -> None:
-        if self.index_path.exists():
-            self.index = faiss.read_index(str(self.index_path))
-        if self.metadata_path.exists():
-            with self.metadata_path.open("rb") as fp:
-                self.metadata = pickle.load(fp)
-
-    def _persist(self) -> None:
-        if self.index is not None:
-            faiss.write_index(self.index, str(self.index_path))
-        with self.metadata_path.open("wb") as fp:
-            pickle.dump(self.metadata, fp)
-
-    def add_documents(self, chunks: Sequence[DocumentChunk]) -> None:
-        if not chunks:
-            return
-        embeddings = self.embedding_service.embed(chunk.text for chunk in chunks)
-        if embeddings.size == 0:
-            return
-        if self.index is None:
-            dimension = embeddings.shape[1]
-            self.index = faiss.IndexFlatL2(dimension)
-        self.index.add(embeddings)
-        self.metadata.extend(chunks)
-        self._persist()
+        with self._lock:
+            legacy_path = self.metadata_path.with_suffix(".pkl")
+            if (
+                len(self.metadata) == 0
+                and legacy_path.exists()
+                and legacy_path != self.metadata_path
+            ):
+                imported = self.metadata.import_pickle(legacy_path)
+                legacy_path.rename(legacy_path.with_suffix(".pkl.migrated"))
+                logger.info(f"Imported {imported} chunks from {legacy_path}")
+            self._reload(repair=True)
+            self.metadata.prune_after(max_id(self.index) if self.index is not None else -1)
+            self.metadata.refresh_count()
+            if self._maybe_migrate():
+                self.compact()
+
+    def _reload(self, repair: bool = False) -> None:
+        """Rebuild the index from the snapshot and log on disk, then swap it in."""
+        generation = self.metadata.generation()
+        index_identity = file_identity(self.index_path)
+        index = None
+        if index_identity is not None:
+            index = ensure_id_mapped(faiss.read_index(str(self.index_path)))
+        wal_identity = self.wal.identity()
+        offset = 0
+        for record in self.wal.replay(repair=repair):
+            index = _apply(index, record.ids, record.vectors)
+            offset = record.end_offset
+        tombstones = self.metadata.tombstones()
+        with self._rw.write():
+            self.index = index
+            self._index_identity = index_identity
+            self._wal_identity = wal_identity
+            self._wal_offset = offset
+            self._generation = generation
+            self._set_tombstones(tombstones)
+        self.metadata.refresh_count()
+
+    def refresh(self, force: bool = False) -> bool:
+        """Pick up writes made by other processes; returns whether anything changed.
+
+        Checks at most every ``STORE_RELOAD_INTERVAL`` seconds unless forced.
+        New log records are applied in place; a new snapshot (another process
+        compacted or cleared the store) is loaded in full.
+        """
+        now = time.monotonic()
+        if not force and now - self._checked_at < settings.store_reload_interval:
+            return False
+        if not self._refresh_lock.acquire(blocking=force):
+            # Another thread is already catching up; search the current snapshot.
+            return False
+        try:
+            self._checked_at = now
+            generation = self.metadata.generation()
+            if generation == self._generation:
+                return False
+            with metrics.span("store_refresh"):
+                if self._snapshot_replaced():
+                    self._reload()
+                else:
+                    self._replay_tail(generation)
+            logger.info(f"Reloaded vector store changes (generation {generation})")
+            return True
+        except (FileNotFoundError, RuntimeError) as e:
+            # A concurrent compaction replaced the files mid-read; retry next time.
+            logger.warning(f"Vector store changed during reload, retrying later: {e}")
+            return False
+        finally:
+            self._refresh_lock.release()
+
+    def _snapshot_replaced(self) -> bool:
+        """Whether the files changed in a way the log tail alone can't explain."""
+        if file_identity(self.index_path) != self._index_identity:
+            return True
+        wal_identity = self.wal.identity()
+        if wal_identity is None:
+            return self._wal_offset > 0
+        if self._wal_identity is not None and wal_identity[:2] != self._wal_identity[:2]:
+            return True
+        return wal_identity[2] < self._wal_offset
+
+    def _replay_tail(self, generation: int) -> None:
+        records = list(self.wal.replay(start=self._wal_offset, repair=False))
+        tombstones = self.metadata.tombstones()
+        with self._rw.write():
+            for record in records:
+                self.index = _apply(self.index, record.ids, record.vectors)
+                self._wal_offset = record.end_offset
+            self._wal_identity = self.wal.identity()
+            self._generation = generation
+            self._set_tombstones(tombstones)
+        self.metadata.refresh_count()
+
+    def _committed(self) -> None:
+        """Record a finished write so other processes reload it."""
+        self._wal_identity = self.wal.identity()
+        self._generation = self.metadata.bump_generation()
 
-    def search(self, query: str, k: int = 5) -> List[Tuple[DocumentChunk, float]]:
+    def _set_tombstones(self, tombstones: set[int]) -> None:
+        self._tombstones = tombstones
+        self._selector = exclusion_selector(tombstones)
+        self.version += 1
+
+    def _maybe_migrate(
+        self, new_ids: np.ndarray | None = None, new_vectors: np.ndarray | None = None
+    ) -> bool:
+        """Switch index type once the corpus crosses the training threshold.
+
+        ``new_vectors`` are folded into the rebuilt index so a migration
+        triggered by an insert trains on the full corpus. Searches keep
+        using the old index until the new one is swapped in.
+        """
         if self.index is None:
-            return []
-        query_vec = self.embedding_service.embed([query])
-        if query_vec.size == 0:
-            return []
-        
-        distances, indices = self.index.search(query_vec, k * 2)
+            return False
+        pending = 0 if new_vectors is None else len(new_vectors)
+        ntotal = self.index.ntotal + pending
+        target = resolve_index_type(self.index_type, ntotal, self.train_threshold)
+        quantization = resolve_quantization(
+            self.quantization, target, ntotal, self.train_threshold
+        )
+        if (target, quantization) == (index_type_of(self.index), quantization_of(self.index)):
+            return False
+        with self._rw.read(), metrics.span("index_migrate"):
+            if self._keeps_originals() and not is_lossy(self.index):
+                # Vectors added before quantization was enabled: keep them for re-ranking.
+                self.metadata.store_vectors(*reconstruct_all(self.index))
+            migrated = migrate_index(
+                self.index,
+                target,
+                extra_ids=new_ids,
+                extra_vectors=new_vectors,
+                nlist=settings.ivf_nlist,
+                pq_m=settings.pq_m,
+                hnsw_m=settings.hnsw_m,
+                quantization=quantization,
+            )
+        with self._rw.write():
+            self.index = migrated
+            self.version += 1
+        return True
+
+    def _keeps_originals(self) -> bool:
+        return self.quantization != "none"
+
+    def compact(self, background: bool = False) -> None:
+        """Purge tombstoned vectors, write an index snapshot and trim the log.
+
+        The snapshot is replaced atomically and the log and tombstones are
+        only cleared afterwards, so a crash at any point leaves a loadable
+        store that still hides deleted chunks. Tombstones are removed from a
+        copy of the index, so searches are never blocked by the purge.
+        """
+        if background:
+            if self._compaction_thread is not None and self._compaction_thread.is_alive():
+                return
+            self._compaction_thread = threading.Thread(
+                target=self._compact_logged, name="vectorstore-compaction", daemon=True
+            )
+            self._compaction_thread.start()
+            return
+
+        with self._lock, metrics.span("compact"):
+            self.refresh(force=True)
+            if self.index is None:
+                return
+            purged = set(self._tombstones)
+            with self._rw.read():
+                compacted = faiss.clone_index(self.index) if purged else self.index
+                if not purged:
+                    index_bytes = faiss.serialize_index(compacted).tobytes()
+            if purged:
+                compacted = remove_ids(compacted, purged)
+                index_bytes = faiss.serialize_index(compacted).tobytes()
+            wal_offset = self.wal.size()
+            atomic_write(self.index_path, index_bytes)
+            self.wal.drop_prefix(wal_offset)
+            self.metadata.clear_tombstones(purged)
+            with self._rw.write():
+                self.index = compacted
+                self._index_identity = file_identity(self.index_path)
+                self._wal_offset = self.wal.size()
+                self._set_tombstones(self._tombstones - purged)
+            self._committed()
+
+    def _compact_logged(self) -> None:
+        try:
+            self.compact()
+        except Exception as e:
+            logger.error(f"Vector store compaction failed: {e}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self.metadata.clear()
+            if self.index_path.exists():
+                self.index_path.unlink()
+            self.wal.clear()
+            with self._rw.write():
+                self.index = None
+                self._index_identity = None
+                self._wal_offset = 0
+                self._set_tombstones(set())
+            self._committed()
+
+    def add_documents(self, chunks: Iterable[DocumentChunk]) -> int:
+        """Embed and store ``chunks`` batch by batch; returns the number added."""
+        added = 0
+        batches = self.embedding_service.embed_batches(chunks, text=lambda chunk: chunk.text)
+        for batch, embeddings in batches:
+            if embeddings.size == 0:
+                continue
+            self.add_embeddings(batch, embeddings)
+            added += len(batch)
+        return added
+
+    def upsert_document(
+        self, source: str, content_hash: str, chunks: Iterable[DocumentChunk]
+    ) -> int | None:
+        """Add a document unless this exact content is already stored for ``source``.
+
+        Returns ``None`` without consuming ``chunks`` when the content hash is
+        unchanged. A changed document has its previous chunks removed first,
+        and is registered only once all new chunks are stored, so an
+        interrupted replace is redone on the next upload.
+        """
+        if self.document_hash(source) == content_hash:
+            return None
+        self.delete(source=source)
+        added = self.add_documents(chunks)
+        self.register_document(source, content_hash, added)
+        return added
+
+    def document_hash(self, source: str) -> str | None:
+        return self.metadata.document_hash(source)
+
+    def register_document(self, source: str, content_hash: str, chunk_count: int) -> None:
+        self.metadata.register_document(source, content_hash, chunk_count)
+
+    def delete(self, source: str | None = None, ids: Iterable[int] | None = None) -> int:
+        """Remove chunks by source and/or vector id; returns how many were removed.
+
+        Deleted ids are tombstoned and excluded from searches immediately;
+        ``compact()`` drops their vectors from the index.
+        """
+        if source is None and ids is None:
+            raise ValueError("delete() needs a source or ids")
+        deleted: List[int] = []
+        with self._lock:
+            self.refresh(force=True)
+            if source is not None:
+                self.metadata.unregister_document(source)
+                deleted.extend(self.metadata.delete_source(source))
+            if ids is not None:
+                deleted.extend(self.metadata.delete_ids(ids))
+            if deleted:
+                with self._rw.write():
+                    self._set_tombstones(self._tombstones | set(deleted))
+                self._committed()
+        return len(deleted)
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self.metadata),
+            "vectors": self.index.ntotal if self.index is not None else 0,
+            "tombstones": len(self._tombstones),
+            "index_type": index_type_of(self.index) if self.index is not None else None,
+            "quantization": quantization_of(self.index) if self.index is not None else None,
+            "wal_bytes": self.wal.size(),
+        }
+
+    def add_embeddings(self, chunks: Sequence[DocumentChunk], embeddings: np.ndarray) -> None:
+        """Store chunks whose vectors were computed elsewhere (row i belongs to chunk i)."""
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        with self._lock:
+            self.refresh(force=True)
+            if self.index is not None and embeddings.shape[1] != self.index.d:
+                raise ValueError(
+                    f"Embeddings have {embeddings.shape[1]} dimensions but the index has "
+                    f"{self.index.d}; re-ingest into a new store after changing EMBEDDING_MODEL"
+                )
+            # Metadata first: rows without vectors are pruned on load.
+            with metrics.span("metadata_add"):
+                ids = self.metadata.add(chunks, embeddings if self._keeps_originals() else None)
+            with metrics.span("wal_append"):
+                self._wal_offset = self.wal.append(ids, embeddings)
+            migrated = self._maybe_migrate(ids, embeddings)
+            if not migrated:
+                with self._rw.write(), metrics.span("index_add"):
+                    self.index = _apply(self.index, ids, embeddings)
+                    self.version += 1
+            self._committed()
+        metrics.count("chunks_indexed", len(ids))
+        if migrated:
+            self.compact()
+        elif self.wal.size() >= settings.wal_compact_bytes:
+            self.compact(background=True)
+
+    def warm_up(self) -> dict:
+        """Load the embedding model and touch the index and keyword table.
+
+        Returns the seconds each step took, so the first user query doesn't
+        pay for model loading or cold pages.
+        """
+        timings = {"embedding_model": self.embedding_service.warm_up()}
+        started = time.perf_counter()
+        self.refresh(force=True)
+        if self.index is not None and self.index.ntotal:
+            self._index_search(np.zeros((1, self.index.d), dtype=np.float32), 1)
+        self.metadata.keyword_search("warm up", 1)
+        timings["index"] = time.perf_counter() - started
+        logger.info(
+            f"Vector store warmed up: model {timings['embedding_model'] * 1000:.0f} ms, "
+            f"index {timings['index'] * 1000:.0f} ms"
+        )
+        return timings
+
+    def embed_queries(self, queries: Sequence[str]) -> List[np.ndarray | None]:
+        """Embed questions in one model call, reusing vectors for repeated (normalized) text.
+
+        Blank questions map to ``None``.
+        """
+        keys = [normalize_text(query) for query in queries]
+        vectors: dict[str, np.ndarray] = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            if not key:
+                continue
+            vector = self._query_vectors.get(key)
+            if vector is None:
+                pending.append(key)
+            else:
+                vectors[key] = vector
+        if pending:
+            with metrics.span("query_embed"):
+                embedded = self.embedding_service.embed(pending)
+            embedded = np.ascontiguousarray(embedded, dtype=np.float32)
+            for key, vector in zip(pending, embedded):
+                vectors[key] = vector.reshape(1, -1)
+                self._query_vectors.put(key, vectors[key])
+        return [vectors.get(key) for key in keys]
+
+    def embed_query(self, query: str) -> np.ndarray:
+        """Query vector for keying the answer cache; empty without an embedding backend."""
+        try:
+            vector = self.embed_queries([query])[0]
+        except RuntimeError:
+            vector = None
+        return vector if vector is not None else np.zeros((0, 0), dtype=np.float32)
+
+    def search(
+        self,
+        query: str,
+        k: int = 5,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mode: str | None = None,
+    ) -> List[Tuple[DocumentChunk, float]]:
+        """Top ``k`` chunks for ``query`` as ``(chunk, score)`` pairs.
+
+        ``mode`` is ``vector`` (score is L2 distance, lower is better),
+        ``keyword`` (BM25, higher is better) or ``hybrid`` (reciprocal rank
+        fusion of both, higher is better). Without an embedding backend,
+        vector and hybrid searches fall back to keywords.
+        """
+        return self.search_batch([query], k=k, nprobe=nprobe, ef_search=ef_search, mode=mode)[0]
+
+    def search_batch(
+        self,
+        queries: Sequence[str],
+        k: int = 5,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mode: str | None = None,
+    ) -> List[List[Tuple[DocumentChunk, float]]]:
+        """``search`` for many questions with one embedding call and one FAISS search.
+
+        Repeated questions are searched once; metadata for every hit is
+        fetched in a single query.
+        """
+        return [
+            results
+            for _, results in self.search_batch_with_modes(
+                queries, k=k, nprobe=nprobe, ef_search=ef_search, mode=mode
+            )
+        ]
+
+    def search_batch_with_modes(
+        self,
+        queries: Sequence[str],
+        k: int = 5,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        mode: str | None = None,
+    ) -> List[Tuple[str, List[Tuple[DocumentChunk, float]]]]:
+        """``search_batch`` paired with the mode each question was actually searched in.
+
+        That differs from ``mode`` when the store fell back to keyword search
+        (no embedding backend) or to vector search (no FTS5), and decides
+        whether lower or higher scores are better.
+        """
+        mode = (mode or settings.retrieval_mode).lower()
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode: {mode}")
+        if mode != "keyword" and not self.metadata.keyword_index:
+            mode = "vector"
+        self.refresh()
+        keys = [
+            (normalize_text(query), k, nprobe, ef_search, mode, self.version) for query in queries
+        ]
+        found: dict[tuple, Tuple[str, List[Tuple[DocumentChunk, float]]]] = {}
+        for key in dict.fromkeys(keys):
+            cached = self._results.get(key)
+            if cached is not None:
+                found[key] = cached
+        pending = [key for key in dict.fromkeys(keys) if key not in found]
+        metrics.count("search_queries", len(keys))
+        metrics.count("search_cache_hits", len(found))
+        if not pending:
+            return [(found[key][0], list(found[key][1])) for key in keys]
+
+        texts = [key[0] for key in pending]
+        candidates = k * 2
+        used_mode = mode
+        vector_hits: List[List[Tuple[int, float]]] = [[] for _ in pending]
+        if mode != "keyword":
+            try:
+                vector_hits = self._vector_search(texts, candidates, nprobe, ef_search)
+            except RuntimeError as e:
+                if not self.metadata.keyword_index:
+                    raise
+                logger.warning(f"Vector search unavailable, using keyword search: {e}")
+                used_mode = "keyword"
+        if used_mode == "vector":
+            rankings = vector_hits
+        else:
+            with metrics.span("keyword_search"):
+                keyword_hits = [self.metadata.keyword_search(text, candidates) for text in texts]
+            if used_mode == "keyword":
+                rankings = keyword_hits
+            else:
+                with metrics.span("fusion"):
+                    rankings = [
+                        reciprocal_rank_fusion(pair, k=settings.rrf_k)
+                        for pair in zip(vector_hits, keyword_hits)
+                    ]
+
+        with metrics.span("metadata_fetch"):
+            chunks_by_id = self.metadata.get_many(
+                {idx for ranked in rankings for idx, _ in ranked}
+            )
+        with metrics.span("dedup"):
+            for key, ranked in zip(pending, rankings):
+                found[key] = (used_mode, self._resolve(ranked, k, chunks_by_id))
+                self._results.put(key, found[key])
+        return [(found[key][0], list(found[key][1])) for key in keys]
+
+    def _vector_search(
+        self,
+        texts: Sequence[str],
+        candidates: int,
+        nprobe: int | None,
+        ef_search: int | None,
+    ) -> List[List[Tuple[int, float]]]:
+        hits: List[List[Tuple[int, float]]] = [[] for _ in texts]
+        if self.index is None or self.index.ntotal == 0:
+            return hits
+        vectors = self.embed_queries(texts)
+        rows = [row for row, vector in enumerate(vectors) if vector is not None]
+        if not rows:
+            return hits
+        found = self._index_search(
+            np.vstack([vectors[row] for row in rows]), candidates, nprobe, ef_search
+        )
+        for row, row_hits in zip(rows, found):
+            hits[row] = row_hits
+        return hits
+
+    def _index_search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        nprobe: int | None = None,
+        ef_search: int | None = None,
+        rerank: bool = True,
+    ) -> List[List[Tuple[int, float]]]:
+        """Nearest ``(id, distance)`` pairs per query row, excluding tombstones.
+
+        On a lossy (quantized or PQ) index, ``RERANK_FACTOR x k`` candidates
+        are re-scored against their stored float32 originals.
+        """
+        with self._rw.read(), metrics.span("vector_search"):
+            if self.index is None:
+                return [[] for _ in queries]
+            lossy = self._keeps_originals() and is_lossy(self.index)
+            factor = settings.rerank_factor if rerank and lossy else 1
+            params = search_params(
+                self.index,
+                nprobe=nprobe or settings.nprobe,
+                ef_search=ef_search or settings.ef_search,
+                selector=self._selector,
+            )
+            distances, indices = self.index.search(queries, k * max(1, factor), params=params)
+        hits = [
+            [(int(idx), float(dist)) for idx, dist in zip(row_indices, row_distances) if idx != -1]
+            for row_indices, row_distances in zip(indices, distances)
+        ]
+        if factor > 1:
+            with metrics.span("rerank"):
+                hits = self._rerank(queries, hits, k)
+        return hits
+
+    def _rerank(
+        self, queries: np.ndarray, hits: List[List[Tuple[int, float]]], k: int
+    ) -> List[List[Tuple[int, float]]]:
+        originals = self.metadata.get_vectors({idx for row in hits for idx, _ in row})
+        reranked = []
+        for query, row in zip(queries, hits):
+            rescored = [
+                (idx, float(np.sum((originals[idx] - query) ** 2)) if idx in originals else dist)
+                for idx, dist in row
+            ]
+            rescored.sort(key=lambda item: item[1])
+            reranked.append(rescored[:k])
+        return reranked
+
+    def recall_report(self, k: int = 10, sample: int = 200, seed: int = 0) -> dict:
+        """Recall@k of this index against exact float32 search over the same vectors.
+
+        Queries are ``sample`` stored vectors. The baseline uses the stored
+        originals when the store keeps them, otherwise the index's own vectors.
+        Loads every vector into memory, so run it offline.
+        """
+        self.refresh(force=True)
+        if self.index is None or self.index.ntotal == 0:
+            return {"k": k, "queries": 0}
+        batches = list(self.metadata.iter_vectors())
+        if batches:
+            ids = np.concatenate([batch[0] for batch in batches])
+            vectors = np.vstack([batch[1] for batch in batches])
+            baseline = "originals"
+        else:
+            with self._rw.read():
+                ids, vectors = reconstruct_all(self.index)
+            live = ~np.isin(ids, list(self._tombstones))
+            ids, vectors = ids[live], vectors[live]
+            baseline = "index"
+        rng = np.random.default_rng(seed)
+        queries = vectors[rng.choice(len(vectors), size=min(sample, len(vectors)), replace=False)]
+
+        exact = faiss.IndexFlatL2(vectors.shape[1])
+        exact.add(vectors)
+        _, positions = exact.search(queries, k)
+        truth = np.where(positions >= 0, ids[positions], -1)
+
+        def ranked(rerank: bool) -> np.ndarray:
+            found = np.full((len(queries), k), -1, dtype=np.int64)
+            for row, hits in enumerate(self._index_search(queries, k, rerank=rerank)):
+                found[row, : len(hits)] = [idx for idx, _ in hits]
+            return found
+
+        with self._rw.read():
+            index_bytes = int(faiss.serialize_index(self.index).size)
+            lossy = is_lossy(self.index)
+            report = {
+                "k": k,
+                "queries": len(queries),
+                "vectors": len(vectors),
+                "index_type": index_type_of(self.index),
+                "quantization": quantization_of(self.index),
+                "baseline": baseline,
+                "index_bytes": index_bytes,
+                "float32_bytes": int(vectors.size * 4),
+            }
+        report["compression"] = round(report["float32_bytes"] / max(1, index_bytes), 2)
+        report["recall"] = recall_at_k(ranked(rerank=False), truth, k)
+        if lossy and self._keeps_originals() and settings.rerank_factor > 1:
+            report["recall_reranked"] = recall_at_k(ranked(rerank=True), truth, k)
+        return report
+
+    def _resolve(
+        self,
+        ranked: Sequence[Tuple[int, float]],
+        k: int,
+        chunks_by_id: dict[int, DocumentChunk],
+    ) -> List[Tuple[DocumentChunk, float]]:
         results: List[Tuple[DocumentChunk, float]] = []
         seen_texts = set()
         seen_ids = set()
         
-        for idx, dist in zip(indices[0], distances[0]):
-            if idx == -1:
+        for idx, score in ranked:
+            chunk = chunks_by_id.get(idx)
+            if chunk is None:
                 continue
-            chunk = self.metadata[idx]
             
             if chunk.id in seen_ids:
                 continue
@@ -80,9 +722,16 @@ class VectorStore:
             
             seen_ids.add(chunk.id)
             seen_texts.add(text_normalized)
-            results.append((chunk, float(dist)))
+            results.append((chunk, score))
             
             if len(results) >= k:
                 break
         
         return results
+
+    def cache_stats(self) -> dict:
+        return {
+            "query_embeddings": self._query_vectors.stats(),
+            "search_results": self._results.stats(),
+            "index_version": self.version,
+        }
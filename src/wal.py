@@ -0,0 +1,158 @@
+"""Append-only write-ahead log for vector store inserts."""
+
+from __future__ import annotations
+
+import logging
+import os
+import struct
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CWL2"
+# Records written before stable ids carried positions only.
+POSITIONAL_MAGIC = b"CWAL"
+# magic, first id, vector count, dimension, payload length, crc32 of payload
+HEADER = struct.Struct("<4sQIIQI")
+
+
+@dataclass
+class WalRecord:
+    ids: np.ndarray
+    vectors: np.ndarray
+    end_offset: int
+
+
+def fsync_dir(path: Path) -> None:
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def file_identity(path: Path) -> Optional[Tuple[int, int, int]]:
+    """``(device, inode, size)``; an atomic replace always changes the inode."""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_size
+
+
+def atomic_write(path: Path, data: bytes) -> None:
+    """Replace ``path`` with ``data`` so readers see either the old or new file."""
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("wb") as fp:
+        fp.write(data)
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.replace(tmp_path, path)
+    fsync_dir(path.parent)
+
+
+class WriteAheadLog:
+    """Checksummed records of ``(ids, vectors)``.
+
+    Ids only ever increase, so replaying a record already contained in the
+    snapshot is a no-op. A torn record at the tail (crash mid-append) fails
+    its length or checksum check and is cut off on the next replay.
+    Appends must be serialized by the caller (see ``InterProcessLock``).
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    def identity(self) -> Optional[Tuple[int, int, int]]:
+        return file_identity(self.path)
+
+    def size(self) -> int:
+        return self.path.stat().st_size if self.path.exists() else 0
+
+    def append(self, ids: np.ndarray, vectors: np.ndarray) -> int:
+        ids = np.ascontiguousarray(ids, dtype=np.int64)
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        payload = ids.tobytes() + vectors.tobytes()
+        header = HEADER.pack(
+            MAGIC, int(ids[0]), vectors.shape[0], vectors.shape[1], len(payload), zlib.crc32(payload)
+        )
+        with self.path.open("ab") as fp:
+            fp.write(header + payload)
+            fp.flush()
+            os.fsync(fp.fileno())
+            return fp.tell()
+
+    def replay(self, start: int = 0, repair: bool = True) -> Iterator[WalRecord]:
+        """Yield records from byte ``start``.
+
+        With ``repair`` an invalid tail is truncated; readers that don't hold
+        the write lock pass ``repair=False`` and stop there instead, since the
+        tail may be an append still in progress.
+        """
+        if not self.path.exists():
+            return
+        with self.path.open("rb") as fp:
+            fp.seek(start)
+            offset = start
+            while True:
+                header = fp.read(HEADER.size)
+                if not header:
+                    return
+                record = None
+                if len(header) == HEADER.size:
+                    magic, first_id, count, dim, length, crc = HEADER.unpack(header)
+                    payload = fp.read(length)
+                    id_bytes = count * 8 if magic == MAGIC else 0
+                    if (
+                        magic in (MAGIC, POSITIONAL_MAGIC)
+                        and length == id_bytes + count * dim * 4
+                        and len(payload) == length
+                        and zlib.crc32(payload) == crc
+                    ):
+                        if magic == MAGIC:
+                            ids = np.frombuffer(payload[:id_bytes], dtype=np.int64)
+                        else:
+                            ids = np.arange(first_id, first_id + count, dtype=np.int64)
+                        vectors = np.frombuffer(payload[id_bytes:], dtype=np.float32)
+                        record = WalRecord(
+                            ids=ids,
+                            vectors=vectors.reshape(count, dim),
+                            end_offset=offset + HEADER.size + length,
+                        )
+                if record is None:
+                    break
+                yield record
+                offset = record.end_offset
+        if not repair:
+            return
+        logger.warning(f"Discarding torn write-ahead log tail at byte {offset} of {self.path}")
+        with self.path.open("r+b") as fp:
+            fp.truncate(offset)
+            os.fsync(fp.fileno())
+
+    def drop_prefix(self, offset: int) -> None:
+        """Remove records up to ``offset`` once a snapshot covers them."""
+        if offset <= 0 or not self.path.exists():
+            return
+        with self.path.open("rb") as fp:
+            fp.seek(offset)
+            tail = fp.read()
+        if tail:
+            atomic_write(self.path, tail)
+        else:
+            self.path.unlink()
+            fsync_dir(self.path.parent)
+
+    def clear(self) -> None:
+        if self.path.exists():
+            self.path.unlink()
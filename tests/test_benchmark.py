@@ -0,0 +1,37 @@
+"""
+Smoke tests for the benchmark harness on a tiny corpus.
+"""
+
+from src.benchmark import (
+    HashEmbeddingBackend,
+    bench_pipeline,
+    bench_store,
+    compare_results,
+    synthetic_texts,
+)
+
+
+def test_synthetic_inputs_are_deterministic() -> None:
+    assert synthetic_texts(5, 10, seed=3) == synthetic_texts(5, 10, seed=3)
+    backend = HashEmbeddingBackend(dimension=16, buckets=256)
+    vectors = backend.encode(["alpha beta", "alpha beta", "gamma"])
+    assert vectors.shape == (3, 16)
+    assert (vectors[0] == vectors[1]).all()
+
+
+def test_benchmark_reports_comparable_metrics() -> None:
+    pipeline = bench_pipeline(docs=2, pages=3, embed_texts=20)
+    assert pipeline["extraction"]["pages"] == 3
+    assert pipeline["embedding"]["texts_per_second"] > 0
+
+    result = bench_store(300, queries=10, k=5)
+    assert result["index"]["vectors"] == 300
+    assert set(result["search"]) == {"vector", "hybrid"}
+    assert result["search"]["vector"]["p50_ms"] <= result["search"]["vector"]["p99_ms"]
+    assert result["recall"]["recall"] == 1.0
+
+    base = {"pipeline": pipeline, "sizes": {"300": result}}
+    current = {"pipeline": pipeline, "sizes": {"300": {**result, "vectors": 600}}}
+    rows = {row["metric"]: row for row in compare_results(base, current)}
+    assert rows["sizes.300.vectors"]["change_pct"] == 100.0
+    assert rows["sizes.300.search.vector.p50_ms"]["change_pct"] == 0.0
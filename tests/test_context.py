@@ -0,0 +1,40 @@
+"""
+Tests for token-budgeted context packing.
+"""
+
+from src.context import count_tokens, pack_context
+from src.data_processing import iter_page_chunks
+
+
+def test_overlapping_chunks_are_packed_once() -> None:
+    sentences = [f"Clause {idx} of the agreement applies." for idx in range(30)]
+    budget = 6 * count_tokens(sentences[0])
+    chunks = [
+        chunk.text
+        for chunk in iter_page_chunks(
+            [" ".join(sentences)], "terms", "terms.pdf", chunk_size=budget, overlap=budget // 3
+        )
+    ]
+    assert len(chunks) > 1
+    packed = pack_context(chunks, max_tokens=10_000)
+    assert " ".join(packed) == " ".join(sentences)
+
+
+def test_budget_prefers_rank_per_token_and_cuts_at_sentences() -> None:
+    long_chunk = " ".join(f"Sentence number {idx} talks at length about warranties." for idx in range(40))
+    short_chunk = "The warranty lasts two years."
+    budget = count_tokens(short_chunk) + 60
+
+    packed = pack_context([long_chunk, short_chunk], max_tokens=budget)
+
+    assert packed[1] == short_chunk
+    assert packed[0].endswith("warranties.")
+    assert sum(count_tokens(text) for text in packed) <= budget
+
+
+def test_repeated_sentences_are_dropped() -> None:
+    packed = pack_context(
+        ["Refunds take five days. Contact support.", "Contact support. Shipping is free."],
+        max_tokens=1000,
+    )
+    assert packed == ["Refunds take five days. Contact support.", "Shipping is free."]
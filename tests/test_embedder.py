@@ -0,0 +1,146 @@
+"""
+Tests for the embedding cache.
+"""
+
+from pathlib import Path
+
+import numpy as np
+
+from src.cache import EmbeddingCache
+from src.embedder import EmbeddingService
+
+
+class CountingModel:
+    def __init__(self) -> None:
+        self.encoded = 0
+
+    def encode(self, texts, batch_size=32, convert_to_numpy=True):
+        self.encoded += len(texts)
+        return np.array([[len(text), text.count(" "), 1.0] for text in texts], dtype=np.float32)
+
+
+def make_service(cache_path: Path) -> EmbeddingService:
+    service = EmbeddingService(use_cache=False)
+    service.model = CountingModel()
+    service.cache = EmbeddingCache(
+        "test-model", memory_entries=16, disk_path=cache_path, max_disk_bytes=1024 * 1024
+    )
+    return service
+
+
+def test_embedding_cache_skips_model_for_repeated_text(tmp_path: Path) -> None:
+    service = make_service(tmp_path / "embeddings.db")
+    first = service.embed(["alpha beta", "gamma"])
+    second = service.embed(["alpha   beta ", "gamma", "delta"])
+    assert service.model.encoded == 3
+    assert np.allclose(first, second[:2])
+    assert service.cache_stats()["hits"] == 2
+
+    restarted = make_service(tmp_path / "embeddings.db")
+    restarted.embed(["alpha beta", "delta"])
+    assert restarted.model.encoded == 0
+
+
+def test_model_loads_lazily_once_per_process(monkeypatch) -> None:
+    from types import SimpleNamespace
+
+    import src.embedder as embedder
+
+    loaded = []
+
+    def factory(name):
+        loaded.append(name)
+        model = CountingModel()
+        model.get_sentence_embedding_dimension = lambda: 3
+        return model
+
+    monkeypatch.setattr(
+        "src.embedding_backends.sentence_transformers", SimpleNamespace(SentenceTransformer=factory)
+    )
+    monkeypatch.setattr(embedder, "_models", {})
+    first = EmbeddingService(use_cache=False)
+    second = EmbeddingService(use_cache=False)
+    assert loaded == []
+
+    assert first.warm_up() >= 0
+    second.embed(["alpha"])
+    assert loaded == [first.model_name]
+    assert first.model is second.model
+    assert first.embed([]).shape == (0, 3)
+
+
+def test_lazy_import_defers_execution() -> None:
+    import sys
+
+    from src.lazy import lazy_import
+
+    assert lazy_import("not_a_real_module_xyz", optional=True) is None
+    sys.modules.pop("colorsys", None)
+    module = lazy_import("colorsys")
+    assert module.rgb_to_hsv(1.0, 0.0, 0.0)[0] == 0.0
+
+
+def test_importing_the_store_does_not_load_faiss() -> None:
+    import subprocess
+    import sys
+
+    code = (
+        "import sys, src.retriever; "
+        "print(any(name.startswith('faiss.') for name in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == "False"
+
+
+def test_pooling_matches_reference_math() -> None:
+    from src.embedding_backends import pool_embeddings
+
+    tokens = np.array([[[1.0, 0.0], [3.0, 4.0], [9.0, 9.0]]], dtype=np.float32)
+    mask = np.array([[1, 1, 0]])
+    assert np.allclose(pool_embeddings(tokens, mask, "mean", False), [[2.0, 2.0]])
+    assert np.allclose(pool_embeddings(tokens, mask, "max", False), [[3.0, 4.0]])
+    assert np.allclose(pool_embeddings(tokens, mask, "cls", True), [[1.0, 0.0]])
+
+
+def test_compare_backends_reports_parity_and_speed() -> None:
+    from src.embedding_backends import EmbeddingBackend, compare_backends
+
+    class Fixed(EmbeddingBackend):
+        dimension = 3
+
+        def __init__(self, noise: float) -> None:
+            self.noise = noise
+
+        def encode(self, texts, batch_size=32, convert_to_numpy=True):
+            base = np.array([[len(t), t.count("a") + 1.0, 1.0] for t in texts], dtype=np.float32)
+            return base + self.noise
+
+    report = compare_backends(
+        {"torch": Fixed(0.0), "int8": Fixed(0.05)}, ["alpha", "banana split", "c"]
+    )
+    assert report["backends"]["torch"]["cosine_min"] == 1.0
+    assert 0.99 < report["backends"]["int8"]["cosine_min"] < 1.0
+    assert report["backends"]["int8"]["texts_per_second"] > 0
+    assert report["backends"]["int8"]["dimension"] == 3
+
+
+def test_missing_backend_error_names_backend_and_cause(monkeypatch) -> None:
+    import dataclasses
+
+    import pytest
+
+    import src.embedder as embedder
+
+    monkeypatch.setattr(embedder, "_models", {})
+    monkeypatch.setattr(embedder, "_load_errors", {})
+    monkeypatch.setattr("src.embedding_backends.onnxruntime", None)
+    monkeypatch.setattr(
+        embedder, "settings", dataclasses.replace(embedder.settings, embedding_backend="onnx")
+    )
+    service = EmbeddingService(use_cache=False)
+    with pytest.raises(RuntimeError) as error:
+        service.embed(["alpha"])
+    assert "EMBEDDING_BACKEND=onnx" in str(error.value)
+    assert "onnxruntime" in str(error.value)
@@ -0,0 +1,120 @@
+"""
+Tests for the semantic answer cache.
+"""
+
+import dataclasses
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+
+from src import llm
+from src.cache import AnswerCache
+from src.llm import LLMService
+
+
+class CountingClient:
+    def __init__(self) -> None:
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, stream=False, **kwargs):
+        self.calls += 1
+        if stream:
+            return iter(
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+                for text in ("stream", "ed ", None, f"answer {self.calls}")
+            )
+        message = SimpleNamespace(content=f"answer {self.calls}")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+def make_service(cache_path: Path, monkeypatch) -> LLMService:
+    monkeypatch.setattr(
+        llm,
+        "settings",
+        dataclasses.replace(llm.settings, answer_cache_size=0, llm_tokens_per_minute=0),
+    )
+    service = LLMService()
+    service.client = CountingClient()
+    service.answer_cache = AnswerCache(cache_path, max_entries=8, ttl=60, threshold=0.9)
+    return service
+
+
+def test_paraphrase_over_same_context_reuses_answer(tmp_path: Path, monkeypatch) -> None:
+    service = make_service(tmp_path / "answers.db", monkeypatch)
+    context = ["The warranty lasts two years."]
+    question = np.array([1.0, 0.0, 0.1], dtype=np.float32)
+    paraphrase = np.array([0.95, 0.05, 0.1], dtype=np.float32)
+    unrelated = np.array([0.0, 1.0, 0.0], dtype=np.float32)
+
+    first = service.generate_answer("How long is the warranty?", context, question)
+    assert service.generate_answer("Warranty length?", context, paraphrase) == first
+    assert service.client.calls == 1
+
+    service.generate_answer("Who makes it?", context, unrelated)
+    service.generate_answer("How long is the warranty?", ["Other text."], question)
+    assert service.client.calls == 3
+
+    restarted = make_service(tmp_path / "answers.db", monkeypatch)
+    assert restarted.generate_answer("How long is the warranty?", context, question) == first
+    assert restarted.client.calls == 0
+
+
+def test_answer_cache_expires_and_evicts(tmp_path: Path) -> None:
+    cache = AnswerCache(tmp_path / "answers.db", max_entries=2, ttl=60, threshold=0.9)
+    for idx in range(3):
+        cache.put("ctx", f"question {idx}", f"answer {idx}")
+    assert cache.get("ctx", "question 0") is None
+    assert cache.get("ctx", "question 2") == "answer 2"
+
+    cache.ttl = -1
+    assert cache.get("ctx", "question 2") is None
+
+
+def test_stream_answer_yields_deltas_and_fills_cache(tmp_path: Path, monkeypatch) -> None:
+    service = make_service(tmp_path / "answers.db", monkeypatch)
+    context = ["The warranty lasts two years."]
+    question = np.array([1.0, 0.0, 0.0], dtype=np.float32)
+
+    deltas = list(service.stream_answer("How long?", context, question))
+    assert deltas == ["stream", "ed ", "answer 1"]
+    assert list(service.stream_answer("How long?", context, question)) == ["streamed answer 1"]
+    assert service.generate_answer("How long?", context, question) == "streamed answer 1"
+    assert service.client.calls == 1
+
+
+class RateLimitedError(Exception):
+    def __init__(self, status_code: int, retry_after: str) -> None:
+        super().__init__(f"Error code: {status_code}")
+        self.status_code = status_code
+        self.response = SimpleNamespace(headers={"retry-after": retry_after})
+
+
+def test_sync_calls_share_the_token_budget_and_retry(tmp_path: Path, monkeypatch) -> None:
+    from src.llm_client import TokenBucket
+
+    service = make_service(tmp_path / "answers.db", monkeypatch)
+    service.answer_cache = None
+    service.limiter = TokenBucket(6000)
+    sleeps: list[float] = []
+    monkeypatch.setattr(llm.time, "sleep", sleeps.append)
+    failures = [RateLimitedError(429, "2"), RateLimitedError(503, "0")]
+    create = service.client.create
+
+    def flaky(**kwargs):
+        if failures:
+            raise failures.pop(0)
+        return create(**kwargs)
+
+    service.client.chat.completions.create = flaky
+    assert service.generate_answer("How long?", ["Two years."]) == "answer 1"
+    assert sleeps[0] >= 2.0 and len(sleeps) == 2
+    # Three attempts were each charged against the shared bucket.
+    assert service.limiter._tokens < 6000 - 3 * 500
+
+    service.client.chat.completions.create = lambda **kwargs: (_ for _ in ()).throw(
+        RateLimitedError(401, "0")
+    )
+    assert "Authentication failed" in service.generate_answer("How long?", ["Two years."])
+    assert len(sleeps) == 2
@@ -0,0 +1,101 @@
+"""
+Tests for the async LLM client against a local OpenAI-compatible stub server.
+"""
+
+import asyncio
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src.llm_client import AsyncLLMClient, LLMRequestError, TokenBucket, parse_retry_after
+
+
+class StubServer:
+    """Serves scripted ``(status, headers, body)`` replies to ``POST /v1/chat/completions``."""
+
+    def __init__(self, replies) -> None:
+        self.replies = list(replies)
+        self.requests = []
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self) -> None:
+                length = int(self.headers["Content-Length"])
+                stub.requests.append((self.path, json.loads(self.rfile.read(length))))
+                status, headers, body = stub.replies.pop(0)
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args) -> None:
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/v1"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def completion(text: str) -> dict:
+    return {"choices": [{"message": {"role": "assistant", "content": text}}]}
+
+
+def test_rate_limited_request_waits_for_retry_after_and_succeeds() -> None:
+    stub = StubServer(
+        [
+            (429, {"Retry-After": "0.3"}, {"error": {"message": "rate_limit_exceeded"}}),
+            (200, {}, completion("two years")),
+        ]
+    )
+    client = AsyncLLMClient("key", stub.url, "test-model", max_retries=2)
+
+    async def run() -> str:
+        try:
+            return await client.chat([{"role": "user", "content": "hi"}], temperature=0.2)
+        finally:
+            await client.aclose()
+
+    started = time.monotonic()
+    try:
+        assert asyncio.run(run()) == "two years"
+    finally:
+        stub.close()
+    assert time.monotonic() - started >= 0.3
+    assert [path for path, _ in stub.requests] == ["/v1/chat/completions"] * 2
+    assert stub.requests[0][1]["model"] == "test-model"
+
+
+def test_client_errors_are_not_retried() -> None:
+    stub = StubServer([(401, {}, {"error": {"message": "unauthorized"}})])
+    client = AsyncLLMClient("key", stub.url, "test-model", max_retries=3)
+    try:
+        with pytest.raises(LLMRequestError) as excinfo:
+            asyncio.run(client.chat([{"role": "user", "content": "hi"}]))
+    finally:
+        stub.close()
+    assert excinfo.value.status_code == 401
+    assert len(stub.requests) == 1
+
+
+def test_token_bucket_queues_instead_of_failing() -> None:
+    bucket = TokenBucket(tokens_per_minute=600)
+    assert bucket.reserve(600) == 0.0
+    assert bucket.reserve(60) == pytest.approx(6.0, abs=0.1)
+    assert bucket.reserve(60) == pytest.approx(12.0, abs=0.1)
+
+
+def test_parse_retry_after() -> None:
+    assert parse_retry_after("2.5") == 2.5
+    assert parse_retry_after(None) is None
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
@@ -0,0 +1,63 @@
+"""
+Tests for stage timing spans and the Prometheus text exposition.
+"""
+
+from pathlib import Path
+
+import pytest
+
+from src import metrics
+from src.benchmark import make_embedder
+from src.data_processing import DocumentChunk
+from src.retriever import VectorStore
+
+
+@pytest.fixture
+def fresh_metrics():
+    enabled = metrics.enabled()
+    metrics.reset()
+    yield
+    metrics.set_enabled(enabled)
+    metrics.reset()
+
+
+def test_histogram_renders_cumulative_buckets(fresh_metrics) -> None:
+    metrics.set_enabled(True)
+    metrics.record("embed_model", 0.003)
+    metrics.record("embed_model", 0.2)
+    metrics.count("chunks", 5)
+
+    text = metrics.render()
+    assert 'rag_stage_duration_seconds_bucket{stage="embed_model",le="0.001"} 0' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="embed_model",le="0.005"} 1' in text
+    assert 'rag_stage_duration_seconds_bucket{stage="embed_model",le="+Inf"} 2' in text
+    assert 'rag_stage_duration_seconds_count{stage="embed_model"} 2' in text
+    assert 'rag_events_total{event="chunks"} 5' in text
+
+
+def test_collect_timings_breaks_down_search(fresh_metrics, tmp_path: Path) -> None:
+    metrics.set_enabled(False)
+    store = VectorStore(
+        index_path=tmp_path / "faiss.index",
+        metadata_path=tmp_path / "metadata.db",
+        embedding_service=make_embedder("hash"),
+    )
+    store.add_documents(
+        DocumentChunk(id=f"c{i}", text=f"topic {i} shared words", source="test") for i in range(20)
+    )
+
+    with metrics.collect_timings() as timings:
+        store.search("topic 3", k=3, mode="hybrid")
+    assert {"query_embed", "vector_search", "keyword_search", "fusion", "dedup"} <= set(timings)
+    # Disabled: the breakdown is still returned but nothing is exported.
+    assert "rag_stage_duration_seconds_bucket" not in metrics.render()
+    assert metrics.span("idle") is metrics.span("other")
+
+
+def test_chunk_stage_covers_sentence_splitting(fresh_metrics) -> None:
+    from src.data_processing import iter_page_chunks
+
+    pages = ["One short sentence. " * 200] * 3
+    with metrics.collect_timings() as timings:
+        chunks = list(iter_page_chunks(pages, "doc", "doc.pdf", chunk_size=50, overlap=10))
+    assert chunks and timings["chunk"] > 0
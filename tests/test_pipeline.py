@@ -2,19 +2,80 @@
 Lightweight tests covering chunking and retrieval wiring.
 """
 
+import json
+import time
 from pathlib import Path
 
 import numpy as np
+import pytest
 
-from src.data_processing import DocumentChunk, chunk_text
+from src.benchmark import make_embedder, write_pdf
+from src.context import count_tokens
+from src.data_processing import (
+    DocumentChunk,
+    document_source,
+    extraction_pool,
+    file_sha256,
+    iter_page_chunks,
+    iter_pdf_chunks,
+    iter_pdf_pages,
+)
+from src.indexes import index_type_of
+from src.ingest import ingest_directory
+from src.jobs import JobQueue
 from src.retriever import EmbeddingService, VectorStore
 
 
-def test_chunk_text_produces_overlap() -> None:
-    text = " ".join(str(i) for i in range(100))
-    chunks = chunk_text(text, chunk_size=20, overlap=5)
+def test_page_chunks_cut_on_sentences_and_record_locations() -> None:
+    first = "Refunds for damaged items take five working days."
+    second = "Shipping is free!"
+    pages = [f"{first} {second}", "Returns need a receipt.\nClaims go to support. " + "row " * 40]
+    document = "\n".join(pages)
+    budget = count_tokens(first) + count_tokens(second)
+    chunks = list(
+        iter_page_chunks(pages, "terms", "terms.pdf", chunk_size=budget, overlap=count_tokens(second))
+    )
+
+    assert [chunk.id for chunk in chunks[:2]] == ["terms_0", "terms_1"]
+    assert chunks[0].text == f"{first} {second}"
+    # The previous chunk's last sentence is repeated as overlap.
+    assert chunks[1].text.startswith(f"{second} Returns need a receipt.")
+    assert (chunks[1].page_start, chunks[1].page_end) == (1, 2)
+    assert chunks[-1].page_start == chunks[-1].page_end == 2
+    for chunk in chunks:
+        assert count_tokens(chunk.text) <= budget
+        assert " ".join(document[chunk.char_start:chunk.char_end].split()) == chunk.text
+
+
+def test_overlong_sentences_are_cut_between_words() -> None:
+    text = "column " * 100 + "end"
+    chunks = list(iter_page_chunks([text], "table", "table.pdf", chunk_size=24, overlap=8))
     assert len(chunks) > 1
-    assert any("5" in chunk for chunk in chunks)
+    assert " ".join(chunk.text for chunk in chunks).split() == text.split()
+    for chunk in chunks:
+        assert count_tokens(chunk.text) <= 24
+        assert text[chunk.char_start:chunk.char_end] == chunk.text
+
+
+def test_parallel_page_extraction_preserves_order(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.data_processing.RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr("src.data_processing.PROCESSED_DIR", tmp_path / "processed")
+    monkeypatch.setattr("src.data_processing.ensure_directories", lambda: None)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "processed").mkdir()
+    pdf = write_pdf(tmp_path / "manual.pdf", [f"page {i} body text" for i in range(40)])
+
+    sequential = list(iter_pdf_pages(pdf))
+    assert sequential[:2] == ["page 0 body text", "page 1 body text"]
+    assert list(iter_pdf_pages(pdf, workers=2)) == sequential
+
+    chunks = list(iter_pdf_chunks(pdf, workers=2))
+    assert chunks[0].id == "manual_0"
+    assert " ".join(chunk.text for chunk in chunks).startswith("page 0 body text page 1")
+    assert (chunks[0].page_start, chunks[-1].page_end) == (1, 40)
+    persisted = json.loads((tmp_path / "processed" / "manual.json").read_text())
+    assert [item["id"] for item in persisted] == [chunk.id for chunk in chunks]
+    assert persisted[0]["page_start"] == 1
 
 
 class DummyEmbedder(EmbeddingService):
@@ -37,7 +98,7 @@ def test_vector_store_add_and_search(tmp_path: Path, monkeypatch) -> None:
     monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
     store = VectorStore(
         index_path=tmp_path / "faiss.index",
-        metadata_path=tmp_path / "metadata.pkl",
+        metadata_path=tmp_path / "metadata.db",
     )
     chunks = [
         DocumentChunk(id="one", text="rapid brown fox", source="test"),
@@ -46,3 +107,553 @@ def test_vector_store_add_and_search(tmp_path: Path, monkeypatch) -> None:
     store.add_documents(chunks)
     results = store.search("brown")
     assert results
+
+
+def test_vector_store_migrates_to_ivf_past_threshold(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(
+        index_path=tmp_path / "faiss.index",
+        metadata_path=tmp_path / "metadata.db",
+        index_type="ivf_flat",
+        train_threshold=100,
+    )
+    chunks = [
+        DocumentChunk(id=f"c{i}", text=f"chunk number {i} " * (i % 7 + 1), source="test")
+        for i in range(150)
+    ]
+    store.add_documents(chunks[:50])
+    assert index_type_of(store.index) == "flat"
+    store.add_documents(chunks[50:])
+    assert index_type_of(store.index) == "ivf_flat"
+    assert store.index.ntotal == 150
+    assert store.search("chunk number 3", k=2, nprobe=4)
+
+    reloaded = VectorStore(
+        index_path=tmp_path / "faiss.index",
+        metadata_path=tmp_path / "metadata.db",
+        index_type="ivf_flat",
+        train_threshold=100,
+    )
+    assert index_type_of(reloaded.index) == "ivf_flat"
+
+
+def test_vector_store_appends_to_wal_and_recovers(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    paths = dict(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    store = VectorStore(**paths)
+    store.add_documents([DocumentChunk(id="one", text="rapid brown fox", source="test")])
+    store.add_documents([DocumentChunk(id="two", text="slow blue whale", source="test")])
+    assert store.wal.size() > 0
+    assert not paths["index_path"].exists()
+
+    with store.wal.path.open("ab") as fp:
+        fp.write(b"CWAL\x00\x01torn")
+    reloaded = VectorStore(**paths)
+    assert [chunk.id for chunk in reloaded.metadata] == ["one", "two"]
+    assert reloaded.index.ntotal == 2
+
+    reloaded.compact()
+    assert paths["index_path"].exists()
+    assert reloaded.wal.size() == 0
+    reloaded.add_documents([DocumentChunk(id="three", text="quiet grey owl", source="test")])
+    assert VectorStore(**paths).index.ntotal == 3
+
+
+def test_add_documents_consumes_generator_in_batches(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    chunks = (
+        DocumentChunk(id=f"c{i}", text="   " if i == 3 else f"text {i}", source="test")
+        for i in range(10)
+    )
+    batches = list(store.embedding_service.embed_batches(chunks, text=lambda c: c.text, batch_size=4))
+    assert [len(batch) for batch, _ in batches] == [4, 4, 1]
+    assert all(len(batch) == len(vectors) for batch, vectors in batches)
+
+    added = store.add_documents(
+        DocumentChunk(id=f"d{i}", text=f"text {i}", source="test") for i in range(10)
+    )
+    assert added == 10
+    assert store.index.ntotal == len(store.metadata) == 10
+
+
+def test_ingest_directory_resumes_from_checkpoint(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    docs = tmp_path / "docs"
+    docs.mkdir()
+    for name in ("a", "b", "c"):
+        write_pdf(docs / f"{name}.pdf", [f"{name} page {i} text" for i in range(3)])
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    checkpoint = tmp_path / "checkpoint.jsonl"
+    messages: list[str] = []
+
+    stats = ingest_directory(
+        docs, store=store, checkpoint_path=checkpoint, workers=2, report=messages.append
+    )
+    assert (stats.files, stats.pages) == (3, 9)
+    assert store.index.ntotal == stats.chunks
+    assert "pages/s" in messages[-1]
+
+    again = ingest_directory(docs, store=store, checkpoint_path=checkpoint, report=messages.append)
+    assert (again.files, again.skipped) == (0, 3)
+
+    checkpoint.unlink()
+    rehashed = ingest_directory(docs, store=store, checkpoint_path=checkpoint, report=messages.append)
+    assert (rehashed.files, rehashed.unchanged) == (0, 3)
+    assert len(store.metadata) == stats.chunks
+
+
+def test_upsert_document_skips_unchanged_and_replaces_changed(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+
+    def chunks(*texts: str):
+        return (DocumentChunk(id=f"doc_{i}", text=text, source="doc.pdf") for i, text in enumerate(texts))
+
+    assert store.upsert_document("doc.pdf", "v1", chunks("old intro", "old body")) == 2
+
+    def must_not_run():
+        raise AssertionError("unchanged document was re-processed")
+        yield
+
+    assert store.upsert_document("doc.pdf", "v1", must_not_run()) is None
+    assert store.upsert_document("doc.pdf", "v2", chunks("new intro")) == 1
+    assert [chunk.text for chunk in store.metadata] == ["new intro"]
+    assert {chunk.text for chunk, _ in store.search("intro", k=3)} == {"new intro"}
+
+
+def test_delete_tombstones_then_compaction_purges(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    paths = dict(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    store = VectorStore(**paths)
+    store.add_documents(
+        DocumentChunk(id=f"{source}_{i}", text=f"{source} passage {i}", source=source)
+        for source in ("keep.pdf", "drop.pdf")
+        for i in range(4)
+    )
+    keep_ids = [chunk.vector_id for chunk in store.metadata if chunk.source == "keep.pdf"]
+
+    assert store.delete(source="drop.pdf") == 4
+    assert store.delete(ids=[keep_ids[0]]) == 1
+    results = store.search("drop passage", k=5)
+    assert len(results) == 3
+    assert all(chunk.source == "keep.pdf" for chunk, _ in results)
+    assert store.stats()["tombstones"] == 5
+
+    store.compact()
+    assert store.stats()["vectors"] == 3
+    reloaded = VectorStore(**paths)
+    assert reloaded.stats()["tombstones"] == 0
+    assert sorted(chunk.vector_id for chunk, _ in reloaded.search("keep", k=5)) == keep_ids[1:]
+
+
+@pytest.mark.parametrize("index_type", ["ivf_flat", "ivf_pq"])
+def test_ivf_compaction_keeps_ids_aligned(tmp_path: Path, index_type: str) -> None:
+    embedder = make_embedder("hash")
+
+    def open_store(kind: str = index_type) -> VectorStore:
+        return VectorStore(
+            index_path=tmp_path / "faiss.index",
+            metadata_path=tmp_path / "metadata.db",
+            index_type=kind,
+            train_threshold=100,
+            embedding_service=embedder,
+        )
+
+    def top_hits(store: VectorStore) -> int:
+        return sum(
+            store.search(f"note {i} on topic{i}", k=1, mode="vector")[0][0].id == f"c{i}"
+            for i in range(1, 300, 10)
+        )
+
+    store = open_store()
+    store.add_documents(
+        DocumentChunk(id=f"c{i}", text=f"note {i} on topic{i}", source=f"doc{i % 5}.pdf")
+        for i in range(300)
+    )
+    assert index_type_of(store.index) == index_type
+    assert top_hits(store) == 30
+
+    store.delete(source="doc0.pdf")
+    store.compact()
+    assert store.stats()["vectors"] == 240
+    assert top_hits(store) == 30
+    assert top_hits(open_store()) == 30
+    # A compacted IVF index can still be read back for migration.
+    migrated = open_store("flat")
+    assert index_type_of(migrated.index) == "flat" and top_hits(migrated) == 30
+
+
+def test_search_results_cached_until_store_changes(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    store.add_documents([DocumentChunk(id="one", text="rapid brown fox", source="a")])
+
+    first = store.search("brown  fox", k=3)
+    assert store.search("brown fox", k=3) == first
+    assert store.cache_stats()["search_results"]["hits"] == 1
+
+    store.add_documents([DocumentChunk(id="two", text="slow blue whale", source="b")])
+    assert len(store.search("brown fox", k=3)) == 2
+    store.delete(source="b")
+    assert len(store.search("brown fox", k=3)) == 1
+    assert store.cache_stats()["search_results"]["hits"] == 1
+
+
+def test_hybrid_search_fuses_keyword_and_vector_rankings(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    store.add_documents(
+        [
+            DocumentChunk(id="a", text="Invoices are archived for seven years.", source="policy"),
+            DocumentChunk(id="b", text="The cafeteria opens at noon.", source="policy"),
+            DocumentChunk(id="c", text="Archived invoices can be requested by email.", source="faq"),
+        ]
+    )
+
+    keyword = store.search("archived invoices", k=3, mode="keyword")
+    assert {chunk.id for chunk, _ in keyword} == {"a", "c"}
+    hybrid = store.search("archived invoices", k=3, mode="hybrid")
+    assert len(hybrid) == 3
+    assert {chunk.id for chunk, _ in hybrid[:2]} == {"a", "c"}
+
+    store.delete(source="faq")
+    assert [chunk.id for chunk, _ in store.search("archived invoices", k=3, mode="keyword")] == ["a"]
+
+    def no_backend(texts):
+        raise RuntimeError("No embedding backend available")
+
+    store.embedding_service.embed = no_backend
+    store._query_vectors.clear()
+    assert [chunk.id for chunk, _ in store.search("cafeteria", k=3)] == ["b"]
+
+    reopened = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    assert [chunk.id for chunk, _ in reopened.search("invoices", k=3, mode="keyword")] == ["a"]
+
+
+def test_search_batch_matches_single_searches(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    store.add_documents(
+        [
+            DocumentChunk(id=f"c{idx}", text=f"topic {idx} " + "detail " * idx, source="doc")
+            for idx in range(12)
+        ]
+    )
+    calls = []
+    embed = store.embedding_service.embed
+    store.embedding_service.embed = lambda texts: calls.append(list(texts)) or embed(texts)
+
+    questions = ["topic 3", "detail detail", "topic 3", "  "]
+    batch = store.search_batch(questions, k=3, mode="vector")
+
+    assert calls == [["topic 3", "detail detail"]]
+    assert batch[0] == batch[2]
+    assert batch[3] == []
+    store._results.clear()
+    for question, results in zip(questions, batch):
+        assert store.search(question, k=3, mode="vector") == results
+
+
+def test_job_queue_ingests_in_background_and_reports_progress(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    monkeypatch.setattr("src.data_processing.RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr("src.data_processing.PROCESSED_DIR", tmp_path / "processed")
+    monkeypatch.setattr("src.data_processing.ensure_directories", lambda: None)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "processed").mkdir()
+    pdf = write_pdf(tmp_path / "raw" / "guide.pdf", [f"guide page {i} text" for i in range(3)])
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    jobs = JobQueue(store, extraction_workers=1)
+
+    first = jobs.submit(pdf)
+    assert first.status in ("queued", "running", "completed")
+    second = jobs.submit(pdf)
+    missing = jobs.submit(tmp_path / "raw" / "missing.pdf")
+    jobs.shutdown()
+
+    assert jobs.get(first.id).to_dict()["status"] == "completed"
+    assert (first.pages_done, first.pages_total, first.progress) == (3, 3, 1.0)
+    assert first.chunks == len(store.metadata) > 0
+    assert jobs.get(second.id).status == "unchanged"
+    assert missing.status == "failed" and missing.error
+
+
+def test_job_queue_reuses_one_extraction_pool(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    monkeypatch.setattr("src.data_processing.RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr("src.data_processing.PROCESSED_DIR", tmp_path / "processed")
+    monkeypatch.setattr("src.data_processing.ensure_directories", lambda: None)
+    monkeypatch.setattr("src.data_processing.PAGES_PER_TASK", 2)
+    (tmp_path / "raw").mkdir()
+    created = []
+
+    def counted_pool(workers: int):
+        created.append(extraction_pool(workers))
+        return created[-1]
+
+    monkeypatch.setattr("src.jobs.extraction_pool", counted_pool)
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    jobs = JobQueue(store, extraction_workers=2)
+    pdfs = [
+        write_pdf(tmp_path / "raw" / f"{name}.pdf", [f"{name} page {i} text" for i in range(5)])
+        for name in ("first", "second")
+    ]
+
+    submitted = [jobs.submit(pdf) for pdf in pdfs]
+    while any(job.status in ("queued", "running") for job in submitted):
+        time.sleep(0.05)
+    assert [job.status for job in submitted] == ["completed", "completed"]
+    assert [job.pages_done for job in submitted] == [5, 5]
+    assert len(created) == 1 and created[0]._mp_context.get_start_method() != "fork"
+    jobs.shutdown()
+    assert jobs._extraction_pool is None
+
+
+def test_collections_stage_files_separately(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    monkeypatch.setattr("src.data_processing.RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr("src.data_processing.PROCESSED_DIR", tmp_path / "processed")
+    monkeypatch.setattr("src.data_processing.ensure_directories", lambda: None)
+    (tmp_path / "raw").mkdir()
+    (tmp_path / "upload").mkdir()
+    default_pdf = write_pdf(tmp_path / "raw" / "guide.pdf", ["default guide text"])
+    other = write_pdf(tmp_path / "upload" / "guide.pdf", ["hr guide text"])
+
+    chunks = list(iter_pdf_chunks(other, workers=1, collection="hr"))
+    assert chunks[0].source == str(tmp_path / "raw" / "hr" / "guide.pdf")
+    assert (tmp_path / "processed" / "hr" / "guide.json").exists()
+    assert list(iter_pdf_pages(default_pdf)) == ["default guide text"]
+
+
+def test_every_entry_point_keys_a_document_the_same_way(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    monkeypatch.setattr("src.data_processing.RAW_DIR", tmp_path / "raw")
+    monkeypatch.setattr("src.data_processing.PROCESSED_DIR", tmp_path / "processed")
+    monkeypatch.setattr("src.data_processing.ensure_directories", lambda: None)
+    for name in ("raw", "docs", "docs/old"):
+        (tmp_path / name).mkdir()
+    pdf = write_pdf(tmp_path / "docs" / "manual.pdf", ["manual page text"])
+    write_pdf(tmp_path / "docs" / "old" / "manual.pdf", ["older manual text"])
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    messages: list[str] = []
+
+    stats = ingest_directory(
+        tmp_path / "docs", pattern="**/*.pdf", store=store,
+        checkpoint_path=tmp_path / "checkpoint.jsonl", workers=1, report=messages.append,
+    )
+    assert stats.files == 1 and stats.failed == [str(tmp_path / "docs" / "old" / "manual.pdf")]
+    assert any("same file name" in message for message in messages)
+
+    source = document_source(pdf)
+    assert store.upsert_document(source, file_sha256(pdf), iter_pdf_chunks(pdf, workers=1)) is None
+    assert {chunk.source for chunk in store.metadata} == {source}
+
+
+def test_second_store_instance_picks_up_writes(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    paths = dict(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    writer = VectorStore(**paths)
+    reader = VectorStore(**paths)
+
+    writer.add_documents([DocumentChunk(id=f"c{i}", text=f"shared note {i}", source="a") for i in range(3)])
+    assert reader.refresh(force=True)
+    assert reader.index.ntotal == 3 and len(reader.metadata) == 3
+    assert not reader.refresh(force=True)
+
+    writer.delete(ids=[0])
+    reader.refresh(force=True)
+    assert 0 not in {chunk.vector_id for chunk, _ in reader.search("shared note", k=3, mode="vector")}
+
+    writer.compact()
+    writer.add_documents([DocumentChunk(id="c3", text="shared note 3", source="b")])
+    reader.refresh(force=True)
+    assert reader.index.ntotal == 3
+    assert sorted(chunk.vector_id for chunk, _ in reader.search("shared", k=5, mode="vector")) == [1, 2, 3]
+
+    writer.clear()
+    reader.refresh(force=True)
+    assert reader.index is None and reader.search("shared", k=3) == []
+
+
+def test_searches_run_safely_during_writes(tmp_path: Path, monkeypatch) -> None:
+    import threading
+
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(index_path=tmp_path / "faiss.index", metadata_path=tmp_path / "metadata.db")
+    store.add_documents([DocumentChunk(id="seed", text="seed text", source="seed")])
+    errors = []
+    done = threading.Event()
+
+    def search_loop(worker: int) -> None:
+        while not done.is_set():
+            try:
+                for chunk, _ in store.search(f"query {worker}", k=4, mode="vector"):
+                    assert chunk.vector_id is not None
+            except Exception as e:
+                errors.append(e)
+                return
+
+    threads = [threading.Thread(target=search_loop, args=(i,)) for i in range(4)]
+    for thread in threads:
+        thread.start()
+    for batch in range(20):
+        store.add_documents(
+            [DocumentChunk(id=f"b{batch}_{i}", text=f"batch {batch} item {i}", source=f"s{batch}") for i in range(5)]
+        )
+        if batch % 5 == 4:
+            store.delete(source=f"s{batch - 1}")
+            store.compact()
+    done.set()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert store.index.ntotal == len(store.metadata) == 1 + 20 * 5 - 4 * 5
+
+
+def test_registry_fans_out_across_collections(tmp_path: Path, monkeypatch) -> None:
+    import pytest
+
+    from src.registry import CollectionRegistry
+
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    registry = CollectionRegistry(root=tmp_path)
+    registry.get("legal").add_documents(
+        [DocumentChunk(id="l0", text="contract renewal terms", source="legal.pdf")]
+    )
+    registry.get("hr").add_documents(
+        [DocumentChunk(id="h0", text="vacation policy details", source="hr.pdf")]
+    )
+
+    assert registry.get("hr").embedding_service is registry.get("legal").embedding_service
+    assert (tmp_path / "collections" / "hr" / "metadata.db").exists()
+    assert CollectionRegistry(root=tmp_path).names() == ["default", "hr", "legal"]
+
+    results = registry.search("contract renewal", k=2, collections=["legal", "hr"], mode="keyword")
+    assert [(name, chunk.id) for name, chunk, _ in results] == [("legal", "l0")]
+    results = registry.search("policy", k=2, collections=["legal", "hr"], mode="vector")
+    assert {name for name, _, _ in results} == {"legal", "hr"}
+    assert results[0][2] <= results[1][2]
+    assert registry.search("contract", k=2) == []
+
+    with pytest.raises(ValueError):
+        registry.get("../escape")
+
+
+def test_registry_sorts_by_the_mode_each_store_used(tmp_path: Path, monkeypatch) -> None:
+    from src.registry import CollectionRegistry
+
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    registry = CollectionRegistry(root=tmp_path)
+    for name in ("legal", "hr"):
+        registry.get(name).add_documents(
+            [
+                DocumentChunk(id=f"{name}0", text="refund refund refund policy", source=name),
+                DocumentChunk(id=f"{name}1", text="refund and many other unrelated words", source=name),
+            ]
+        )
+
+    def unavailable(texts):
+        raise RuntimeError("no embedding backend")
+
+    monkeypatch.setattr(registry.get("legal").embedding_service, "embed", unavailable)
+    # Vector search falls back to keywords, whose scores are higher-is-better.
+    for collections in (["legal"], ["legal", "hr"]):
+        results = registry.search("refund", k=4, collections=collections, mode="vector")
+        scores = [score for _, _, score in results]
+        assert scores == sorted(scores, reverse=True)
+        assert results[0][1].id.endswith("0")
+
+
+def test_registry_fuses_keyword_results_by_rank(tmp_path: Path, monkeypatch) -> None:
+    from src.registry import CollectionRegistry
+
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    registry = CollectionRegistry(root=tmp_path)
+    # "refund" is in every "big" chunk, so its BM25 scores there are far below "small"'s.
+    registry.get("big").add_documents(
+        [DocumentChunk(id="big0", text="refund refund refund", source="big")]
+        + [DocumentChunk(id=f"big{i}", text=f"refund note {i}", source="big") for i in range(1, 8)]
+    )
+    registry.get("small").add_documents(
+        [DocumentChunk(id="small0", text="refund policy", source="small")]
+        + [DocumentChunk(id=f"small{i}", text=f"shipping note {i}", source="small") for i in range(1, 5)]
+    )
+
+    results = registry.search("refund", k=3, collections=["big", "small"], mode="keyword")
+    assert [chunk.id for _, chunk, _ in results][:2] == ["big0", "small0"]
+    assert results[0][2] == results[1][2] > results[2][2]
+
+
+def test_registry_stats_do_not_open_stores(tmp_path: Path, monkeypatch) -> None:
+    from src.registry import CollectionRegistry
+
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    writer = CollectionRegistry(root=tmp_path)
+    writer.get("hr").add_documents(
+        DocumentChunk(id=f"h{i}", text=f"policy {i}", source=f"hr{i % 2}.pdf") for i in range(6)
+    )
+    writer.get("hr").delete(source="hr0.pdf")
+
+    reader = CollectionRegistry(root=tmp_path)
+    stats = reader.stats("hr")
+    assert reader.peek("hr") is None
+    assert (stats["loaded"], stats["chunks"], stats["tombstones"], stats["vectors"]) == (False, 3, 3, 6)
+    assert stats["wal_bytes"] > 0
+    assert reader.stats("default")["chunks"] == 0
+    assert writer.stats("hr") == {"loaded": True, **writer.get("hr").stats()}
+
+
+def test_quantized_index_reranks_from_originals(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setattr("src.retriever.EmbeddingService", DummyEmbedder)
+    store = VectorStore(
+        index_path=tmp_path / "faiss.index",
+        metadata_path=tmp_path / "metadata.db",
+        index_type="flat",
+        train_threshold=40,
+        quantization="int8",
+    )
+    chunks = [
+        DocumentChunk(id=f"c{i}", text=f"note {i} " + "word " * (i % 7), source="doc")
+        for i in range(60)
+    ]
+    store.add_documents(chunks[:30])
+    assert store.stats()["quantization"] == "none"
+    store.add_documents(chunks[30:])
+
+    assert store.stats()["quantization"] == "int8"
+    assert len(store.metadata.get_vectors(range(60))) == 60
+    exact = store.embedding_service.embed(["note 5"])
+    hits = store._index_search(np.ascontiguousarray(exact, dtype=np.float32), 3)[0]
+    originals = store.metadata.get_vectors([idx for idx, _ in hits])
+    assert [dist for _, dist in hits] == sorted(dist for _, dist in hits)
+    assert np.isclose(hits[0][1], np.sum((originals[hits[0][0]] - exact[0]) ** 2))
+
+    report = store.recall_report(k=5, sample=20)
+    assert report["quantization"] == "int8" and report["baseline"] == "originals"
+    assert report["compression"] > 1.5
+    assert report["recall_reranked"] >= report["recall"] - 1e-9
+    assert report["recall_reranked"] > 0.9
+
+
+def test_recall_report_after_ivf_sq_compaction(tmp_path: Path) -> None:
+    store = VectorStore(
+        index_path=tmp_path / "faiss.index",
+        metadata_path=tmp_path / "metadata.db",
+        index_type="ivf_flat",
+        train_threshold=100,
+        embedding_service=make_embedder("hash"),
+        quantization="int8",
+    )
+    store.add_documents(
+        DocumentChunk(id=f"c{i}", text=f"note {i} on topic{i}", source=f"doc{i % 4}.pdf")
+        for i in range(400)
+    )
+    store.delete(source="doc0.pdf")
+    store.compact()
+
+    report = store.recall_report(k=5, sample=50)
+    assert (report["index_type"], report["quantization"]) == ("ivf_flat", "int8")
+    assert report["vectors"] == 300
+    assert report["recall_reranked"] > 0.9
@@ -4,10 +4,13 @@ from __future__ import annotations
 
 import html
 import sys
+import time
 from pathlib import Path
 
 import streamlit as st
 
+run_started = time.perf_counter()
+
 
 def _resolve_project_root() -> Path:
     possible_roots = list(Path(__file__).resolve().parents)
@@ -24,14 +27,26 @@ ROOT = _resolve_project_root()
 if str(ROOT) not in sys.path:
     sys.path.insert(0, str(ROOT))
 
-from src.config import RAW_DIR, ensure_directories
-from src.data_processing import process_pdf
+from src.config import ensure_directories
+from src.data_processing import document_source, file_sha256, iter_pdf_chunks, raw_path_for
 from src.llm import LLMService
 from src.retriever import VectorStore
 
-ensure_directories()
-vector_store = VectorStore()
-llm = LLMService()
+
+
+@st.cache_resource(show_spinner="Loading models...")
+def load_resources() -> tuple[VectorStore, LLMService, dict]:
+    """Open the store and LLM client once per server process, not on every rerun."""
+    started = time.perf_counter()
+    ensure_directories()
+    store = VectorStore()
+    service = LLMService()
+    timings = {"open": time.perf_counter() - started, **store.warm_up()}
+    timings["total"] = time.perf_counter() - started
+    return store, service, timings
+
+
+vector_store, llm, startup_timings = load_resources()
 
 STYLES = """
 <style>
@@ -131,6 +146,23 @@ def determine_top_k(store: VectorStore) -> int:
     return min(5, max(3, total_chunks // 20 + 2))
 
 
+def render_answer(placeholder, answer: str) -> None:
+    placeholder.markdown("""
+    <div class="answer-box">
+        <div class="answer-title">Answer</div>
+        <div class="answer-content">{}</div>
+    </div>
+    """.format(answer.replace("\n", "<br>").replace('"', '&quot;')), unsafe_allow_html=True)
+
+
+def page_label(chunk) -> str:
+    if chunk.page_start is None:
+        return ""
+    if chunk.page_end in (None, chunk.page_start):
+        return f", p. {chunk.page_start}"
+    return f", pp. {chunk.page_start}-{chunk.page_end}"
+
+
 st.set_page_config(page_title="Cara AI", layout="wide")
 st.markdown(STYLES, unsafe_allow_html=True)
 
@@ -147,11 +179,15 @@ with st.sidebar:
     uploaded = st.file_uploader("Choose a PDF file", type=["pdf"])
     if uploaded:
         with st.spinner("Processing..."):
-            temp_path = RAW_DIR / uploaded.name
+            temp_path = raw_path_for(Path(uploaded.name))
             temp_path.write_bytes(uploaded.getvalue())
-            chunks = process_pdf(temp_path)
-            vector_store.add_documents(chunks)
-            st.success(f"Embedded {len(chunks)} chunks from {uploaded.name}")
+            added = vector_store.upsert_document(
+                document_source(temp_path), file_sha256(temp_path), iter_pdf_chunks(temp_path)
+            )
+        if added is None:
+            st.info(f"{uploaded.name} is already embedded")
+        else:
+            st.success(f"Embedded {added} chunks from {uploaded.name}")
     
     st.markdown("---")
     st.markdown("### Stored Data")
@@ -160,17 +196,15 @@ with st.sidebar:
         st.info(f"{total_chunks} document chunks stored")
         
         if st.button("Clear All Data", use_container_width=True, type="secondary"):
-            vector_store.index = None
-            vector_store.metadata = []
-            if vector_store.index_path.exists():
-                vector_store.index_path.unlink()
-            if vector_store.metadata_path.exists():
-                vector_store.metadata_path.unlink()
+            vector_store.clear()
             st.success("Data cleared")
             st.rerun()
     else:
         st.info("No documents stored")
 
+    st.markdown("---")
+    startup_caption = st.empty()
+
 st.markdown("### Ask a Question")
 query = st.text_input(
     "Enter your question:",
@@ -182,25 +216,24 @@ query = st.text_input(
 auto_k = determine_top_k(vector_store)
 
 if st.button("Get Answer", type="primary", use_container_width=True) and query:
+    started = time.perf_counter()
     with st.spinner("Searching documents..."):
         results = vector_store.search(query, k=auto_k)
         context = [chunk.text for chunk, _ in results]
-        answer = llm.generate_answer(query, context)
-    
-    st.markdown("""
-    <div class="answer-box">
-        <div class="answer-title">Answer</div>
-        <div class="answer-content">{}</div>
-    </div>
-    """.format(answer.replace("\n", "<br>").replace('"', '&quot;')), unsafe_allow_html=True)
-    
+        query_embedding = vector_store.embed_query(query) if results else None
+
+    # Sources render first; the answer box above them fills in as tokens arrive.
+    answer_slot = st.empty()
+    timing_slot = st.empty()
+    render_answer(answer_slot, "...")
+
     if results:
         top_chunk, top_distance = results[0]
         reference_text = top_chunk.text
         if len(reference_text) > 300:
             reference_text = reference_text[:300].rsplit(' ', 1)[0] + "..."
         
-        source_name = Path(top_chunk.source).name
+        source_name = Path(top_chunk.source).name + page_label(top_chunk)
         reference_html = f"""
         <div class="reference-box">
             <div class="reference-label">Reference Passage</div>
@@ -218,7 +251,7 @@ if st.button("Get Answer", type="primary", use_container_width=True) and query:
         st.caption(f"{len(results)} relevant passages found")
         
         for idx, (chunk, distance) in enumerate(results, start=1):
-            source_name = Path(chunk.source).name
+            source_name = html.escape(Path(chunk.source).name + page_label(chunk))
             passage_html = f"""
             <div class="passage-card">
                 <div class="passage-header">
@@ -235,5 +268,24 @@ if st.button("Get Answer", type="primary", use_container_width=True) and query:
     else:
         st.info("No supporting passages found. Upload a document first.")
 
+    answer = ""
+    first_token = None
+    for delta in llm.stream_answer(query, context, query_embedding):
+        if first_token is None:
+            first_token = time.perf_counter()
+        answer += delta
+        render_answer(answer_slot, answer)
+    finished = time.perf_counter()
+    timing_slot.caption(
+        f"First token {((first_token or finished) - started) * 1000:.0f} ms | "
+        f"Total {(finished - started) * 1000:.0f} ms"
+    )
+
 elif query:
     st.info("Click 'Get Answer' to search your documents")
+
+startup_caption.caption(
+    f"Startup {startup_timings['total'] * 1000:.0f} ms "
+    f"(model {startup_timings['embedding_model'] * 1000:.0f} ms) | "
+    f"This interaction {(time.perf_counter() - run_started) * 1000:.0f} ms"
+)